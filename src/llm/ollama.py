@@ -1,9 +1,11 @@
 from ollama import chat
+from ollama import AsyncClient
 from ollama import ChatResponse
-from functools import lru_cache
 import logging
 
-@lru_cache(maxsize=None)
+from ..rdg.memo import MISSING, digest, memoized
+
+@memoized("ollama")
 def ollama_call(rendered_template):
   
   # response: ChatResponse = chat(model='llama3.2', messages=[
@@ -19,7 +21,27 @@ def ollama_call(rendered_template):
   print(response.message.content)
   
   return response.message.content
-      
+
+
+
+# ollama_call's memo, shared with the awaited path.
+_async_memo = ollama_call.memo
+
+
+async def ollama_call_async(rendered_template):
+  """ollama_call on Ollama's AsyncClient, for the asyncio runner (RDG_ASYNC=1)."""
+  key = digest((rendered_template,))
+  response = _async_memo.lookup(key)
+  if response is not MISSING:
+    return response
+  response: ChatResponse = await AsyncClient().chat(model='deepseek-r1:1.5b', messages=[
+    {
+      'role': 'user',
+      'content': rendered_template,
+    },
+  ])
+  _async_memo.store(key, response.message.content)
+  return response.message.content
 
 
 if __name__ == "__main__":
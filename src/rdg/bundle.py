@@ -0,0 +1,146 @@
+"""Cache bundles — the answers a notebook's last run used, in one file a CI job can restore.
+
+A CI job starts with an empty or stale CACHE_DIR, and restoring a tarball of the whole directory
+ships every answer any branch ever asked for, prompts included, in a file that changes on every
+run and so never dedupes. A bundle carries only what one notebook (or a set of them) needs.
+
+What a notebook needs is recorded as it runs. Every model call a step makes notes its cache key
+(functions.collecting_cache_keys), and at the end of the run the keys are written to
+CACHE_DIR/runs/<md5 of the notebook path>.json, named like the duration history (history.py).
+Steps an incremental run skipped made no calls; their keys come from the build manifest
+(manifest.py), which kept them from the run that did make the calls.
+
+A bundle is gzip over JSON lines: a header, then one entry per key, sorted by key, with sorted
+fields and no timestamps (the gzip header's mtime is 0). The same entries always give the same
+bytes, so a CI cache keyed on the bundle's hash is only re-uploaded when an answer changed.
+Prompts are left out unless asked for (`--with-prompts`). A hit never reads them, and they are
+most of a cache's bytes.
+
+    {"format": "rdg-cache-bundle", "version": 1, "entries": 2, "prompts": false}
+    {"key": "0123…", "request": null, "response": "…"}
+
+Import merges a bundle into the local cache through the configured backend: entries already
+present are left alone, so importing never replaces a fresher local answer.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from . import config
+
+BUNDLE_FORMAT = "rdg-cache-bundle"
+BUNDLE_VERSION = 1
+RUNS_DIR = "runs"
+
+# Keys noted by the steps of runs still in progress, by notebook; written out by save_run_keys.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def run_keys_path(cache_dir: str, rdg_file: str) -> str:
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return os.path.join(cache_dir, RUNS_DIR, f"{digest}.json")
+
+
+def note_run_keys(rdg_file: str, keys) -> None:
+    """Remember the cache keys a finished step of `rdg_file` used."""
+    if keys:
+        with _pending_lock:
+            _pending.setdefault(os.path.abspath(rdg_file), set()).update(keys)
+
+
+def save_run_keys(rdg_file: str, partial: bool = False) -> None:
+    """Record the keys this run of `rdg_file` used, replacing the previous run's. A `partial` run
+    (targets selected some of the steps) adds its keys to the record instead: the steps it skipped
+    still own theirs. Never raises: a lost record costs a smaller bundle, not the run."""
+    with _pending_lock:
+        keys = _pending.pop(os.path.abspath(rdg_file), set())
+    path = run_keys_path(config.CACHE_DIR, rdg_file)
+    try:
+        if partial:
+            if not keys:
+                return
+            keys |= _recorded_keys(path)
+        elif not keys:
+            if os.path.exists(path):
+                os.remove(path)  # this run made no model calls; neither will a restored one
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 1, "rdg_file": os.path.abspath(rdg_file),
+                       "keys": sorted(keys)}, f, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"Could not save the cache keys of this run to '{path}': {e}")
+
+
+def notebook_keys(cache_dir: str, rdg_file: str) -> set:
+    """The cache keys `rdg_file` needs: its last run's, and those its manifest kept for the steps
+    that run skipped."""
+    from .manifest import notebook_manifest_keys  # manifest -> functions -> gemini -> cache
+    return notebook_manifest_keys(cache_dir, rdg_file) | _recorded_keys(
+        run_keys_path(cache_dir, rdg_file))
+
+
+def _recorded_keys(path: str) -> set:
+    """The keys of the run record at `path`; empty when there is none or it is unreadable."""
+    try:
+        with open(path, "r") as f:
+            return set(json.load(f).get("keys", ()))
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable run record '{path}': {e}")
+        return set()
+
+
+def export_bundle(backend, keys, out_path: str, with_prompts: bool = False):
+    """Write the entries for `keys` that `backend` holds to `out_path`, atomically. Returns
+    (exported, missing): how many were written, and how many keys the cache did not have."""
+    wanted = sorted(set(keys))
+    found = backend.load_many(wanted)
+    lines = [json.dumps({"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION,
+                         "entries": len(found), "prompts": with_prompts}, sort_keys=True)]
+    for key in wanted:
+        if key in found:
+            request = backend.load_prompt(key) if with_prompts else None
+            lines.append(json.dumps({"key": key, "request": request, "response": found[key]},
+                                    sort_keys=True))
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=9,
+                           mtime=0) as f:
+            f.write(("\n".join(lines) + "\n").encode())
+    os.replace(tmp, out_path)
+    return len(found), len(wanted) - len(found)
+
+
+def import_bundle(backend, path: str):
+    """Merge the bundle at `path` into `backend`. Returns (imported, already_present). Raises
+    ValueError for a file that is not a bundle this version reads. Whether an entry is already
+    present is asked of the store itself, not its index, which may be stale or missing."""
+    imported = skipped = 0
+    try:
+        with gzip.open(path, "rt") as f:
+            header = json.loads(f.readline() or "null")
+            if not isinstance(header, dict) or header.get("format") != BUNDLE_FORMAT:
+                raise ValueError(f"{path} is not a cache bundle")
+            if header.get("version") != BUNDLE_VERSION:
+                raise ValueError(f"{path} is a version {header.get('version')} bundle; "
+                                 f"this engine reads version {BUNDLE_VERSION}")
+            for line in f:
+                entry = json.loads(line)
+                if backend.contains(entry["key"]):
+                    skipped += 1
+                    continue
+                backend.save(entry["key"], entry.get("request"), entry["response"])
+                imported += 1
+    except (OSError, EOFError, KeyError, TypeError) as e:
+        raise ValueError(f"{path} is not a readable cache bundle: {e}") from None
+    return imported, skipped
@@ -0,0 +1,982 @@
+"""The response cache on disk — sharded entry files, and the index that describes them.
+
+Every model answer used to be one `<md5>.json` in the top of CACHE_DIR. A cache that has grown
+to hundreds of thousands of entries makes that one directory the slow part of everything that
+touches it: listing it, backing it up, even creating one more file on some filesystems. Entries
+now fan out by the first two byte pairs of their key, `ab/cd/abcd….json`, so no directory holds
+more than a few thousand files however large the cache grows.
+
+Entries written in the old flat layout stay readable: a read that misses the sharded path falls
+back to `<key>.json` at the top, so upgrading costs no cache misses. `python -m src.rdg.cache
+migrate` (`bin/rdg cache migrate`) moves the flat entries into place once, and is safe to run while
+another process uses the cache.
+
+An entry stores the rendered prompt beside its answer, and prompts that embed whole
+GLOBTOMARKDOWN dumps make the cache mostly prompt bytes. RDG_CACHE_COMPRESS (zlib, lzma) and
+RDG_CACHE_PROMPTS (blob, hash) switch an entry to the packed form, `<key>.rdgc`:
+
+    RDGC1 <codec> <prompt mode> <prompt sha256> <response length>\\n<response><prompt>
+
+The response comes first, compressed, with its length in the header, so a hit reads and inflates
+the response and nothing else. The prompt follows it only in "inline" mode. In "blob" mode it is
+stored once under CACHE_DIR/prompts/, by its sha256, however many entries (models, efforts)
+share it. In "hash" mode only the sha256 in the header is kept. The codec and prompt mode are
+recorded per entry, so changing either setting never makes an existing entry unreadable. With
+both settings at their defaults (none, inline) entries are written as JSON, as they always were.
+
+Beside the entries is CACHE_DIR/index.log, which is append-only and holds one line per event:
+
+    +  <key> <size> <created>  [<last hit>|-  [<prompt sha256>]]    an entry was written
+    h  <key> <when>                                                 an entry answered a call
+    -  <key>                                                        an entry was removed
+
+read_index folds it into the current key → IndexEntry, so cache maintenance never has to stat
+the entries themselves. A process records a key's hit at most once per HIT_INTERVAL, since
+maintenance only needs to know roughly when an entry was last used, and read_index compacts the
+index once it holds more than COMPACT_FACTOR lines per entry, so a busy cache's log does not grow
+without bound between `gc` runs. Each line is a single O_APPEND write, so concurrent processes interleave
+whole lines. A torn last line from a crash is skipped. Lines appended while compact_index rewrites
+the file can be lost. The index is advisory, and `python -m src.rdg.cache index` rebuilds it from
+the entries whenever it is in doubt.
+
+All of that is one backend, JsonDirCache. SqliteCache (RDG_CACHE_BACKEND=sqlite) keeps the same
+entries as rows of one WAL-mode database, CACHE_DIR/cache.sqlite3: a hit is a query, not a file
+open, which is the difference that matters on a network filesystem. Readers in several processes
+proceed concurrently, each write is one atomic transaction, and size and age are columns. Loads
+that arrive together from a wave's worker threads go out as one query. gemini.cache_backend()
+picks the backend for the running process; both share the interface below, and `cache migrate
+--to sqlite` copies a JSON cache into the database.
+"""
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import lzma
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from . import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: gemini.cache_lock takes no lock files, so there are none to prune.
+    fcntl = None
+
+INDEX_NAME = "index.log"
+SQLITE_NAME = "cache.sqlite3"
+PROMPTS_DIR = "prompts"
+LOCKS_DIR = "locks"
+PACKED_MAGIC = "RDGC1"
+
+IndexEntry = collections.namedtuple("IndexEntry", "size created last_hit prompt",
+                                    defaults=(None,))
+IndexEntry.__doc__ = """One cached answer: its size in bytes, when it was written, when it last
+answered a call (None if never) — seconds since the epoch — and the sha256 of a prompt stored as
+a shared blob (None otherwise)."""
+
+# config.CACHE_CODECS, as (compress, decompress) over bytes.
+CODECS = {
+    "none": (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# What a corrupt entry or blob raises on its way through a codec; each is a miss, never a crash.
+_UNREADABLE = (ValueError, KeyError, EOFError, zlib.error, lzma.LZMAError)
+
+_KEY = re.compile(r"[0-9a-f]{32}")
+_SHARD = re.compile(r"[0-9a-f]{2}")
+_ENTRY_NAME = re.compile(r"([0-9a-f]{32})\.(json|rdgc)")
+_SHA = re.compile(r"[0-9a-f]{64}")
+
+HIT_INTERVAL = 3600  # seconds; a process records a key's hit at most once per interval
+COMPACT_FACTOR = 4  # index lines per entry past which read_index compacts the index
+COMPACT_MIN_LINES = 1000  # ...but never a log shorter than this
+
+# (cache_dir, key) -> when this process last recorded a hit of it in the index.
+_hits_recorded = {}
+_hits_lock = threading.Lock()
+
+
+def entry_path(cache_dir: str, key: str, suffix: str = ".json") -> str:
+    """Where the entry for `key` is written: sharded by its first two byte pairs. `.json` for a
+    plain entry, `.rdgc` for a packed one."""
+    return os.path.join(cache_dir, key[:2], key[2:4], f"{key}{suffix}")
+
+
+def legacy_path(cache_dir: str, key: str) -> str:
+    """Where the flat layout kept the entry for `key`; still read until `migrate` moves it."""
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def prompt_path(cache_dir: str, sha: str) -> str:
+    return os.path.join(cache_dir, PROMPTS_DIR, sha[:2], sha)
+
+
+def lock_path(cache_dir: str, key: str) -> str:
+    """The file gemini.cache_lock flocks while a call for `key` is in flight."""
+    return os.path.join(cache_dir, LOCKS_DIR, f"{key}.lock")
+
+
+def _entry_paths(cache_dir: str, key: str):
+    return (entry_path(cache_dir, key, ".rdgc"), entry_path(cache_dir, key),
+            legacy_path(cache_dir, key))
+
+
+def read_entry(cache_dir: str, key: str):
+    """The cached response for `key`, or None. A hit is recorded in the index; an unreadable entry
+    is a miss."""
+    for path in _entry_paths(cache_dir, key):
+        try:
+            response, _ = _read_file(cache_dir, path)
+        except FileNotFoundError:
+            continue
+        except _UNREADABLE as e:
+            logging.warning(f"Ignoring unreadable cache entry '{path}': {e}")
+            return None
+        _record_hit(cache_dir, key)
+        return response
+    return None
+
+
+def _record_hit(cache_dir: str, key: str) -> None:
+    now = time.time()
+    with _hits_lock:
+        last = _hits_recorded.get((cache_dir, key))
+        if last is not None and now - last < HIT_INTERVAL:
+            return
+        _hits_recorded[(cache_dir, key)] = now
+    _append_index(cache_dir, f"h {key} {now:.0f}")
+
+
+def read_prompt(cache_dir: str, key: str):
+    """The prompt stored for `key`, or None — always None for an entry kept in "hash" mode."""
+    for path in _entry_paths(cache_dir, key):
+        try:
+            return _read_file(cache_dir, path, with_prompt=True)[1]
+        except FileNotFoundError:
+            continue
+        except _UNREADABLE:
+            return None
+    return None
+
+
+def _read_file(cache_dir: str, path: str, with_prompt: bool = False):
+    """(response, prompt) from one entry file; prompt is None unless asked for and kept."""
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        return data["response"], data.get("request")
+    with open(path, "rb") as f:
+        magic, codec, mode, sha, length = f.readline().decode().split()
+        if magic != PACKED_MAGIC:
+            raise ValueError(f"not a packed cache entry ({magic!r})")
+        decompress = CODECS[codec][1]
+        response = decompress(f.read(int(length))).decode()
+        prompt = None
+        if with_prompt and mode == "inline":
+            tail = f.read()
+            prompt = decompress(tail).decode() if tail else None  # saved without its prompt
+    if with_prompt and mode == "blob":
+        prompt = _read_blob(cache_dir, sha)
+    return response, prompt
+
+
+def _packed_header(path: str):
+    """(codec, prompt mode, prompt sha256) from a packed entry's header line."""
+    with open(path, "rb") as f:
+        _, codec, mode, sha, _ = f.readline().decode().split()
+    return codec, mode, sha
+
+
+def write_entry(cache_dir: str, key: str, prompt: str, response: str,
+                codec: str = "none", prompts: str = "inline") -> None:
+    """Store one answer for `key` atomically: written aside and renamed into place, so a
+    concurrent reader sees the whole entry or none of it. Raises OSError; the caller decides how
+    loud."""
+    shared = None
+    if codec == "none" and prompts == "inline":
+        target, stale = entry_path(cache_dir, key), entry_path(cache_dir, key, ".rdgc")
+        body = json.dumps({"request": prompt, "response": response}).encode()
+    else:
+        target, stale = entry_path(cache_dir, key, ".rdgc"), entry_path(cache_dir, key)
+        compress = CODECS[codec][0]
+        sha = hashlib.sha256((prompt or "").encode()).hexdigest()
+        answer = compress(response.encode())
+        tail = compress(prompt.encode()) if prompts == "inline" and prompt is not None else b""
+        if prompts == "blob" and prompt is not None:
+            _write_blob(cache_dir, sha, prompt, codec)
+            shared = sha
+        body = f"{PACKED_MAGIC} {codec} {prompts} {sha} {len(answer)}\n".encode() + answer + tail
+    _write_atomic(target, body)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(stale)  # the same key written under the other setting; one copy is enough
+    tail = f" - {shared}" if shared else ""
+    _append_index(cache_dir, f"+ {key} {len(body)} {time.time():.0f}{tail}")
+
+
+def _write_atomic(target: str, body: bytes) -> None:
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, target)
+
+
+def _write_blob(cache_dir: str, sha: str, prompt: str, codec: str) -> None:
+    """Store a prompt once, by content: a blob already on disk is already right."""
+    target = prompt_path(cache_dir, sha)
+    if not os.path.exists(target):
+        _write_atomic(target, f"{codec}\n".encode() + CODECS[codec][0](prompt.encode()))
+
+
+def _read_blob(cache_dir: str, sha: str):
+    try:
+        with open(prompt_path(cache_dir, sha), "rb") as f:
+            codec = f.readline().decode().strip()
+            return CODECS[codec][1](f.read()).decode()
+    except FileNotFoundError:
+        return None
+
+
+def _append_index(cache_dir: str, line: str) -> None:
+    """One line, one write. Never raises: a lost index line is repaired by a rebuild."""
+    try:
+        fd = os.open(os.path.join(cache_dir, INDEX_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o644)
+        try:
+            os.write(fd, f"{line}\n".encode())
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logging.warning(f"Could not update cache index in '{cache_dir}': {e}")
+
+
+def read_index(cache_dir: str) -> dict:
+    """{key: IndexEntry} for every entry the index knows of. Compacts an index that has grown
+    past COMPACT_FACTOR lines per entry."""
+    state, lines = _fold_index(cache_dir)
+    entries = {key: IndexEntry(*entry) for key, entry in state.items() if entry[0] is not None}
+    if lines > max(COMPACT_MIN_LINES, COMPACT_FACTOR * len(entries)):
+        try:
+            compact_index(cache_dir, entries)
+        except OSError as e:
+            logging.warning(f"Could not compact cache index in '{cache_dir}': {e}")
+    return entries
+
+
+def _fold_index(cache_dir: str):
+    """({key: [size, created, last_hit, prompt]}, lines read), including keys seen only in hits
+    (size None)."""
+    state = {}
+    try:
+        with open(os.path.join(cache_dir, INDEX_NAME), "r") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return {}, 0
+    for line in lines:
+        fields = line.split()
+        try:
+            op, key = fields[0], fields[1]
+            if op == "+":
+                hit = state.get(key, [None] * 4)[2]
+                if len(fields) > 4 and fields[4] != "-":
+                    hit = max(hit or 0, int(fields[4]))
+                prompt = fields[5] if len(fields) > 5 else None
+                state[key] = [int(fields[2]), int(fields[3]), hit, prompt]
+            elif op == "h":
+                entry = state.setdefault(key, [None] * 4)
+                entry[2] = max(entry[2] or 0, int(fields[2]))
+            elif op == "-":
+                state.pop(key, None)
+        except (IndexError, ValueError):
+            continue  # a torn line from a crashed writer
+    return state, len(lines)
+
+
+def compact_index(cache_dir: str, entries: dict) -> None:
+    """Replace the index with one `+` line per entry of `entries` ({key: IndexEntry})."""
+    target = os.path.join(cache_dir, INDEX_NAME)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        for key, entry in sorted(entries.items()):
+            hit = "-" if entry.last_hit is None else entry.last_hit
+            tail = f" {hit} {entry.prompt}" if entry.prompt else ("" if hit == "-" else f" {hit}")
+            f.write(f"+ {key} {entry.size} {entry.created}{tail}\n")
+    os.replace(tmp, target)
+
+
+def iter_entry_files(cache_dir: str):
+    """(key, path) for every entry on disk, sharded and flat — the one full scan, for rebuilds."""
+    try:
+        top = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return
+    for name in sorted(top):
+        if name.endswith(".json") and _KEY.fullmatch(name[:-5]):
+            yield name[:-5], os.path.join(cache_dir, name)
+        elif _SHARD.fullmatch(name):
+            for inner in sorted(os.listdir(os.path.join(cache_dir, name))):
+                shard = os.path.join(cache_dir, name, inner)
+                if not os.path.isdir(shard):
+                    continue
+                for entry in sorted(os.listdir(shard)):
+                    match = _ENTRY_NAME.fullmatch(entry)
+                    if match:
+                        yield match.group(1), os.path.join(shard, entry)
+
+
+def rebuild_index(cache_dir: str) -> dict:
+    """Index every entry on disk from a stat of each, keeping the last hits the old index knew."""
+    known, _ = _fold_index(cache_dir)
+    entries = {}
+    for key, path in iter_entry_files(cache_dir):
+        if key in entries:
+            continue  # a flat copy of a sharded entry (its shard sorts first); the shard wins
+        stat = os.stat(path)
+        prompt = None
+        if path.endswith(".rdgc"):
+            try:
+                _, mode, sha = _packed_header(path)
+                prompt = sha if mode == "blob" else None
+            except (OSError, ValueError):
+                pass
+        last_hit = known.get(key, [None] * 4)[2]
+        entries[key] = IndexEntry(stat.st_size, int(stat.st_mtime), last_hit, prompt)
+    compact_index(cache_dir, entries)
+    return entries
+
+
+def migrate(cache_dir: str) -> int:
+    """Move every flat `<key>.json` into its shard; returns how many moved. An entry already in
+    its shard wins over a flat copy, which is dropped."""
+    moved = 0
+    for name in sorted(os.listdir(cache_dir)):
+        if not (name.endswith(".json") and _KEY.fullmatch(name[:-5])):
+            continue
+        key, source = name[:-5], os.path.join(cache_dir, name)
+        target = entry_path(cache_dir, key)
+        try:
+            if os.path.exists(target) or os.path.exists(entry_path(cache_dir, key, ".rdgc")):
+                os.remove(source)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            stat = os.stat(source)
+            os.replace(source, target)
+        except FileNotFoundError:
+            continue  # another migrate got there first
+        _append_index(cache_dir, f"+ {key} {stat.st_size} {int(stat.st_mtime)}")
+        moved += 1
+    return moved
+
+
+class JsonDirCache:
+    """The default backend: one sharded file per entry, described by index.log.
+
+    Every backend answers the same calls: load(key) and load_many(keys) return cached responses
+    and record the hit, reading nothing else; load_prompt(key) returns the stored prompt, if one
+    was kept; save(key, prompt, response) stores one answer atomically (raising OSError or
+    sqlite3.Error on failure); contains(key) says whether an entry is stored, from the store itself
+    and without recording a hit; and entries() returns {key: IndexEntry} without reading any
+    response. `codec` and `prompts` (config.CACHE_CODECS, config.CACHE_PROMPT_MODES) say how new
+    entries are written; entries are read however they were written."""
+
+    name = "json"
+
+    def __init__(self, cache_dir: str, codec: str = "none", prompts: str = "inline"):
+        self.cache_dir = cache_dir
+        self.codec = codec
+        self.prompts = prompts
+
+    def load(self, key: str):
+        return read_entry(self.cache_dir, key)
+
+    def load_many(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            response = read_entry(self.cache_dir, key)
+            if response is not None:
+                found[key] = response
+        return found
+
+    def load_prompt(self, key: str):
+        return read_prompt(self.cache_dir, key)
+
+    def save(self, key: str, prompt: str, response: str) -> None:
+        write_entry(self.cache_dir, key, prompt, response, self.codec, self.prompts)
+
+    def contains(self, key: str) -> bool:
+        return any(os.path.exists(path) for path in _entry_paths(self.cache_dir, key))
+
+    def entries(self) -> dict:
+        return read_index(self.cache_dir)
+
+    # Maintenance (`cache gc`, `cache verify`). remove(keys) deletes entries and returns how many
+    # there were; prune_prompts() deletes prompt blobs no entry names; shrink() gives the space
+    # back; verify() returns [(key, kind, detail)], kind "unreadable", "prompt" or "index".
+
+    def remove(self, keys) -> int:
+        removed = 0
+        for key in keys:
+            found = False
+            for path in _entry_paths(self.cache_dir, key):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                    found = True
+            _append_index(self.cache_dir, f"- {key}")
+            removed += found
+        return removed
+
+    def prune_prompts(self) -> int:
+        """Blobs no indexed entry names. One written in the last hour is kept: the entry that
+        names it may be being written now."""
+        referenced = {entry.prompt for entry in read_index(self.cache_dir).values()
+                      if entry.prompt}
+        cutoff = time.time() - 3600
+        removed = 0
+        for root, _, names in os.walk(os.path.join(self.cache_dir, PROMPTS_DIR)):
+            for name in names:
+                if name in referenced or not _SHA.fullmatch(name):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+        return removed
+
+    def shrink(self) -> None:
+        compact_index(self.cache_dir, read_index(self.cache_dir))
+
+    def verify(self) -> list:
+        problems, on_disk = [], set()
+        for key, path in iter_entry_files(self.cache_dir):
+            on_disk.add(key)
+            try:
+                _, prompt = _read_file(self.cache_dir, path, with_prompt=True)
+                if path.endswith(".rdgc"):
+                    _, mode, sha = _packed_header(path)
+                    if mode != "hash":
+                        problem = _prompt_problem(prompt, sha)
+                        if problem:
+                            problems.append((key, "prompt", problem))
+            except (OSError,) + _UNREADABLE as e:
+                problems.append((key, "unreadable", f"{path}: {e}"))
+        index = read_index(self.cache_dir)
+        problems += [(key, "index", "on disk but not in the index")
+                     for key in sorted(on_disk - set(index))]
+        problems += [(key, "index", "in the index but not on disk")
+                     for key in sorted(set(index) - on_disk)]
+        return problems
+
+
+# Keys per IN (...) query; SQLite's default limit on bound variables is 999 before 3.32.
+_SQLITE_BATCH = 500
+_PENDING = object()
+
+# Columns added after the first SQLite store shipped; a database that lacks them gains them.
+_SQLITE_LATER_COLUMNS = (("codec", "TEXT"), ("prompt_mode", "TEXT"), ("prompt_sha", "TEXT"))
+
+
+class SqliteCache:
+    """Entries as rows of CACHE_DIR/cache.sqlite3 (RDG_CACHE_BACKEND=sqlite). A row's codec
+    compresses its response and an inline prompt; a "blob" prompt is a row of `prompts`."""
+
+    name = "sqlite"
+
+    def __init__(self, cache_dir: str, codec: str = "none", prompts: str = "inline"):
+        self.cache_dir = cache_dir
+        self.codec = codec
+        self.prompts = prompts
+        self.path = os.path.join(cache_dir, SQLITE_NAME)
+        self._local = threading.local()  # a connection may not cross threads
+        self._batch = threading.Condition()
+        self._pending = []
+        self._querying = False
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Autocommit: every statement is its own transaction. The timeout rides out another
+            # process's write, which under WAL blocks only other writers.
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, request TEXT, "
+                       "response TEXT NOT NULL, size INTEGER NOT NULL, created INTEGER NOT NULL, "
+                       "last_hit INTEGER)")
+            db.execute("CREATE TABLE IF NOT EXISTS prompts (sha TEXT PRIMARY KEY, "
+                       "codec TEXT NOT NULL, body BLOB NOT NULL)")
+            have = {row[1] for row in db.execute("PRAGMA table_info(entries)")}
+            for column, kind in _SQLITE_LATER_COLUMNS:
+                if column not in have:
+                    with contextlib.suppress(sqlite3.OperationalError):  # another process won
+                        db.execute(f"ALTER TABLE entries ADD COLUMN {column} {kind}")
+            self._local.db = db
+        return db
+
+    def load(self, key: str):
+        """The response for `key`, or None. Threads that ask while a query is running queue their
+        keys, and the next of them to find the database idle asks for all of them at once — so a
+        wave of steps starting together costs a query or two, not one per step."""
+        slot = [key, _PENDING]
+        with self._batch:
+            self._pending.append(slot)
+            while slot[1] is _PENDING:
+                if self._querying:
+                    self._batch.wait()
+                    continue
+                batch, self._pending = self._pending, []
+                self._querying = True
+                found = {}
+                self._batch.release()
+                try:
+                    found = self.load_many([pending[0] for pending in batch])
+                except sqlite3.Error as e:
+                    logging.error(f"Cache lookup failed in '{self.path}': {e}")
+                finally:
+                    self._batch.acquire()
+                    self._querying = False
+                    for pending in batch:
+                        pending[1] = found.get(pending[0])
+                    self._batch.notify_all()
+        return slot[1]
+
+    def load_many(self, keys) -> dict:
+        keys = list(dict.fromkeys(keys))
+        db = self._db()
+        found = {}
+        for start in range(0, len(keys), _SQLITE_BATCH):
+            chunk = keys[start:start + _SQLITE_BATCH]
+            marks = ",".join("?" * len(chunk))
+            for key, codec, response in db.execute(
+                    f"SELECT key, codec, response FROM entries WHERE key IN ({marks})", chunk):
+                try:
+                    found[key] = _unpack_column(codec, response)
+                except _UNREADABLE as e:
+                    logging.warning(f"Ignoring unreadable cache row {key} in '{self.path}': {e}")
+        hits = list(found)
+        for start in range(0, len(hits), _SQLITE_BATCH):
+            chunk = hits[start:start + _SQLITE_BATCH]
+            marks = ",".join("?" * len(chunk))
+            db.execute(f"UPDATE entries SET last_hit = ? WHERE key IN ({marks})",
+                       [int(time.time()), *chunk])
+        return found
+
+    def load_prompt(self, key: str):
+        db = self._db()
+        row = db.execute("SELECT codec, prompt_mode, request, prompt_sha FROM entries "
+                         "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        codec, mode, request, sha = row
+        if mode == "blob":
+            blob = db.execute("SELECT codec, body FROM prompts WHERE sha = ?", (sha,)).fetchone()
+            return None if blob is None else _unpack_column(*blob)
+        return None if request is None else _unpack_column(codec, request)
+
+    def save(self, key: str, prompt: str, response: str, created=None) -> None:
+        compress = CODECS[self.codec][0]
+
+        def pack(text):
+            return text if self.codec == "none" else compress(text.encode())
+
+        answer = pack(response)
+        sha = None if prompt is None else hashlib.sha256(prompt.encode()).hexdigest()
+        request = pack(prompt) if self.prompts == "inline" and prompt is not None else None
+        size = sum(len(v.encode()) if isinstance(v, str) else len(v)
+                   for v in (answer, request) if v is not None)
+        db = self._db()
+        db.execute("SAVEPOINT save_entry")  # one transaction, alone or inside copy_to_sqlite's
+        try:
+            if self.prompts == "blob" and prompt is not None:
+                db.execute("INSERT OR IGNORE INTO prompts VALUES (?, ?, ?)",
+                           (sha, self.codec, compress(prompt.encode())))
+            db.execute("INSERT OR REPLACE INTO entries (key, request, response, size, created, "
+                       "last_hit, codec, prompt_mode, prompt_sha) "
+                       "VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)",
+                       (key, request, answer, size,
+                        int(time.time() if created is None else created),
+                        self.codec, self.prompts, sha))
+        except BaseException:
+            db.execute("ROLLBACK TO save_entry")
+            db.execute("RELEASE save_entry")
+            raise
+        db.execute("RELEASE save_entry")
+
+    def contains(self, key: str) -> bool:
+        row = self._db().execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def entries(self) -> dict:
+        return {key: IndexEntry(size, created, last_hit, sha if mode == "blob" else None)
+                for key, size, created, last_hit, mode, sha in self._db().execute(
+                    "SELECT key, size, created, last_hit, prompt_mode, prompt_sha FROM entries")}
+
+    def remove(self, keys) -> int:
+        keys = list(keys)
+        db = self._db()
+        removed = 0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                chunk = keys[start:start + _SQLITE_BATCH]
+                removed += db.execute(
+                    f"DELETE FROM entries WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).rowcount
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return removed
+
+    def prune_prompts(self) -> int:
+        # One statement, so a save committing a blob together with its entry is never split.
+        return self._db().execute(
+            "DELETE FROM prompts WHERE sha NOT IN (SELECT prompt_sha FROM entries "
+            "WHERE prompt_mode = 'blob' AND prompt_sha IS NOT NULL)").rowcount
+
+    def shrink(self) -> None:
+        db = self._db()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("VACUUM")
+
+    def verify(self) -> list:
+        db = self._db()
+        problems = [(None, "unreadable", result)
+                    for (result,) in db.execute("PRAGMA quick_check") if result != "ok"]
+        for key, codec, response, mode, request, sha in db.execute(
+                "SELECT key, codec, response, prompt_mode, request, prompt_sha FROM entries"):
+            try:
+                _unpack_column(codec, response)
+                if mode == "blob":
+                    blob = db.execute("SELECT codec, body FROM prompts WHERE sha = ?",
+                                      (sha,)).fetchone()
+                    prompt = None if blob is None else _unpack_column(*blob)
+                elif mode == "hash" or sha is None:
+                    continue
+                else:
+                    prompt = None if request is None else _unpack_column(codec, request)
+            except _UNREADABLE as e:
+                problems.append((key, "unreadable", str(e)))
+                continue
+            problem = _prompt_problem(prompt, sha)
+            if problem:
+                problems.append((key, "prompt", problem))
+        return problems
+
+
+def _prompt_problem(prompt, sha):
+    if prompt is None:
+        return "stored prompt is missing"
+    if hashlib.sha256(prompt.encode()).hexdigest() != sha:
+        return "stored prompt does not match its sha256"
+    return None
+
+
+def _unpack_column(codec, value) -> str:
+    """A stored response or prompt as text. Rows from before codecs were recorded are text."""
+    if codec in (None, "none"):
+        return value if isinstance(value, str) else bytes(value).decode()
+    return CODECS[codec][1](value).decode()
+
+
+BACKENDS = {"json": JsonDirCache, "sqlite": SqliteCache}
+
+
+def open_cache(name: str, cache_dir: str, codec: str = "none", prompts: str = "inline"):
+    """The backend called `name` (config.CACHE_BACKENDS) over `cache_dir`."""
+    return BACKENDS[name](cache_dir, codec, prompts)
+
+
+def copy_to_sqlite(cache_dir: str, codec: str = "none", prompts: str = "inline") -> int:
+    """Copy every JSON-backend entry in `cache_dir` — sharded, flat or packed — into its SQLite
+    store, keeping each entry's creation time; returns how many were copied. The files are left
+    in place."""
+    target = SqliteCache(cache_dir, codec, prompts)
+    copied = 0
+    target._db().execute("BEGIN")
+    try:
+        for key, path in iter_entry_files(cache_dir):
+            try:
+                response, prompt = _read_file(cache_dir, path, with_prompt=True)
+                target.save(key, prompt, response, created=os.stat(path).st_mtime)
+            except (OSError, UnicodeDecodeError) + _UNREADABLE as e:
+                logging.warning(f"Skipping unreadable cache entry '{path}': {e}")
+                continue
+            copied += 1
+        target._db().execute("COMMIT")
+    except BaseException:
+        target._db().execute("ROLLBACK")
+        raise
+    return copied
+
+
+def prune_locks(cache_dir: str) -> int:
+    """Remove the lock files (gemini.cache_lock) that no process holds; returns how many. One is
+    only unlinked while this process holds it. A process that opened it just before can still
+    lock the unlinked file while a newcomer locks a new one: the cost is one duplicate model call,
+    never a wrong answer."""
+    if fcntl is None:
+        return 0
+    folder = os.path.join(cache_dir, LOCKS_DIR)
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+            removed += 1
+        except OSError:
+            continue  # held: a call for that key is in flight
+        finally:
+            os.close(fd)
+    return removed
+
+
+def last_used(entry: IndexEntry) -> int:
+    return max(entry.created, entry.last_hit or 0)
+
+
+def plan_gc(entries: dict, pinned=frozenset(), max_bytes=None, max_age=None, now=None) -> list:
+    """The keys `cache gc` removes from `entries` ({key: IndexEntry}), least recently used first:
+    every unpinned entry unused for longer than `max_age` seconds, then unpinned entries in LRU
+    order until the rest fit in `max_bytes`. Pinned entries are never chosen, even when they
+    alone exceed the budget."""
+    now = time.time() if now is None else now
+    candidates = sorted((key for key in entries if key not in pinned),
+                        key=lambda key: (last_used(entries[key]), key))
+    doomed = []
+    if max_age is not None:
+        doomed = [key for key in candidates if now - last_used(entries[key]) > max_age]
+    if max_bytes is not None:
+        chosen = set(doomed)
+        total = sum(entry.size for key, entry in entries.items() if key not in chosen)
+        for key in candidates:
+            if total <= max_bytes:
+                break
+            if key not in chosen:
+                doomed.append(key)
+                total -= entries[key].size
+    return doomed
+
+
+def _argparse_type(parse):
+    def convert(text):
+        try:
+            return parse(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    return convert
+
+
+def _human(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _ago(seconds: float) -> str:
+    for unit, span in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= span:
+            return f"{seconds / span:.0f}{unit} ago"
+    return "just now"
+
+
+def _print_stats(backend, cache_dir, pinned, now) -> None:
+    entries = backend.entries()
+    total = sum(entry.size for entry in entries.values())
+    held = [key for key in entries if key in pinned]
+    print(f"{cache_dir} ({backend.name})")
+    print(f"  entries    {len(entries):>8}  {_human(total)}")
+    print(f"  pinned     {len(held):>8}  {_human(sum(entries[k].size for k in held))}"
+          f"  (named by build manifests)")
+    print(f"  never hit  {sum(1 for e in entries.values() if e.last_hit is None):>8}")
+    if entries:
+        used = sorted(last_used(entry) for entry in entries.values())
+        print(f"  last used  oldest {_ago(now - used[0])}, newest {_ago(now - used[-1])}")
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m src.rdg.cache", description="Maintain the response cache.")
+    arg_parser.add_argument(
+        "--cache-dir", default=None,
+        help="The cache to work on. Default: RDG_CACHE_DIR, or .gemini_cache.")
+    arg_parser.add_argument(
+        "--backend", choices=sorted(BACKENDS), default=None,
+        help="The backend whose entries stats, gc and verify work on. Default: RDG_CACHE_BACKEND.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    migrate_command = commands.add_parser(
+        "migrate", help="Move flat <key>.json entries into the sharded layout.")
+    migrate_command.add_argument(
+        "--to", choices=["json", "sqlite"], default="json",
+        help="sqlite: copy every JSON entry into the SQLite store instead (written with "
+             "RDG_CACHE_COMPRESS and RDG_CACHE_PROMPTS).")
+    commands.add_parser("index", help="Rebuild the index from the entries on disk.")
+    commands.add_parser("stats", help="Entries, bytes, pinned entries and ages.")
+    gc_command = commands.add_parser(
+        "gc", help="Evict least recently used entries down to a size/age budget. Entries named "
+                   "by a notebook's build manifest (RDG_INCREMENTAL) are never evicted.")
+    gc_command.add_argument(
+        "--max-size", type=_argparse_type(config.parse_size),
+        default=os.environ.get("RDG_CACHE_MAX_SIZE") or None, metavar="SIZE",
+        help="Keep at most this much, e.g. 2G or 500M. Default: RDG_CACHE_MAX_SIZE.")
+    gc_command.add_argument(
+        "--max-age", type=_argparse_type(config.parse_age),
+        default=os.environ.get("RDG_CACHE_MAX_AGE") or None, metavar="AGE",
+        help="Evict entries unused for longer than this, e.g. 30d or 12h (a bare number is days). "
+             "Default: RDG_CACHE_MAX_AGE.")
+    gc_command.add_argument("--dry-run", action="store_true",
+                            help="Report what would be evicted; change nothing.")
+    verify_command = commands.add_parser(
+        "verify", help="Read every entry back; check stored prompts and the index.")
+    verify_command.add_argument(
+        "--repair", action="store_true",
+        help="Remove entries that will not read back and rebuild a disagreeing index.")
+    export_command = commands.add_parser(
+        "export", help="Write the entries the notebooks' last runs used to one bundle file.")
+    export_command.add_argument(
+        "notebooks", nargs="+", metavar="NOTEBOOK",
+        help="Notebooks, or directories searched for *.rdg files (as --workspace does).")
+    export_command.add_argument("-o", "--output", required=True, metavar="BUNDLE",
+                                help="The bundle to write, e.g. rdg-cache.bundle.gz.")
+    export_command.add_argument("--with-prompts", action="store_true",
+                                help="Include the stored prompts; a warm start does not need them.")
+    import_command = commands.add_parser(
+        "import", help="Merge bundles into the cache; entries already present are kept.")
+    import_command.add_argument("bundles", nargs="+", metavar="BUNDLE")
+    from .remote_cache import add_serve_command, serve  # remote_cache -> claude -> config
+    add_serve_command(commands)
+    args = arg_parser.parse_args(argv)
+    if args.command == "serve":
+        return serve(args)
+    cache_dir = args.cache_dir or config.CACHE_DIR
+    backend = open_cache(args.backend or config.CACHE_BACKEND, cache_dir,
+                         config.CACHE_COMPRESS, config.CACHE_PROMPTS)
+    if (backend.name == "json" and args.command in ("stats", "gc")
+            and not os.path.exists(os.path.join(cache_dir, INDEX_NAME))):
+        rebuild_index(cache_dir)  # a cache from before the index: one scan, then never again
+
+    if args.command == "migrate" and args.to == "sqlite":
+        copied = copy_to_sqlite(cache_dir, config.CACHE_COMPRESS, config.CACHE_PROMPTS)
+        print(f"Copied {copied} entries into {os.path.join(cache_dir, SQLITE_NAME)}")
+    elif args.command == "migrate":
+        print(f"Moved {migrate(cache_dir)} entries into shards under {cache_dir}")
+    elif args.command == "index":
+        entries = rebuild_index(cache_dir)
+        print(f"Indexed {len(entries)} entries ({sum(e.size for e in entries.values())} bytes) "
+              f"in {cache_dir}")
+    elif args.command == "stats":
+        from .manifest import manifest_cache_keys
+        _print_stats(backend, cache_dir, manifest_cache_keys(cache_dir), time.time())
+    elif args.command == "gc":
+        return _gc(backend, cache_dir, args)
+    elif args.command == "verify":
+        return _verify(backend, cache_dir, args.repair)
+    elif args.command == "export":
+        return _export(backend, cache_dir, args)
+    elif args.command == "import":
+        return _import(backend, cache_dir, args.bundles)
+    return 0
+
+
+def _export(backend, cache_dir, args) -> int:
+    from .bundle import export_bundle, notebook_keys
+    from .workspace import discover
+    try:
+        notebooks = discover(args.notebooks)
+    except FileNotFoundError as e:
+        print(f"Error: no such notebook or directory: {e}", file=sys.stderr)
+        return 1
+    keys = set()
+    for notebook in notebooks:
+        keys |= notebook_keys(cache_dir, notebook)
+    exported, missing = export_bundle(backend, keys, args.output, args.with_prompts)
+    print(f"Exported {exported} entries for {len(notebooks)} notebook(s) to {args.output} "
+          f"({_human(os.path.getsize(args.output))})")
+    if missing:
+        print(f"Warning: {missing} entries the runs used are no longer in {cache_dir}",
+              file=sys.stderr)
+    return 0
+
+
+def _import(backend, cache_dir, bundles) -> int:
+    from .bundle import import_bundle
+    for path in bundles:
+        try:
+            imported, present = import_bundle(backend, path)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        print(f"Imported {imported} entries from {path} into {cache_dir} ({present} already "
+              f"present)")
+    return 0
+
+
+def _gc(backend, cache_dir, args) -> int:
+    from .manifest import manifest_cache_keys  # manifest -> functions -> gemini -> this module
+    pinned = manifest_cache_keys(cache_dir)
+    entries = backend.entries()
+    doomed = plan_gc(entries, pinned, args.max_size, args.max_age)
+    freed = sum(entries[key].size for key in doomed)
+    kept = sum(entry.size for entry in entries.values()) - freed
+    verb = "Would evict" if args.dry_run else "Evicted"
+    print(f"{verb} {len(doomed)} entries ({_human(freed)}); kept {len(entries) - len(doomed)} "
+          f"({_human(kept)}), {sum(1 for key in entries if key in pinned)} pinned by build "
+          f"manifests")
+    if args.max_size is not None and kept > args.max_size:
+        print(f"Warning: pinned entries alone exceed the {_human(args.max_size)} budget",
+              file=sys.stderr)
+    if args.dry_run:
+        return 0
+    backend.remove(doomed)
+    prompts, locks = backend.prune_prompts(), prune_locks(cache_dir)
+    backend.shrink()
+    if prompts or locks:
+        print(f"Removed {prompts} unused prompt blobs and {locks} idle lock files")
+    return 0
+
+
+def _verify(backend, cache_dir, repair) -> int:
+    problems = backend.verify()
+    for key, kind, detail in problems:
+        print(f"{key or '(database)'}: {kind}: {detail}")
+    if not problems:
+        print(f"All entries in {cache_dir} ({backend.name}) read back")
+        return 0
+    if not repair:
+        print(f"{len(problems)} problem(s); rerun with --repair to fix them", file=sys.stderr)
+        return 1
+    unreadable = [key for key, kind, _ in problems if kind == "unreadable" and key]
+    backend.remove(unreadable)
+    if any(kind == "index" for _, kind, _ in problems):
+        rebuild_index(cache_dir)
+    print(f"Removed {len(unreadable)} unreadable entries"
+          + (", rebuilt the index" if any(k == "index" for _, k, _ in problems) else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
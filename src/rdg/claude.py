@@ -18,21 +18,28 @@ Configuration:
 - CLAUDE_CLI_EFFORT (optional) — reasoning effort (low/medium/high/xhigh/max).
   Unset omits the flag entirely and inherits the CLI default. Validated at
   import in config.py; an invalid value raises rather than degrading silently.
+- RDG_CLAUDE_POOL (optional) — keep this many CLI workers started and waiting,
+  so a call skips the CLI's startup (claude_pool.py); 0, the default, starts a
+  fresh process per call. RDG_CLAUDE_POOL_RECYCLE — prompts per worker (1).
 
 The last two are RUN-level defaults. A single `.rdg` step overrides both with the
 standard `model=` / `effort=` parameters, which arrive here as arguments — this is
 a model backend, so it takes the same two parameters the model formulas do.
 """
 
+import asyncio
 import logging
 import shutil
 import subprocess
 
+from . import claude_pool
 from .config import (
     CLAUDE_CLI_PATH,
     CLAUDE_CLI_MODEL,
     CLAUDE_CLI_TIMEOUT_SECONDS,
     CLAUDE_CLI_EFFORT,
+    CLAUDE_CLI_POOL,
+    CLAUDE_CLI_POOL_RECYCLE,
     resolve_claude_params,
 )
 from .events import emit_primitive
@@ -120,7 +127,8 @@ def call_claude(rendered_template, model=None, effort=None):
     does not become a fourth key on the memoised call above it.
 
     Uses --print (one-shot, no REPL) and pipes the prompt via stdin to avoid
-    argv length limits on long audit prompts.
+    argv length limits on long audit prompts. With RDG_CLAUDE_POOL set, the
+    prompt goes to a warm worker instead (claude_pool.py), same contract.
     """
     cli = _resolve_cli()
     if cli is None:
@@ -137,35 +145,112 @@ def call_claude(rendered_template, model=None, effort=None):
         backend="claude",
         timeout_s=CLAUDE_CLI_TIMEOUT_SECONDS,
     )
+    return _answer(argv, rendered_template)
+
+
+def _answer(argv, rendered_template):
+    """Run one prompt through the CLI — a fresh process, or a pooled worker — and return
+    call_claude's result: stdout, or the sentinel."""
     try:
-        result = subprocess.run(
-            argv,
-            input=rendered_template,
-            capture_output=True,
-            text=True,
-            timeout=CLAUDE_CLI_TIMEOUT_SECONDS,
-            check=False,
-        )
+        if CLAUDE_CLI_POOL > 0:
+            pool = claude_pool.pool_for(CLAUDE_CLI_POOL, CLAUDE_CLI_POOL_RECYCLE)
+            result = pool.run(argv, rendered_template, CLAUDE_CLI_TIMEOUT_SECONDS)
+        else:
+            result = subprocess.run(
+                argv,
+                input=rendered_template,
+                capture_output=True,
+                text=True,
+                timeout=CLAUDE_CLI_TIMEOUT_SECONDS,
+                check=False,
+            )
         if result.returncode != 0:
-            # BOTH streams. The CLI writes its error payload to STDOUT under
-            # `--output-format json`, so a stderr-only tail reported every real
-            # failure as "exit 1:" with nothing after the colon — reproduced
-            # twice downstream on a consumer pipeline. The
-            # cause was on stdout the whole time, and the report dropped it.
-            stderr_tail = (result.stderr or "").strip()[-500:]
-            stdout_tail = (result.stdout or "").strip()[-500:]
-            detail = f"exit {result.returncode}: {stderr_tail}"
-            if stdout_tail:
-                detail += f" | stdout: {stdout_tail}"
-            logging.error(f"Claude CLI exited {result.returncode}: {detail}")
-            return format_engine_error("ClaudeCliNonZeroExit", detail)
+            return _nonzero_exit(result.returncode, result.stdout, result.stderr)
         return result.stdout
     except subprocess.TimeoutExpired:
-        logging.error(f"Claude CLI timed out after {CLAUDE_CLI_TIMEOUT_SECONDS}s")
-        return format_engine_error(
-            "subprocess.TimeoutExpired",
-            f"Claude CLI timed out after {CLAUDE_CLI_TIMEOUT_SECONDS}s",
+        return _timed_out()
+    except Exception as e:
+        logging.error(f"Claude CLI invocation failed: {e}")
+        return format_engine_error(type(e).__name__, str(e))
+
+
+def _timed_out():
+    logging.error(f"Claude CLI timed out after {CLAUDE_CLI_TIMEOUT_SECONDS}s")
+    return format_engine_error(
+        "subprocess.TimeoutExpired",
+        f"Claude CLI timed out after {CLAUDE_CLI_TIMEOUT_SECONDS}s",
+    )
+
+
+def _nonzero_exit(returncode, stdout, stderr):
+    """The sentinel for a CLI that exited non-zero, carrying the tail of both streams."""
+    # BOTH streams. The CLI writes its error payload to STDOUT under
+    # `--output-format json`, so a stderr-only tail reported every real
+    # failure as "exit 1:" with nothing after the colon — reproduced
+    # twice downstream on a consumer pipeline. The
+    # cause was on stdout the whole time, and the report dropped it.
+    stderr_tail = (stderr or "").strip()[-500:]
+    stdout_tail = (stdout or "").strip()[-500:]
+    detail = f"exit {returncode}: {stderr_tail}"
+    if stdout_tail:
+        detail += f" | stdout: {stdout_tail}"
+    logging.error(f"Claude CLI exited {returncode}: {detail}")
+    return format_engine_error("ClaudeCliNonZeroExit", detail)
+
+
+def _text(data):
+    """Decode a pipe the way subprocess.run(text=True) does: universal newlines."""
+    return data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+async def call_claude_async(rendered_template, model=None, effort=None):
+    """call_claude on an asyncio subprocess, for the asyncio runner (RDG_ASYNC=1).
+
+    Same argv, same primitive event, same return contract: stdout on success, the
+    RDG-ENGINE-ERROR sentinel on a raise, a timeout or a non-zero exit, "" only when
+    the CLI is unavailable. A CLI that outlives the timeout is killed and reaped,
+    as subprocess.run does for the sync path. A pooled call (RDG_CLAUDE_POOL) is a
+    pipe write and a wait, made on a thread so the loop is not blocked.
+    """
+    cli = _resolve_cli()
+    if cli is None:
+        return ""
+    resolved_model, resolved_effort = resolve_claude_params(model, effort)
+    argv = build_argv(cli, resolved_model, resolved_effort)
+    emit_primitive(
+        model=resolved_model,
+        effort=resolved_effort,
+        backend="claude",
+        timeout_s=CLAUDE_CLI_TIMEOUT_SECONDS,
+    )
+    if CLAUDE_CLI_POOL > 0:
+        return await asyncio.to_thread(_answer, argv, rendered_template)
+    proc = None
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await asyncio.wait_for(
+            proc.communicate(rendered_template.encode()),
+            timeout=CLAUDE_CLI_TIMEOUT_SECONDS,
         )
+        if proc.returncode != 0:
+            return _nonzero_exit(proc.returncode, _text(stdout), _text(stderr))
+        return _text(stdout)
+    except asyncio.CancelledError:
+        # A hedge that lost its race (hedge.py): the CLI must not run on with nobody waiting.
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    except asyncio.TimeoutError:
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        return _timed_out()
     except Exception as e:
         logging.error(f"Claude CLI invocation failed: {e}")
         return format_engine_error(type(e).__name__, str(e))
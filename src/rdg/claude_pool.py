@@ -0,0 +1,245 @@
+"""A pool of warm Claude CLI workers, so a short prompt does not pay for starting the CLI.
+
+`claude --print` is a Node program. It loads, reads its credentials and opens a session before it
+reads stdin, and for a switch or SUMMARIZE prompt that startup is most of the call. With
+RDG_CLAUDE_POOL=N the engine keeps up to N workers already started and waiting, per argv (model
+and effort are flags, so one argv is one kind of worker). Workers run in the CLI's streaming JSON
+mode:
+
+    claude --print --model M [--effort E] \
+        --input-format stream-json --output-format stream-json --verbose
+
+A prompt is one user message, written to a worker's stdin as a JSON line. The answer is the
+`result` message the worker writes back on stdout, returned as the one-shot CLI prints it: the
+result text and a newline, byte for byte, because answers are cached and a pooled answer must not
+differ from the one `claude --print` would have given. When a call takes a worker, a replacement
+starts at once, so the next call finds one warm.
+
+A worker is a conversation: every prompt it answers is context for the next. An answer must
+depend on its prompt alone, since it is cached by its prompt, so by default a worker answers one
+prompt and is then retired — the pool saves the startup, not the session.
+RDG_CLAUDE_POOL_RECYCLE=K lets a worker answer K prompts before it is replaced, for callers whose
+prompts tolerate the shared context. The startup is then paid once per K calls.
+
+Failures keep the one-shot CLI's contract. ClaudePool.run returns a subprocess.CompletedProcess
+as subprocess.run(check=False) does: an error result or a worker that exits mid-call is a non-zero
+returncode with what it wrote on both streams, and a worker that does not answer in time is killed
+and raises subprocess.TimeoutExpired. Callers therefore keep their own handling: claude.py turns
+these into the RDG-ENGINE-ERROR sentinel, switch.py into SwitchUnavailableError. A dead idle
+worker is dropped and replaced when next wanted, and no worker outlives the process.
+
+Standard library only, like switch.py, which uses this without importing config.
+"""
+
+import atexit
+import collections
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+STREAM_FLAGS = ["--input-format", "stream-json", "--output-format", "stream-json", "--verbose"]
+_STDERR_LINES = 64  # of a worker's stderr, kept for the error of a call it fails
+
+
+class Worker:
+    """One `claude` process in streaming JSON mode, answering one prompt at a time."""
+
+    def __init__(self, argv):
+        self.argv = list(argv) + STREAM_FLAGS
+        self.uses = 0
+        self.proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        self._lines = queue.Queue()
+        self._stderr = collections.deque(maxlen=_STDERR_LINES)
+        self._readers = [
+            threading.Thread(target=self._read_stdout, name="rdg-claude-stdout", daemon=True),
+            threading.Thread(target=self._read_stderr, name="rdg-claude-stderr", daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _read_stdout(self):
+        with self.proc.stdout:
+            for line in self.proc.stdout:
+                self._lines.put(line)
+        self._lines.put(None)
+
+    def _read_stderr(self):
+        with self.proc.stderr:
+            for line in self.proc.stderr:
+                self._stderr.append(line)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def ask(self, prompt: str, timeout: float) -> subprocess.CompletedProcess:
+        """Send one prompt; wait up to `timeout` seconds for its result."""
+        self.uses += 1
+        message = {"type": "user",
+                   "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}}
+        seen = []
+        try:
+            self.proc.stdin.write(json.dumps(message) + "\n")
+            self.proc.stdin.flush()
+        except OSError:
+            return self._exited(seen)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.close()
+                raise subprocess.TimeoutExpired(self.argv, timeout) from None
+            if line is None:
+                return self._exited(seen)
+            seen.append(line)
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(event, dict) or event.get("type") != "result":
+                continue
+            answer = event.get("result")
+            if event.get("is_error") or not isinstance(answer, str):
+                # What --print would have written to stdout before exiting 1.
+                return subprocess.CompletedProcess(self.argv, 1, line, "".join(self._stderr))
+            # --print's text output is the result and a newline.
+            return subprocess.CompletedProcess(self.argv, 0, answer + "\n", "")
+
+    def _exited(self, seen):
+        """The worker died before it answered: its exit status and both streams."""
+        try:
+            returncode = self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.close()
+            returncode = self.proc.returncode
+        for reader in self._readers:
+            reader.join(timeout=1)
+        return subprocess.CompletedProcess(self.argv, returncode or 1, "".join(seen),
+                                           "".join(self._stderr))
+
+    def close(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"Claude CLI worker {self.proc.pid} did not exit when killed")
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass  # the readers see EOF and close stdout and stderr as they finish
+
+
+class ClaudePool:
+    """Up to `size` warm workers per argv; each answers `recycle` prompts, then is replaced."""
+
+    def __init__(self, size: int, recycle: int = 1):
+        self.size = size
+        self.recycle = max(1, recycle)
+        self._idle = {}  # tuple(argv) -> [Worker], oldest first
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def run(self, argv, prompt: str, timeout: float) -> subprocess.CompletedProcess:
+        """Answer `prompt` on a warm worker for `argv`; see the module docstring for the contract.
+        Raises subprocess.TimeoutExpired, or OSError when no worker can be started."""
+        key = tuple(argv)
+        worker = self._take(key)
+        try:
+            result = worker.ask(prompt, timeout)
+        except BaseException:
+            worker.close()
+            raise
+        if result.returncode != 0:
+            worker.close()
+        else:
+            self._give_back(key, worker)
+        return result
+
+    def _take(self, key):
+        dead = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            worker = None
+            while idle and worker is None:
+                candidate = idle.pop(0)
+                if candidate.alive():
+                    worker = candidate
+                else:
+                    dead.append(candidate)
+            missing = self.size - len(idle)
+        for candidate in dead:
+            logging.warning(f"Claude CLI worker {candidate.proc.pid} exited while idle "
+                            f"(status {candidate.proc.returncode}); replacing it")
+            candidate.close()
+        if worker is None:
+            worker = Worker(key)  # cold: the first call, or more calls at once than workers
+        if worker.uses + 1 < self.recycle:
+            missing -= 1  # this one comes back after the call
+        for _ in range(missing):
+            self._warm(key)
+        return worker
+
+    def _warm(self, key):
+        try:
+            spare = Worker(key)
+        except OSError as e:
+            logging.warning(f"Could not start a warm Claude CLI worker: {e}")
+            return
+        self._park(key, spare)
+
+    def _give_back(self, key, worker):
+        if worker.uses >= self.recycle or not worker.alive():
+            worker.close()
+            return
+        self._park(key, worker)
+
+    def _park(self, key, worker):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            keep = not self._closed and len(idle) < self.size
+            if keep:
+                idle.append(worker)
+        if not keep:
+            worker.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers = [worker for idle in self._idle.values() for worker in idle]
+            self._idle.clear()
+        for worker in workers:
+            worker.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(size: int, recycle: int = 1) -> ClaudePool:
+    """The process's pool for these settings, made on first use and closed at exit."""
+    with _pools_lock:
+        pool = _pools.get((size, recycle))
+        if pool is None:
+            pool = _pools[(size, recycle)] = ClaudePool(size, recycle)
+        return pool
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -1,5 +1,6 @@
 import os
 import logging
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,7 +18,100 @@ logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 CACHE_DIR = os.environ.get("RDG_CACHE_DIR", ".gemini_cache")
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# How the response cache is stored (cache.py): "json", one sharded file per entry (the default),
+# or "sqlite", one WAL-mode database per CACHE_DIR, for filesystems where opening thousands of
+# small files is itself the cost of a run.
+CACHE_BACKENDS = ("json", "sqlite")
+CACHE_BACKEND = os.environ.get("RDG_CACHE_BACKEND", "").strip().lower() or "json"
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(
+        f"RDG_CACHE_BACKEND={CACHE_BACKEND!r} is not a cache backend; "
+        f"expected one of: {', '.join(CACHE_BACKENDS)}"
+    )
+
+# How new cache entries are written, by either backend (cache.py). RDG_CACHE_COMPRESS compresses
+# each answer (and a kept prompt) with a stdlib codec. RDG_CACHE_PROMPTS keeps the rendered prompt
+# "inline" in its entry (the default), as one shared "blob" per distinct prompt, or as its "hash"
+# alone. Every entry records how it was written, so changing either never costs a cache hit.
+CACHE_CODECS = ("none", "zlib", "lzma")
+CACHE_PROMPT_MODES = ("inline", "blob", "hash")
+
+
+def _cache_choice(name, default, allowed):
+    value = os.environ.get(name, "").strip().lower() or default
+    if value not in allowed:
+        raise ValueError(
+            f"{name}={value!r} is not supported; expected one of: {', '.join(allowed)}")
+    return value
+
+
+CACHE_COMPRESS = _cache_choice("RDG_CACHE_COMPRESS", "none", CACHE_CODECS)
+CACHE_PROMPTS = _cache_choice("RDG_CACHE_PROMPTS", "inline", CACHE_PROMPT_MODES)
+
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?")
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+_AGE = re.compile(r"(\d+(?:\.\d+)?)\s*([smhdw]?)")
+_AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "": 86400}
+
+
+def parse_size(text: str) -> int:
+    """Bytes from '750M', '2G', '1.5GiB' or a bare byte count (binary units)."""
+    match = _SIZE.fullmatch(text.strip().lower())
+    if not match:
+        raise ValueError(f"expected a size such as 500M or 2G, got {text!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def parse_age(text: str) -> float:
+    """Seconds from '30d', '12h', '2w', '90m', '45s', or a bare number of days."""
+    match = _AGE.fullmatch(text.strip().lower())
+    if not match:
+        raise ValueError(f"expected an age such as 30d or 12h, got {text!r}")
+    return float(match.group(1)) * _AGE_UNITS[match.group(2)]
+
+
+# A shared remote tier behind the local response cache (remote_cache.py): an HTTP cache read with
+# GET and written with PUT at <url>/<key>. Unset, there is none. RDG_CACHE_REMOTE_UPLOAD=0 makes
+# this machine read-only, e.g. a developer laptop reading what CI wrote.
+CACHE_REMOTE = os.environ.get("RDG_CACHE_REMOTE", "").strip()
+CACHE_REMOTE_TOKEN = os.environ.get("RDG_CACHE_REMOTE_TOKEN") or None
+CACHE_REMOTE_TIMEOUT = float(os.environ.get("RDG_CACHE_REMOTE_TIMEOUT") or 5)
+CACHE_REMOTE_UPLOAD = os.environ.get("RDG_CACHE_REMOTE_UPLOAD", "1").strip() != "0"
+
+
+# The in-process memo in front of each model backend (memo.py) keeps at most this many bytes of
+# answers, least recently used out first. It saves a repeated call within one process; the
+# response cache above is what survives between runs. 0 turns it off.
+def _memo_budget():
+    text = os.environ.get("RDG_MEMO_MAX_SIZE", "").strip() or "256M"
+    try:
+        return parse_size(text)
+    except ValueError as e:
+        raise ValueError(f"RDG_MEMO_MAX_SIZE: {e}") from None
+
+
+MEMO_MAX_BYTES = _memo_budget()
+
 THROTTLE_SECONDS = 1
+
+# Client-side Gemini quota, per model: requests and tokens per minute (0: unlimited), and the
+# retries, with exponential backoff from RDG_GEMINI_BACKOFF seconds, a 429 gets before the Claude
+# fallback. See src/rdg/ratelimit.py.
+GEMINI_RPM = float(os.environ.get("RDG_GEMINI_RPM", "0") or 0)
+GEMINI_TPM = float(os.environ.get("RDG_GEMINI_TPM", "0") or 0)
+GEMINI_RETRIES = int(os.environ.get("RDG_GEMINI_RETRIES", "4"))
+GEMINI_BACKOFF = float(os.environ.get("RDG_GEMINI_BACKOFF", "1"))
+
+# Hedged Gemini calls (src/rdg/hedge.py): a call still running past this percentile of its
+# model's recent latencies gets a duplicate, sent to RDG_HEDGE_TO, within a budget of
+# RDG_HEDGE_BUDGET hedges per call made. 0, the default, never hedges.
+HEDGE_PERCENTILE = float(os.environ.get("RDG_HEDGE_PERCENTILE", "0") or 0)
+HEDGE_TO = os.environ.get("RDG_HEDGE_TO", "gemini")
+HEDGE_BUDGET = float(os.environ.get("RDG_HEDGE_BUDGET", "0.05"))
+if not 0 <= HEDGE_PERCENTILE < 100:
+    raise ValueError(f"RDG_HEDGE_PERCENTILE must be in [0, 100), got {HEDGE_PERCENTILE:g}")
+if HEDGE_TO not in ("gemini", "claude"):
+    raise ValueError(f"RDG_HEDGE_TO must be 'gemini' or 'claude', got {HEDGE_TO!r}")
 MAX_OUTPUT_TOKENS = 8000  # Gemini ceiling — applies to Gemini calls only.
 
 api_key = os.environ.get("GEMINI_API_KEY")
@@ -82,6 +176,10 @@ def validate_effort(value, source):
 CLAUDE_CLI_PATH = os.environ.get("CLAUDE_CLI_PATH", "claude")
 CLAUDE_CLI_MODEL = os.environ.get("CLAUDE_CLI_MODEL", "sonnet")
 CLAUDE_CLI_TIMEOUT_SECONDS = int(os.environ.get("CLAUDE_CLI_TIMEOUT_SECONDS", "600"))
+# Warm CLI workers kept per model/effort (0: a fresh `claude --print` per call), and how many
+# prompts each answers before it is replaced. See src/rdg/claude_pool.py.
+CLAUDE_CLI_POOL = int(os.environ.get("RDG_CLAUDE_POOL", "0"))
+CLAUDE_CLI_POOL_RECYCLE = int(os.environ.get("RDG_CLAUDE_POOL_RECYCLE", "1"))
 
 # Claude CLI reasoning-effort level, passed through as `--effort <level>`.
 #
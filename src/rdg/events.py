@@ -25,6 +25,20 @@ opt-in gate and the same ``ev`` envelope, and name what a model invocation actua
      "model": "gemini-3-flash-preview", "effort": "high", "backend": "gemini",
      "timeout_s": null, "ts": "..."}
 
+When a Gemini call waits for its rate limit, or for a 429's backoff (ratelimit.py), the wait is
+published before it starts; ``cause`` is "rpm", "tpm" or "429":
+    {"ev": "throttle", "backend": "gemini", "model": "gemini-3-flash-preview", "waited_s": 1.5,
+     "cause": "rpm", "ts": "..."}
+
+A Gemini call that runs past RDG_HEDGE_PERCENTILE gets a second request (hedge.py), announced
+with the threshold it passed; a duplicate Gemini request is then a primitive with "phase": "hedge":
+    {"ev": "hedge", "model": "gemini-3-flash-preview", "after_s": 12.4, "ts": "..."}
+
+At the end of a CLI run, each in-process model memo that was asked anything reports its counts
+(memo.py):
+    {"ev": "memo", "name": "gemini", "hits": 4, "misses": 9, "evictions": 0, "entries": 9,
+     "currbytes": 81234, "maxbytes": 268435456, "ts": "..."}
+
 Every event carries dispatch facts only — never prompt text, file contents, absolute paths, or
 credentials.
 """
@@ -68,7 +82,9 @@ def emit(ev: str, **fields) -> None:
     line = json.dumps(payload, separators=(",", ":"))
     _logger.debug("event %s", line)
     if events_enabled():
-        print(line, file=sys.stderr, flush=True)
+        # ONE write, for the reason spelled out in emit_primitive: concurrent steps share stderr.
+        sys.stderr.write(line + "\n")
+        sys.stderr.flush()
 
 
 def formula_context(formula: str):
@@ -1,6 +1,7 @@
 import os
 import logging
-from .parser import parse_rdg_line
+from .notebook import load_notebook
+from .parser import resolve_rdg_line
 
 def extract_output_files_and_commands(rdg_file: str, file_dir: str) -> dict[str, str]:
     """
@@ -15,14 +16,15 @@ def extract_output_files_and_commands(rdg_file: str, file_dir: str) -> dict[str,
     """
     output_files_and_commands = {}
     try:
-        with open(rdg_file, 'r') as f:
-            for line in f:
-                output_file, formula_name, arguments = parse_rdg_line(line, file_dir)
-                if output_file:
-                    output_files_and_commands[output_file] = {
-                        "formula": formula_name,
-                        "arguments": arguments
-                    }
+        for line in load_notebook(rdg_file).rules():
+            if line.error is not None:
+                raise line.error
+            output_file, formula_name, arguments = resolve_rdg_line(line.syntax)
+            if output_file:
+                output_files_and_commands[output_file] = {
+                    "formula": formula_name,
+                    "arguments": arguments
+                }
     except FileNotFoundError:
         print(f"Error: RDG file not found at '{rdg_file}'")
     except Exception as e:
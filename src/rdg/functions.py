@@ -1,13 +1,28 @@
+import asyncio
+import contextlib
 import contextvars
+import hashlib
 import os
+import threading
 import glob as glob_module
 from pathlib import PurePath
-from .template import render_template
-from .gemini import memoized_gemini_call, load_from_cache, save_to_cache, get_cache_key
+from .config import cache_identity
+from .template import render_template, template_pieces
+from .gemini import (
+    memoized_gemini_call,
+    memoized_gemini_call_async,
+    load_from_cache,
+    load_from_cache_async,
+    save_to_cache,
+    save_to_cache_async,
+    get_cache_key,
+    cache_lock,
+    cache_lock_async,
+)
 from .events import formula_context
 from typing import Dict, Callable, Any
 import logging
-from ..llm.ollama import ollama_call
+from ..llm.ollama import ollama_call, ollama_call_async
 
 # The read-fence, armed only by the RDG_JOBS wave runner (parser._run_step) and only for the
 # duration of one formula call. Serial execution never sets it, so serial behavior is untouched.
@@ -20,36 +35,59 @@ from ..llm.ollama import ollama_call
 # ANY step's destination that is not among its declared ancestors is a scheduling bug, reported as
 # reader, writer, and the missing edge.
 #
-# Coverage is process_input only — the choke point through which every KNOWN_SAFE formula resolves
-# path-valued arguments. Formulas outside KNOWN_SAFE run as barriers with nothing else in flight,
-# so their unfenced reads cannot race.
+# Coverage is process_input — the choke point through which every KNOWN_SAFE formula resolves
+# path-valued arguments — plus every file the walkers (GLOBTOMARKDOWN, DIRECTORYTOMARKDOWN,
+# FILESORDIRECTORIESTOMARKDOWN, LISTPATHS) and FILESTOMARKDOWN open or list, since those no
+# longer run as barriers (parser.WALKER_READ_SETS). Formulas outside both run as barriers with
+# nothing else in flight, so their unfenced reads cannot race.
 _READ_FENCE = contextvars.ContextVar("rdg_read_fence", default=None)
 
 
+def _check_read_fence(path, shown):
+    """Raise ReadFenceError if the armed fence forbids reading `path` (displayed as `shown`)."""
+    fence = _READ_FENCE.get()
+    if fence is None:
+        return
+    all_dests, allowed, reader = fence
+    normalized = os.path.abspath(path)
+    if normalized in all_dests and normalized not in allowed:
+        raise ReadFenceError(
+            f"read fence: {reader} read '{shown}', which is written by "
+            f"{all_dests[normalized]} with no dependency edge between them. "
+            f"The parallel plan missed this edge; running serially is safe."
+        )
+
+
 def process_input(input_arg, file_dir):
+    file_path = _resolve_input(input_arg, file_dir)
+    if file_path is None:
+        return input_arg
+    return _read_input(file_path)
+
+
+def _resolve_input(input_arg, file_dir):
+    """The file `input_arg` names, or None when it is literal text; fenced and logged either way."""
     file_path = os.path.join(file_dir, input_arg)
-    fence = _READ_FENCE.get()
-    if fence is not None:
-        all_dests, allowed, reader = fence
-        normalized = os.path.normpath(file_path)
-        if normalized in all_dests and normalized not in allowed:
-            raise RdgParserError(
-                f"read fence: {reader} read '{input_arg}', which is written by "
-                f"{all_dests[normalized]} with no dependency edge between them. "
-                f"The parallel plan missed this edge; running serially is safe."
-            )
+    _check_read_fence(file_path, input_arg)
     logging.info(f"Checking for file: {file_path}")
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            return f.read().strip()
-    else:
-        return input_arg
+    return file_path if os.path.exists(file_path) else None
+
+
+def _read_input(file_path):
+    with open(file_path, 'r') as f:
+        return f.read().strip()
 
 class RdgParserError(Exception):
     """Custom exception for RDG parsing errors."""
     pass
 
 
+class ReadFenceError(RdgParserError):
+    """A read the parallel plan did not order. Walkers that report per-file errors inline must
+    re-raise it: written into the artifact, it is exactly the silent failure the fence exists for."""
+    pass
+
+
 def _parse_exclude_patterns(exclude_str: str) -> list[str]:
     """Split a comma-separated exclude string into stripped glob patterns.
 
@@ -201,8 +239,71 @@ def _reserved_name_hint(error) -> str:
     return ""
 
 
+# Single-flight for _model_call: one lock per cache key while a call for it is in flight, so
+# identical prompts asked concurrently (RDG_JOBS, and above all a workspace run where many
+# notebooks share boilerplate prompts) make ONE request. The followers wait, then find the answer
+# in the filesystem cache or in memoized_gemini_call's memo. Entries are dropped once nobody waits.
+_flights_guard = threading.Lock()
+_flights = {}
+
+
+@contextlib.contextmanager
+def _single_flight(key):
+    with _flights_guard:
+        entry = _flights.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _flights_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _flights[key]
+
+
+# The same table for the asyncio runner, with asyncio.Locks: coroutines share one thread, so the
+# wait must be an await. Touched only from the event loop's thread, which needs no guard.
+_async_flights = {}
+
+
+@contextlib.asynccontextmanager
+async def _single_flight_async(key):
+    entry = _async_flights.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _async_flights[key]
+
+
+# The cache keys a step's model calls used, collected for the step's build-manifest entry
+# (manifest.py) so that `cache gc` never evicts an answer a current manifest was built from. The
+# runner arms it per step, like the read-fence, only when a manifest is open.
+_CACHE_KEYS = contextvars.ContextVar("rdg_cache_keys", default=None)
+
+
+@contextlib.contextmanager
+def collecting_cache_keys(keys):
+    """Append the cache key of every model call made inside the block to `keys` (a list)."""
+    token = _CACHE_KEYS.set(keys)
+    try:
+        yield
+    finally:
+        _CACHE_KEYS.reset(token)
+
+
+def _note_cache_key(cache_key):
+    keys = _CACHE_KEYS.get()
+    if keys is not None:
+        keys.append(cache_key)
+
+
 def _model_call(formula: str, rendered_template: str, model=None, effort=None,
-                use_filesystem_cache=True) -> str:
+                use_filesystem_cache=True, missed=False) -> str:
     """The ONE place a built-in formula reaches a model.
 
     Cache first (byte-equality on prompt + call identity), then at most one real invocation. Every
@@ -214,18 +315,55 @@ def _model_call(formula: str, rendered_template: str, model=None, effort=None,
     claude.py), NOT here, so a cache hit emits nothing: a line for a call that did not happen is
     the phantom this engine refuses in its artifacts. `formula` reaches that emission through a
     ContextVar rather than through the call, which keeps it off the memoisation key.
+
+    Concurrent calls with the same key are single-flight: within the process (_single_flight) and
+    across processes sharing CACHE_DIR (gemini.cache_lock), the first makes the call and the rest
+    wait for it and answer from the cache it fills. The locks are for misses only: a hit is served
+    before either is taken, and a miss looks again under them (the local tier only — the remote
+    was just asked) in case another caller filled it meanwhile. `missed` says the caller has just
+    looked this key up itself (_cached_answer) and found nothing, so the first look is skipped.
     """
     cache_key = get_cache_key(rendered_template, model, effort)
-    cached_request, cached_response = load_from_cache(cache_key)
+    _note_cache_key(cache_key)
+    cached_response = None if missed else load_from_cache(cache_key)
+    if cached_response:
+        logging.info(f"Loaded from cache (key: {cache_key})")
+        return cached_response
+    with _single_flight(cache_key), cache_lock(cache_key):
+        cached_response = load_from_cache(cache_key, remote=False)
+        if cached_response:
+            logging.info(f"Loaded from cache (key: {cache_key})")
+            return cached_response
+        logging.info(f"API Call (key: {cache_key})")
+        with formula_context(formula):
+            response_text = memoized_gemini_call(rendered_template, model, effort)
+        if use_filesystem_cache:
+            save_to_cache(cache_key, rendered_template, response_text)
+        return response_text
+
+
+async def _model_call_async(formula: str, rendered_template: str, model=None, effort=None,
+                            use_filesystem_cache=True, missed=False) -> str:
+    """_model_call for the asyncio runner (RDG_ASYNC=1): the same cache contract around an awaited
+    backend, so a step costs the event loop a coroutine rather than a blocked thread. The remote
+    cache tier is asked and written on a worker thread (gemini.load_from_cache_async)."""
+    cache_key = get_cache_key(rendered_template, model, effort)
+    _note_cache_key(cache_key)
+    cached_response = None if missed else await load_from_cache_async(cache_key)
     if cached_response:
         logging.info(f"Loaded from cache (key: {cache_key})")
         return cached_response
-    logging.info(f"API Call (key: {cache_key})")
-    with formula_context(formula):
-        response_text = memoized_gemini_call(rendered_template, model, effort)
-    if use_filesystem_cache:
-        save_to_cache(cache_key, rendered_template, response_text)
-    return response_text
+    async with _single_flight_async(cache_key), cache_lock_async(cache_key):
+        cached_response = load_from_cache(cache_key, remote=False)
+        if cached_response:
+            logging.info(f"Loaded from cache (key: {cache_key})")
+            return cached_response
+        logging.info(f"API Call (key: {cache_key})")
+        with formula_context(formula):
+            response_text = await memoized_gemini_call_async(rendered_template, model, effort)
+        if use_filesystem_cache:
+            await save_to_cache_async(cache_key, rendered_template, response_text)
+        return response_text
 
 
 def gemini_prompt_template(rdg_file:str, use_filesystem_cache=True, model=None, effort=None,
@@ -246,28 +384,134 @@ def gemini_prompt_template(rdg_file:str, use_filesystem_cache=True, model=None,
   except Exception as e:
       raise RdgParserError(f"Error during LLM call: {e}{_reserved_name_hint(e)}")
 
-def ollama_prompt(rdg_file:str, use_filesystem_cache=True, **kwargs) -> str:
-  """Sends the file content to an LLM and returns the response using caching."""
+# Each model formula below is split in two: rendering the prompt (file reads, template fill) and
+# the call. The sync formula and its async twin (ASYNC_TWINS) share the rendering half, so the two
+# runners cannot send different prompts for the same line.
 
-  try:
-      if "template" not in kwargs:
-          raise RdgParserError("Template must be supplied when using the GEMINIPROMPT")
-      template = kwargs.pop("template")
+# Hash before render. A GEMINIPROMPT over gathered inputs used to read every input into memory,
+# join them into the rendered prompt, log all of it, and only then hash it for the cache key — a
+# multi-megabyte string built to be thrown away on a hit. A PendingPrompt holds the template and
+# where each input lives; cache_key streams exactly the bytes render_template would produce
+# through the same md5 get_cache_key uses, an input file at a time, a chunk at a time, so keys
+# are unchanged. Only a miss renders (and logs) the prompt, and _model_call then keys the rendered
+# string itself, so an input that changed in between can never file an answer under a stale key.
+_HASH_CHUNK = 1 << 20
+
+
+class PendingPrompt:
+    """A template and its resolved inputs, not yet joined into the prompt."""
 
-      input_data = {}
-      for key, value in kwargs.items():
-          # Pass file_dir to process input
-          input_data[key] = process_input(value, os.path.dirname(rdg_file))
+    def __init__(self, template: str, inputs: dict):
+        self.template = template
+        self.inputs = inputs  # name -> (file path, None), or (None, literal text)
 
-      rendered_template = render_template(template, input_data)
+    def render(self) -> str:
+        input_data = {name: text if path is None else _read_input(path)
+                      for name, (path, text) in self.inputs.items()}
+        rendered_template = render_template(self.template, input_data)
+        logging.info(f"Rendered template:\n{rendered_template}")
+        return rendered_template
 
-      logging.info(f"Rendered template:\n{rendered_template}")
+    def cache_key(self, model=None, effort=None):
+        """get_cache_key(self.render(), model, effort), without rendering; None when only
+        rendering can tell (the template is one render_template refuses, an input will not
+        read, the prompt would be blank)."""
+        pieces = template_pieces(self.template, self.inputs)
+        if pieces is None:
+            return None
+        digest, blank = hashlib.md5(), True
+        try:
+            for kind, value in pieces:
+                if kind == "text":
+                    chunks = (value,)
+                else:
+                    path, text = self.inputs[value]
+                    chunks = (text,) if path is None else _stripped_chunks(path)
+                for chunk in chunks:
+                    blank = blank and (not chunk or chunk.isspace())
+                    digest.update(chunk.encode())
+        except (OSError, UnicodeDecodeError):
+            return None
+        if blank:
+            return None
+        digest.update(cache_identity(model, effort).encode())
+        return digest.hexdigest()
+
+
+def _stripped_chunks(path):
+    """_read_input(path) in pieces: the file's text, stripped, never all in memory at once."""
+    with open(path, 'r') as f:
+        started, held = False, ""  # held: whitespace that is only kept if text follows it
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                return
+            if not started:
+                chunk = chunk.lstrip()
+                started = bool(chunk)
+            body = chunk.rstrip()
+            if body:
+                yield held + body if held else body
+                held = chunk[len(body):]
+            else:
+                held += chunk
+
+
+def _cached_answer(prompt: PendingPrompt, model, effort, use_filesystem_cache):
+    """(the cached answer for `prompt`, found by its streamed key, or None; whether the cache was
+    asked). A miss falls through to _model_call, which renders, keys and single-flights the call
+    as always, and is told the key has just missed so it does not ask again."""
+    if not use_filesystem_cache:
+        return None, False
+    cache_key = prompt.cache_key(model, effort)
+    if cache_key is None:
+        return None, False
+    cached_response = load_from_cache(cache_key)
+    if cached_response:
+        _note_cache_key(cache_key)
+        logging.info(f"Loaded from cache (key: {cache_key}, prompt not rendered)")
+    return cached_response or None, True
 
+
+def _pending_inputs(rdg_file: str, kwargs: dict) -> dict:
+    file_dir = os.path.dirname(rdg_file)
+    inputs = {}
+    for key, value in kwargs.items():
+        path = _resolve_input(value, file_dir)
+        inputs[key] = (path, None if path else value)
+    return inputs
+
+
+def _template_prompt(rdg_file: str, kwargs: dict) -> PendingPrompt:
+    if "template" not in kwargs:
+        raise RdgParserError("Template must be supplied when using the GEMINIPROMPT")
+    template = kwargs.pop("template")
+    return PendingPrompt(template, _pending_inputs(rdg_file, kwargs))
+
+
+def _render_template_prompt(rdg_file: str, kwargs: dict) -> str:
+    return _template_prompt(rdg_file, kwargs).render()
+
+
+def ollama_prompt(rdg_file:str, use_filesystem_cache=True, **kwargs) -> str:
+  """Sends the file content to an LLM and returns the response using caching."""
+
+  try:
+      rendered_template = _render_template_prompt(rdg_file, kwargs)
       response_text = ollama_call(rendered_template)
       return response_text
   except Exception as e:
       raise RdgParserError(f"Error during LLM call: {e}")
 
+
+async def ollama_prompt_async(rdg_file:str, use_filesystem_cache=True, **kwargs) -> str:
+  try:
+      rendered_template = _render_template_prompt(rdg_file, kwargs)
+      return await ollama_call_async(rendered_template)
+  except Exception as e:
+      raise RdgParserError(f"Error during LLM call: {e}")
+
+
 def gemini_prompt(rdg_file:str, use_filesystem_cache=True, model=None, effort=None,
                   **kwargs) -> str:
     """Sends the file content to an LLM and returns the response using caching.
@@ -279,23 +523,44 @@ def gemini_prompt(rdg_file:str, use_filesystem_cache=True, model=None, effort=No
     """
 
     try:
-        if "template" not in kwargs:
-            raise RdgParserError("Template must be supplied when using the GEMINIPROMPT")
-        template = kwargs.pop("template")
-
-        input_data = {}
-        for key, value in kwargs.items():
-            # Pass file_dir to process input
-            input_data[key] = process_input(value, os.path.dirname(rdg_file))
-
-        rendered_template = render_template(template, input_data)
+        prompt = _template_prompt(rdg_file, kwargs)
+        cached_response, missed = _cached_answer(prompt, model, effort, use_filesystem_cache)
+        if cached_response:
+            return cached_response
+        return _model_call("GEMINIPROMPT", prompt.render(), model, effort, use_filesystem_cache,
+                           missed)
+    except Exception as e:
+        raise RdgParserError(f"Error during LLM call: {e}{_reserved_name_hint(e)}")
 
-        logging.info(f"Rendered template:\n{rendered_template}")
 
-        return _model_call("GEMINIPROMPT", rendered_template, model, effort, use_filesystem_cache)
+async def gemini_prompt_async(rdg_file:str, use_filesystem_cache=True, model=None, effort=None,
+                              **kwargs) -> str:
+    try:
+        prompt = _template_prompt(rdg_file, kwargs)
+        cached_response, missed = _cached_answer(prompt, model, effort, use_filesystem_cache)
+        if cached_response:
+            return cached_response
+        return await _model_call_async("GEMINIPROMPT", prompt.render(), model, effort,
+                                       use_filesystem_cache, missed)
     except Exception as e:
         raise RdgParserError(f"Error during LLM call: {e}{_reserved_name_hint(e)}")
 
+
+def _prompt_file(rdg_file: str, kwargs: dict) -> PendingPrompt:
+    if "template_file" not in kwargs:
+        raise RdgParserError("Template file must be supplied when using the GEMINIPROMPTFILE")
+
+    template_file = kwargs.pop("template_file")
+    template_file = process_input(template_file, os.path.dirname(rdg_file))
+
+    if os.path.exists(template_file):
+        with open(template_file, 'r') as f:
+            template = f.read()
+    else:
+        template = template_file
+    return PendingPrompt(template, _pending_inputs(rdg_file, kwargs))
+
+
 def gemini_prompt_from_file(rdg_file:str, use_filesystem_cache=True, model=None, effort=None,
                             **kwargs) -> str:
     """Sends the file content to an LLM and returns the response using caching.
@@ -308,29 +573,25 @@ def gemini_prompt_from_file(rdg_file:str, use_filesystem_cache=True, model=None,
     """
 
     try:
-        if "template_file" not in kwargs:
-            raise RdgParserError("Template file must be supplied when using the GEMINIPROMPTFILE")
-
-        template_file = kwargs.pop("template_file")
-        template_file = process_input(template_file, os.path.dirname(rdg_file))
-
-        if os.path.exists(template_file):
-            with open(template_file, 'r') as f:
-                template = f.read()
-        else:
-            template = template_file
-
-        input_data = {}
-        for key, value in kwargs.items():
-            # Pass file_dir to process input
-            input_data[key] = process_input(value, os.path.dirname(rdg_file))
-
-        rendered_template = render_template(template, input_data)
+        prompt = _prompt_file(rdg_file, kwargs)
+        cached_response, missed = _cached_answer(prompt, model, effort, use_filesystem_cache)
+        if cached_response:
+            return cached_response
+        return _model_call("GEMINIPROMPTFILE", prompt.render(), model, effort,
+                           use_filesystem_cache, missed)
+    except Exception as e:
+        raise RdgParserError(f"Error during LLM call: {e}{_reserved_name_hint(e)}")
 
-        logging.info(f"Rendered template:\n{rendered_template}")
 
-        return _model_call("GEMINIPROMPTFILE", rendered_template, model, effort,
-                           use_filesystem_cache)
+async def gemini_prompt_from_file_async(rdg_file:str, use_filesystem_cache=True, model=None,
+                                        effort=None, **kwargs) -> str:
+    try:
+        prompt = _prompt_file(rdg_file, kwargs)
+        cached_response, missed = _cached_answer(prompt, model, effort, use_filesystem_cache)
+        if cached_response:
+            return cached_response
+        return await _model_call_async("GEMINIPROMPTFILE", prompt.render(), model, effort,
+                                       use_filesystem_cache, missed)
     except Exception as e:
         raise RdgParserError(f"Error during LLM call: {e}{_reserved_name_hint(e)}")
 
@@ -364,7 +625,8 @@ def create_markdown_from_directory(rdg_file: str, **kwargs) -> str:
                 # This ensures consistency with how FILESTOMARKDOWN displays paths
                 relative_to_full_dir = os.path.relpath(file_path, full_directory_path)
                 display_path = os.path.join(directory_path, relative_to_full_dir)
-                
+                _check_read_fence(file_path, display_path)
+
                 try:
                     with open(file_path, "r", encoding="utf-8") as f:
                         file_content = f.read()
@@ -386,6 +648,8 @@ def create_markdown_from_directory(rdg_file: str, **kwargs) -> str:
                     output_content += "\n```\n\n"
 
         return output_content
+    except ReadFenceError:
+        raise
     except FileNotFoundError as e:
         raise RdgParserError(f"Error: {e}")
     except Exception as e:
@@ -424,6 +688,7 @@ def create_markdown_from_files(rdg_file: str, **kwargs) -> str:
     output_content = ""
     for file_path in file_paths:
         full_file_path = os.path.normpath(os.path.join(rdg_dir, file_path))
+        _check_read_fence(full_file_path, file_path)
         try:
             with open(full_file_path, "r", encoding="utf-8") as f:
                 file_content = f.read()
@@ -462,29 +727,39 @@ def summarize_file(rdg_file: str, file: str, summary_type: str = "short",
                    else the provider's own default)
     """
     try:
-        file = process_input(file, os.path.dirname(rdg_file))
-        if os.path.exists(file):
-            with open(file, 'r') as f:
-                content = f.read()
-        else:
-            content = file
-
-        if summary_type == "short":
-            prompt = f"Summarize the following text in a few sentences:\n\n{content}"
-        elif summary_type == "long":
-            prompt = f"Summarize the following text in detail:\n\n{content}"
-        else:
-            raise RdgParserError(f"Invalid summary type: {summary_type}")
-
         # Calls the shared model path DIRECTLY rather than routing through GEMINIPROMPT, so the
         # primitive event names SUMMARIZE — observability that reports the wrong formula is worse
-        # than none. The prompt above is already complete, and it is no longer handed to the
+        # than none. The prompt is already complete, and it is no longer handed to the
         # template renderer on the way out, which also stops a summarized file containing
         # `$name` or `{{name}}` from failing as an unresolved placeholder.
-        return _model_call("SUMMARIZE", prompt, model, effort)
+        return _model_call("SUMMARIZE", _summary_prompt(rdg_file, file, summary_type), model, effort)
     except Exception as e:
         raise RdgParserError(f"Error during summarization: {e}{_reserved_name_hint(e)}")
 
+
+async def summarize_file_async(rdg_file: str, file: str, summary_type: str = "short",
+                               model=None, effort=None) -> str:
+    try:
+        return await _model_call_async("SUMMARIZE", _summary_prompt(rdg_file, file, summary_type),
+                                       model, effort)
+    except Exception as e:
+        raise RdgParserError(f"Error during summarization: {e}{_reserved_name_hint(e)}")
+
+
+def _summary_prompt(rdg_file: str, file: str, summary_type: str) -> str:
+    file = process_input(file, os.path.dirname(rdg_file))
+    if os.path.exists(file):
+        with open(file, 'r') as f:
+            content = f.read()
+    else:
+        content = file
+
+    if summary_type == "short":
+        return f"Summarize the following text in a few sentences:\n\n{content}"
+    elif summary_type == "long":
+        return f"Summarize the following text in detail:\n\n{content}"
+    raise RdgParserError(f"Invalid summary type: {summary_type}")
+
 # Note: extract_output_files_and_commands is not defined in the provided context.
 # Assuming it's defined elsewhere or is a placeholder for context purposes.
 def create_single_markdown_file(rdg_file: str, output_file: str) -> None:
@@ -573,6 +848,8 @@ def files_or_directories_to_markdown(rdg_file: str, **kwargs) -> str:
             try:
                 # Pass the original item_path for consistency in display names
                 output_content += create_markdown_from_directory(rdg_file, directory=item_path)
+            except ReadFenceError:
+                raise
             except RdgParserError as e:
                 print(f"Error processing directory {item_path}: {e}")
                 output_content += f"## {item_path}\n\n"
@@ -584,6 +861,8 @@ def files_or_directories_to_markdown(rdg_file: str, **kwargs) -> str:
             try:
                 # Pass the original item_path for consistency in display names
                 output_content += create_markdown_from_files(rdg_file, files=item_path)
+            except ReadFenceError:
+                raise
             except RdgParserError as e:
                 print(f"Error processing file {item_path}: {e}")
                 output_content += f"## {item_path}\n\n"
@@ -639,9 +918,11 @@ def list_paths(rdg_file: str, **kwargs) -> str:
                 for f in files:
                     relative_to_full_dir = os.path.relpath(os.path.join(root, f), full_item_path)
                     display_path = os.path.normpath(os.path.join(item_path, relative_to_full_dir))
+                    _check_read_fence(os.path.join(root, f), display_path)
                     listed_paths.append(display_path)
         elif os.path.isfile(full_item_path):
             # If it's a file, just add its original path
+            _check_read_fence(full_item_path, item_path)
             listed_paths.append(item_path)
         else:
             print(f"Warning: Path {item_path} is neither a file nor a directory.")
@@ -697,6 +978,7 @@ def glob_to_markdown(rdg_file: str, **kwargs) -> str:
     for full_file_path in file_matches:
         # Display path relative to rdg_dir, preserving the pattern's directory structure
         display_path = os.path.relpath(full_file_path, rdg_dir)
+        _check_read_fence(full_file_path, display_path)
 
         try:
             with open(full_file_path, "r", encoding="utf-8") as f:
@@ -778,6 +1060,55 @@ FUNCTION_REGISTRY: Dict[str, Callable] = {
 # anything, and a primitive event would report an invocation that never happened.
 MODEL_FORMULAS: set[str] = {"GEMINIPROMPT", "GEMINIPROMPTFILE", "SUMMARIZE"}
 
+# Async twins for the asyncio runner (parser._execute_plan_async, RDG_ASYNC=1): same signature,
+# same rendering, same errors, but the model call is awaited. Keyed by CALLABLE, not by name, so a
+# formula keeps its twin under whatever name it is registered (ollama_prompt ships unregistered).
+# Anything without a twin runs on the async runner's bounded thread pool.
+ASYNC_TWINS: Dict[Callable, Callable] = {
+    gemini_prompt: gemini_prompt_async,
+    gemini_prompt_from_file: gemini_prompt_from_file_async,
+    summarize_file: summarize_file_async,
+    ollama_prompt: ollama_prompt_async,
+}
+
+# ---------------------------------------------------------------------------
+# Resource classes — what a step spends while it runs
+# ---------------------------------------------------------------------------
+#
+# RDG_JOBS is one global worker count, but the things steps wait on are not one resource: eight
+# Claude CLI steps in flight are eight `claude` processes against one subscription's session limit,
+# a local Ollama model serves one request at a time, and a file gather costs almost nothing. The
+# parallel runner therefore gives each class its own slot count (parser.class_limits) on top of the
+# global one, and a step starts only when a slot in its class is free.
+#
+#   gemini      built-in model formulas, when Gemini is the primary backend
+#   claude-cli  built-in model formulas under RDG_PRIMARY=claude
+#   ollama      whatever name ollama_prompt is registered under (it ships unregistered)
+#   local-io    every other built-in: reads and writes files, calls nothing
+#   external    RDG_FORMULA_PATH formulas, unless their module says otherwise
+#
+# "Model formula" resolves to gemini or claude-cli at schedule time (resource_class), because
+# which backend a GEMINIPROMPT reaches is a property of the run, not of the formula. External
+# modules may export RESOURCE_CLASSES ({formula: class}) beside FORMULAS to place their own.
+RESOURCE_CLASSES = ("gemini", "claude-cli", "ollama", "local-io", "external")
+FORMULA_RESOURCE_CLASS: Dict[str, str] = {}
+
+
+def resource_class(formula_name: str) -> str:
+    """The resource class a step of `formula_name` occupies while it runs."""
+    declared = FORMULA_RESOURCE_CLASS.get(formula_name)
+    if declared is not None:
+        return declared
+    if FUNCTION_REGISTRY.get(formula_name) is ollama_prompt:
+        return "ollama"
+    if formula_name not in BUILTIN_FORMULAS:
+        return "external"
+    if formula_name in MODEL_FORMULAS:
+        from .config import RDG_PRIMARY
+        return "claude-cli" if RDG_PRIMARY == "claude" else "gemini"
+    return "local-io"
+
+
 # The formulas this engine SHIPS, snapshotted before RDG_FORMULA_PATH merges any external module.
 # The parser refuses the standard parameters on a built-in that is not model-class, because for
 # those the engine knows the whole vocabulary. It cannot know an external module's, so an
@@ -799,6 +1130,7 @@ BUILTIN_FORMULAS = frozenset(FUNCTION_REGISTRY)
 #
 #     FORMULAS: Dict[str, Callable]      # name -> f(rdg_file: str, **kwargs) -> str
 #     MODEL_FORMULAS: set[str]           # OPTIONAL: which of the above invoke a model
+#     RESOURCE_CLASSES: Dict[str, str]   # OPTIONAL: formula -> one of RESOURCE_CLASSES
 #
 # matching what parser.py already calls — formula(rdg_file, **arguments) — whose return value is
 # written to the step's destination.
@@ -858,6 +1190,22 @@ def _load_external_formulas():
                         "not define — a module may only declare its own formulas model-class"
                     )
                 MODEL_FORMULAS.update(declared)
+            classes = getattr(module, "RESOURCE_CLASSES", None)
+            if classes is not None:
+                if not isinstance(classes, dict):
+                    raise RuntimeError(f"{path} defines RESOURCE_CLASSES that is not a dict")
+                for name, cls in classes.items():
+                    if name not in formulas:
+                        raise RuntimeError(
+                            f"{path} declares a RESOURCE_CLASSES entry for '{name}', which its own "
+                            "FORMULAS does not define"
+                        )
+                    if cls not in RESOURCE_CLASSES:
+                        raise RuntimeError(
+                            f"{path} puts '{name}' in unknown resource class '{cls}' "
+                            f"(allowed: {', '.join(RESOURCE_CLASSES)})"
+                        )
+                    FORMULA_RESOURCE_CLASS[name] = cls
 
 
 _load_external_formulas()
@@ -1,20 +1,47 @@
+import asyncio
+import contextlib
 from google import genai
 from google.genai import types
 import logging
 import hashlib
 import json
 import os
-from functools import lru_cache
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so cache_lock coordinates one process only.
+    fcntl = None
 from .config import (
     api_key,
+    CACHE_BACKEND,
+    CACHE_COMPRESS,
     CACHE_DIR,
+    CACHE_PROMPTS,
+    CACHE_REMOTE,
+    CACHE_REMOTE_TIMEOUT,
+    CACHE_REMOTE_TOKEN,
+    CACHE_REMOTE_UPLOAD,
     CLAUDE_CLI_MODEL,
+    GEMINI_BACKOFF,
+    GEMINI_RETRIES,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    HEDGE_BUDGET,
+    HEDGE_PERCENTILE,
+    HEDGE_TO,
     RDG_PRIMARY,
     cache_identity,
     resolve_gemini_params,
     validate_effort,
 )
+from . import cache as response_cache
 from . import claude as claude_fallback
+from . import hedge
+from . import ratelimit
+from .memo import MISSING, digest, memoized
+from .remote_cache import RemoteCache
 from .events import emit_primitive
 
 
@@ -91,7 +118,7 @@ def config_for(effort):
     })
 
 
-@lru_cache(maxsize=None)
+@memoized("gemini")
 def memoized_gemini_call(rendered_template, model=None, effort=None):
     """
     Routing:
@@ -106,7 +133,8 @@ def memoized_gemini_call(rendered_template, model=None, effort=None):
     call wherever it goes, while `model` is a provider-scoped id — a Gemini→Claude fallback
     therefore uses CLAUDE_CLI_MODEL rather than handing the CLI a model id it cannot honor.
 
-    Memoised on (prompt, model, effort) — the three things that determine the answer. The .rdg
+    Memoised on (prompt, model, effort) — the three things that determine the answer — in a
+    byte-budgeted memo keyed by their sha256 (memo.py, RDG_MEMO_MAX_SIZE). The .rdg
     formula label is NOT among them; it travels on a ContextVar (events.formula_context) so two
     formulas asking the identical question still share one call.
 
@@ -143,12 +171,7 @@ def memoized_gemini_call(rendered_template, model=None, effort=None):
         emit_primitive(
             model=gemini_model, effort=gemini_effort, backend="gemini", timeout_s=None,
         )
-        response = client.models.generate_content(
-            model=gemini_model,
-            contents=rendered_template,
-            config=config_for(gemini_effort),
-        )
-        gemini_response = response.text
+        gemini_response = _ask_gemini(gemini_model, gemini_effort, rendered_template, effort)
         if gemini_response:
             return gemini_response
     except Exception as e:
@@ -161,16 +184,7 @@ def memoized_gemini_call(rendered_template, model=None, effort=None):
     # id, and the step asked for that level of thinking regardless of who answers. The second
     # primitive event this emits is the honest record that two invocations happened.
     if claude_fallback.is_available():
-        reason = f"exception: {gemini_error}" if gemini_error else "empty response"
-        # WARNING, not info, and unconditional: the answer is about to come from a different
-        # model than the step asked for. A run that silently substitutes the model is the one
-        # thing `model=` must never let happen quietly — the level survives the switch, the id
-        # cannot.
-        logging.warning(
-            f"Falling back to Claude ({reason}) — model substituted: "
-            f"{gemini_model} -> {CLAUDE_CLI_MODEL} (effort {gemini_effort!r} forwarded unchanged; "
-            f"the requested Gemini model id has no meaning to the Claude CLI)"
-        )
+        _warn_model_substituted(gemini_error, gemini_model, gemini_effort)
         claude_response = claude_fallback.call_claude(rendered_template, effort=effort)
         if claude_response:
             # On claude failure this is a non-empty RDG-ENGINE-ERROR sentinel —
@@ -178,6 +192,134 @@ def memoized_gemini_call(rendered_template, model=None, effort=None):
             return claude_response
         logging.error("Claude fallback also returned empty response")
 
+    return _gemini_failure(gemini_error, gemini_response)
+
+
+def _ask_gemini(model, gemini_effort, rendered_template, effort):
+    """The text of one Gemini request, hedged when RDG_HEDGE_PERCENTILE is set (hedge.py)."""
+    def ask():
+        return _generate(model, rendered_template, config_for(gemini_effort)).text
+
+    if not HEDGE_PERCENTILE:
+        return ask()
+
+    def second():
+        if HEDGE_TO == "claude" and claude_fallback.is_available():
+            _warn_hedged_to_claude(model)
+            return claude_fallback.call_claude(rendered_template, effort=effort)
+        emit_primitive(model=model, effort=gemini_effort, backend="gemini", phase="hedge")
+        return ask()
+
+    return hedge.hedged(hedge.hedger_for(HEDGE_PERCENTILE, HEDGE_BUDGET), model, ask, second,
+                        _answered, _throttled(model))
+
+
+async def _ask_gemini_async(model, gemini_effort, rendered_template, effort):
+    async def ask():
+        return (await _generate_async(model, rendered_template, config_for(gemini_effort))).text
+
+    if not HEDGE_PERCENTILE:
+        return await ask()
+
+    async def second():
+        if HEDGE_TO == "claude" and claude_fallback.is_available():
+            _warn_hedged_to_claude(model)
+            return await claude_fallback.call_claude_async(rendered_template, effort=effort)
+        emit_primitive(model=model, effort=gemini_effort, backend="gemini", phase="hedge")
+        return await ask()
+
+    return await hedge.hedged_async(hedge.hedger_for(HEDGE_PERCENTILE, HEDGE_BUDGET), model, ask,
+                                    second, _answered, _throttled(model))
+
+
+def _answered(text):
+    """An answer a hedge race may be won with: text, not an empty reply or an error sentinel."""
+    return bool(text) and not text.startswith(claude_fallback.ENGINE_ERROR_SENTINEL)
+
+
+def _throttled(model):
+    """hedge.hedged's `held`: no hedge while the model's rate limiter is holding requests."""
+    return ratelimit.limiter_for(model, GEMINI_RPM, GEMINI_TPM).throttling
+
+
+def _took(model, started):
+    """Record how long one provider request took, as a sample of the model's hedge threshold.
+    Timed around the request alone: waits on the limiter and 429 backoffs are not latency."""
+    if HEDGE_PERCENTILE:
+        hedge.hedger_for(HEDGE_PERCENTILE, HEDGE_BUDGET).record(model, time.monotonic() - started)
+
+
+def _warn_hedged_to_claude(gemini_model):
+    logging.warning(f"Hedging a slow {gemini_model} call to Claude ({CLAUDE_CLI_MODEL}); if "
+                    f"Claude answers first, its answer is used")
+
+
+def _generate(model, contents, config):
+    """client.models.generate_content, paced by the model's rate limiter, with 429s retried after
+    a backoff rather than passed to the fallback (ratelimit.py)."""
+    limiter = ratelimit.limiter_for(model, GEMINI_RPM, GEMINI_TPM)
+    estimate = ratelimit.estimate_tokens(contents)
+    attempt = 0
+    while True:
+        limiter.acquire(estimate)
+        started = time.monotonic()
+        try:
+            response = client.models.generate_content(model=model, contents=contents,
+                                                      config=config)
+        except Exception as e:
+            delay = ratelimit.backoff(e, attempt, GEMINI_RETRIES, GEMINI_BACKOFF)
+            if delay is None:
+                raise
+            _rate_limited(limiter, e, delay, attempt)
+            attempt += 1
+            continue
+        _took(model, started)
+        limiter.settle(estimate, ratelimit.used_tokens(response))
+        return response
+
+
+async def _generate_async(model, contents, config):
+    limiter = ratelimit.limiter_for(model, GEMINI_RPM, GEMINI_TPM)
+    estimate = ratelimit.estimate_tokens(contents)
+    attempt = 0
+    while True:
+        await limiter.acquire_async(estimate)
+        started = time.monotonic()
+        try:
+            response = await client.aio.models.generate_content(model=model, contents=contents,
+                                                                config=config)
+        except Exception as e:
+            delay = ratelimit.backoff(e, attempt, GEMINI_RETRIES, GEMINI_BACKOFF)
+            if delay is None:
+                raise
+            _rate_limited(limiter, e, delay, attempt)
+            attempt += 1
+            continue
+        _took(model, started)
+        limiter.settle(estimate, ratelimit.used_tokens(response))
+        return response
+
+
+def _rate_limited(limiter, error, delay, attempt):
+    logging.warning(f"Gemini rate limited {limiter.model} ({error}); retry {attempt + 1} of "
+                    f"{GEMINI_RETRIES} in {delay:.1f}s")
+    limiter.pause(delay)
+
+
+def _warn_model_substituted(gemini_error, gemini_model, gemini_effort):
+    reason = f"exception: {gemini_error}" if gemini_error else "empty response"
+    # WARNING, not info, and unconditional: the answer is about to come from a different
+    # model than the step asked for. A run that silently substitutes the model is the one
+    # thing `model=` must never let happen quietly — the level survives the switch, the id
+    # cannot.
+    logging.warning(
+        f"Falling back to Claude ({reason}) — model substituted: "
+        f"{gemini_model} -> {CLAUDE_CLI_MODEL} (effort {gemini_effort!r} forwarded unchanged; "
+        f"the requested Gemini model id has no meaning to the Claude CLI)"
+    )
+
+
+def _gemini_failure(gemini_error, gemini_response):
     # If Gemini RAISED, surface that exception as a non-empty sentinel rather
     # than swallowing it to "". Only when there was NO exception (genuine empty
     # response, no available/successful fallback) do we return "" and let the
@@ -190,6 +332,69 @@ def memoized_gemini_call(rendered_template, model=None, effort=None):
     return gemini_response  # "" — genuine empty (no exception); empty-file detection triggers
 
 
+# The awaited path shares memoized_gemini_call's memo; _async_inflight holds the task still
+# computing each answer, by the same digest, so concurrent identical steps make one request.
+_async_memo = memoized_gemini_call.memo
+_async_inflight = {}
+
+
+async def memoized_gemini_call_async(rendered_template, model=None, effort=None):
+    """memoized_gemini_call for the asyncio runner (RDG_ASYNC=1).
+
+    The same routing, fallback and sentinel contract, on awaited backends: the SDK's aio client
+    and claude.call_claude_async. Memoised on the same three values.
+    """
+    key = digest((rendered_template, model, effort))
+    response = _async_memo.lookup(key)
+    if response is not MISSING:
+        return response
+    task = _async_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_gemini_call_async(rendered_template, model, effort))
+        _async_inflight[key] = task
+        task.add_done_callback(lambda _: _async_inflight.pop(key, None))
+    response = await task
+    _async_memo.store(key, response)
+    return response
+
+
+async def _gemini_call_async(rendered_template, model=None, effort=None):
+    effort = validate_effort(effort, "effort=")
+
+    if RDG_PRIMARY == "claude":
+        claude_response = await claude_fallback.call_claude_async(
+            rendered_template, model=model, effort=effort
+        )
+        if claude_response:
+            return claude_response
+        logging.error("Claude CLI returned empty response (RDG_PRIMARY=claude)")
+        return ""
+
+    gemini_response = ""
+    gemini_error = None
+    gemini_model, gemini_effort = resolve_gemini_params(model, effort)
+    try:
+        emit_primitive(
+            model=gemini_model, effort=gemini_effort, backend="gemini", timeout_s=None,
+        )
+        gemini_response = await _ask_gemini_async(gemini_model, gemini_effort, rendered_template,
+                                                  effort)
+        if gemini_response:
+            return gemini_response
+    except Exception as e:
+        gemini_error = e
+        logging.error(f"Gemini API call failed: {e}")
+
+    if claude_fallback.is_available():
+        _warn_model_substituted(gemini_error, gemini_model, gemini_effort)
+        claude_response = await claude_fallback.call_claude_async(rendered_template, effort=effort)
+        if claude_response:
+            return claude_response
+        logging.error("Claude fallback also returned empty response")
+
+    return _gemini_failure(gemini_error, gemini_response)
+
+
 def get_cache_key(rendered_template, model=None, effort=None):
     """Cache key for one call: the prompt, plus the call identity when it is not the default one.
 
@@ -201,20 +406,169 @@ def get_cache_key(rendered_template, model=None, effort=None):
     return hashlib.md5((rendered_template + cache_identity(model, effort)).encode()).hexdigest()
 
 
-def load_from_cache(cache_key):
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    try:
-        with open(cache_file, 'r') as f:
-            data = json.load(f)
-            return data["request"], data["response"]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return None, None
+# The response cache backend (cache.py) for the current CACHE_DIR and RDG_CACHE_* settings, looked
+# up per call so a patched or re-pointed CACHE_DIR is honoured, and kept so a SQLite store keeps
+# its connections and its batching between calls.
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def cache_backend():
+    """The cache backend every load and save goes through (cache.JsonDirCache by default)."""
+    spec = (CACHE_BACKEND, CACHE_DIR, CACHE_COMPRESS, CACHE_PROMPTS)
+    with _backends_lock:
+        backend = _backends.get(spec)
+        if backend is None:
+            backend = _backends[spec] = response_cache.open_cache(*spec)
+    return backend
+
+
+# The remote tier (remote_cache.py) for the current RDG_CACHE_REMOTE settings, kept like the
+# backends so its back-off after a failure lasts between calls.
+_remotes = {}
+
+
+def remote_cache():
+    """The RemoteCache behind the local one, or None when RDG_CACHE_REMOTE is unset."""
+    if not CACHE_REMOTE:
+        return None
+    spec = (CACHE_REMOTE, CACHE_REMOTE_TIMEOUT, CACHE_REMOTE_TOKEN, CACHE_REMOTE_UPLOAD)
+    with _backends_lock:
+        remote = _remotes.get(spec)
+        if remote is None:
+            remote = _remotes[spec] = RemoteCache(*spec)
+    return remote
+
+
+def load_from_cache(cache_key, remote=True):
+    """The cached response for `cache_key`, or None. Only the response is read: the prompt it
+    answered is the key's preimage, and a hit never needs it back. A local miss asks the remote
+    tier, if there is one and `remote` is set, and keeps what it finds."""
+    response = cache_backend().load(cache_key)
+    if response is None and remote:
+        response = _load_remote(cache_key)
+    return response
+
+
+def _load_remote(cache_key):
+    remote = remote_cache()
+    fetched = remote.get(cache_key) if remote is not None else None
+    if fetched is None:
+        return None
+    request, response = fetched
+    _save_local(cache_key, request, response)
+    return response
 
 
 def save_to_cache(cache_key, request, response):
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
+    # Backends write atomically: a process waiting on cache_lock, or any other reader, sees the
+    # whole entry or none of it.
+    _save_local(cache_key, request, response)
+    remote = remote_cache()
+    if remote is not None:
+        remote.put(cache_key, None if CACHE_PROMPTS == "hash" else request, response)
+
+
+async def load_from_cache_async(cache_key):
+    """load_from_cache for the asyncio runner. The local tier is read inline, as before; only a
+    local miss that asks the remote tier goes to a worker thread, so a slow remote never stalls
+    the event loop."""
+    response = cache_backend().load(cache_key)
+    if response is None and remote_cache() is not None:
+        response = await asyncio.to_thread(_load_remote, cache_key)
+    return response
+
+
+async def save_to_cache_async(cache_key, request, response):
+    """save_to_cache for the asyncio runner; the PUT to the remote tier runs on a worker thread."""
+    _save_local(cache_key, request, response)
+    remote = remote_cache()
+    if remote is not None:
+        await asyncio.to_thread(remote.put, cache_key,
+                                None if CACHE_PROMPTS == "hash" else request, response)
+
+
+def _save_local(cache_key, request, response):
+    backend = cache_backend()
     try:
-        with open(cache_file, 'w') as f:
-            json.dump({"request": request, "response": response}, f)
+        backend.save(cache_key, request, response)
     except Exception as e:
-        logging.error(f"Error saving to cache '{cache_file}': {e}")
\ No newline at end of file
+        logging.error(f"Error saving to {backend.name} cache for key {cache_key}: {e}")
+
+
+# Cross-process single-flight. The in-process table (functions._single_flight) makes concurrent
+# identical calls in ONE process wait for the first; parallel CI shards, a watch loop overlapping
+# a manual run, or two workspace runs sharing RDG_CACHE_DIR are separate processes and would each
+# pay for the same prompt. cache_lock takes an exclusive flock on CACHE_DIR/locks/<key>.lock for
+# the duration of one miss, so the second process blocks until the first has saved its answer,
+# then finds it in the cache. The lock is released by the kernel if its holder dies, so a crashed
+# shard never wedges the others; lock files are left in place (removing one races a process that
+# has just opened it). Without fcntl, or if the lock file cannot be created, the call proceeds
+# unlocked: worst case is the old behaviour, two identical requests.
+def _open_cache_lock(cache_key):
+    """The lock file's descriptor, or None when the call must go ahead unlocked."""
+    if fcntl is None:
+        return None
+    path = response_cache.lock_path(CACHE_DIR, cache_key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        logging.warning(f"Could not lock cache entry '{path}', calling unlocked: {e}")
+        return None
+
+
+def _lock_failed(fd, e):
+    os.close(fd)
+    logging.warning(f"Could not lock cache entry, calling unlocked: {e}")
+
+
+def _acquire_cache_lock(cache_key):
+    """Block until this process holds the lock for `cache_key`; returns the descriptor, or None
+    when the call must go ahead unlocked."""
+    fd = _open_cache_lock(cache_key)
+    if fd is None:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except OSError as e:
+        _lock_failed(fd, e)
+        return None
+    return fd
+
+
+def _release_cache_lock(fd):
+    if fd is not None:
+        os.close(fd)  # closing the last descriptor drops the flock
+
+
+@contextlib.contextmanager
+def cache_lock(cache_key):
+    fd = _acquire_cache_lock(cache_key)
+    try:
+        yield
+    finally:
+        _release_cache_lock(fd)
+
+
+@contextlib.asynccontextmanager
+async def cache_lock_async(cache_key):
+    """cache_lock for the asyncio runner. A blocking flock would stall the event loop and a thread
+    per waiter is what RDG_ASYNC exists to avoid, so a held lock is polled without blocking,
+    backing off to a quarter second — short beside the model call it is waiting for."""
+    fd = _open_cache_lock(cache_key)
+    delay = 0.01
+    while fd is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+        except OSError as e:
+            _lock_failed(fd, e)
+            fd = None
+    try:
+        yield
+    finally:
+        _release_cache_lock(fd)
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""Hedged model calls: a second request for the call that is running late.
+
+A Gemini call's p99 latency is many times its p50, and one slow call holds up every step
+downstream of it. With RDG_HEDGE_PERCENTILE=P, a call that is still running when it passes the
+P-th percentile of that model's recent latencies gets a duplicate (a "hedge"). The first good
+answer wins. The other request is cancelled on the asyncio runner, and on threads it is left to
+finish and its answer is dropped. Either way the loser's answer is never returned, so it is never
+memoised or written to the cache: only the winner reaches the caller, which saves it once.
+
+RDG_HEDGE_TO picks where the hedge goes: "gemini" (default) repeats the request, "claude" sends it
+to the Claude CLI fallback instead, which is independent of whatever is slowing Gemini down.
+
+The latencies are of the provider request alone, recorded by the caller around it
+(gemini._generate), not of the whole call: a call that waited on the rate limiter or slept through
+a 429 backoff is slow for a reason a hedge cannot fix. For the same reason no hedge is sent while
+the caller's `held()` says the model is being throttled (ratelimit.RateLimiter.throttling): the
+duplicate would only queue behind the same limit, or add to the quota that was just exceeded.
+
+Hedging costs money, so it is bounded. A model needs MIN_SAMPLES finished calls before it has a
+threshold, and hedges may be at most RDG_HEDGE_BUDGET (default 0.05) of the calls made. Past the
+budget, a late call simply waits. A hedge is never a retry: if the first answer to arrive is a
+failure, the other request is still awaited, and if both fail the primary's failure is what the
+caller sees, so the fallback path behaves as before.
+
+Each hedge sent is published as one "hedge" event, and its provider call emits its own
+"primitive" event.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import threading
+
+from .events import emit
+
+WINDOW = 200  # recent latencies kept per model
+MIN_SAMPLES = 20  # finished calls a model needs before a call of it can be hedged
+
+
+class Hedger:
+    """Recent latencies per model, and the budget hedges spend."""
+
+    def __init__(self, percentile: float, budget: float):
+        self.percentile = percentile
+        self.budget = budget
+        self.calls = 0
+        self.hedges = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def threshold(self, model):
+        """Seconds after which a call of `model` is late, or None while too few have finished.
+        Counts the call against the budget."""
+        with self._lock:
+            self.calls += 1
+            recent = sorted(self._latencies.get(model, ()))
+        if len(recent) < MIN_SAMPLES:
+            return None
+        rank = min(len(recent) - 1, int(len(recent) * self.percentile / 100))
+        return recent[rank]
+
+    def record(self, model, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model, collections.deque(maxlen=WINDOW)).append(seconds)
+
+    def spend(self) -> bool:
+        """Take one hedge from the budget, if it has one left."""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+
+_hedgers = {}
+_hedgers_lock = threading.Lock()
+
+
+def hedger_for(percentile: float, budget: float) -> Hedger:
+    with _hedgers_lock:
+        hedger = _hedgers.get((percentile, budget))
+        if hedger is None:
+            hedger = _hedgers[(percentile, budget)] = Hedger(percentile, budget)
+        return hedger
+
+
+def _in_thread(fn) -> concurrent.futures.Future:
+    """Run `fn` on a daemon thread, in a copy of this context (so the formula label follows it).
+    Daemon, not an executor's worker: a losing hedge must not hold the interpreter open."""
+    future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="rdg-hedge", daemon=True).start()
+    return future
+
+
+def _outcome(future):
+    """(True, answer) or (False, exception) for a finished future."""
+    error = future.exception()
+    return (False, error) if error is not None else (True, future.result())
+
+
+def hedged(hedger: Hedger, model, primary, hedge, ok, held=None):
+    """primary(), or hedge() if primary() runs late and that answers first. `ok(answer)` says
+    whether an answer may win; both are zero-argument callables, as is `held`, which says hedges
+    must wait (checked before the call and again when it runs late)."""
+    after = hedger.threshold(model)
+    if after is None or _held(held):
+        return primary()
+    first = _in_thread(primary)
+    try:
+        return first.result(timeout=after)
+    except concurrent.futures.TimeoutError:
+        pass
+    if _held(held) or not hedger.spend():
+        return first.result()
+    emit("hedge", model=model, after_s=round(after, 3))
+    second = _in_thread(hedge)
+    pending = {first, second}
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when="FIRST_COMPLETED")
+        for future in (first, second):
+            if future in done:
+                good, answer = _outcome(future)
+                if good and ok(answer):
+                    return answer
+    return first.result()
+
+
+async def hedged_async(hedger: Hedger, model, primary, hedge, ok, held=None):
+    """hedged() on the event loop; primary and hedge return awaitables, and the loser is
+    cancelled."""
+    after = hedger.threshold(model)
+    if after is None or _held(held):
+        return await primary()
+    first = asyncio.ensure_future(primary())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=after)
+        if done or _held(held) or not hedger.spend():
+            return await first
+        emit("hedge", model=model, after_s=round(after, 3))
+        tasks.append(asyncio.ensure_future(hedge()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task in done and not task.cancelled() and task.exception() is None \
+                        and ok(task.result()):
+                    return task.result()
+        return first.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _held(held) -> bool:
+    return held is not None and held()
@@ -0,0 +1,82 @@
+"""Step duration history — how long each step of a notebook took on earlier RDG_JOBS runs.
+
+The ready-queue scheduler (parser._execute_plan) only has a choice to make when there are more
+ready steps than workers, and then line order is the worst tie-breaker available: a notebook whose
+last ten lines are a chain of slow model calls starts that chain after every cheap gather above
+it, and the run's wall clock becomes the chain's length PLUS everything that delayed its head.
+Ranking ready steps by their longest remaining downstream chain (the critical path) needs a cost
+per step, and the only honest cost is one that was measured.
+
+One JSON file per notebook under CACHE_DIR/history, named by the md5 of the notebook's absolute
+path — the cache directory is already where this engine keeps state between runs, and nothing is
+written beside the notebook (a watched directory would re-trigger on it). Durations are keyed by
+destination AND formula: the same destination rewritten with a different formula is a different
+step, and a cost learned for a gather must not be charged to the model call that replaced it.
+
+Advisory only. A missing, unreadable or stale file changes the order steps START in and nothing
+else — artifacts are byte-identical whatever this file says, so every failure here degrades to
+line order with a log line rather than failing the run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from . import config
+
+# Weight of the newest observation in the running average. Half keeps one slow outlier (a cold
+# cache, a provider hiccup) from dominating for more than a couple of runs.
+SMOOTHING = 0.5
+
+
+def history_path(rdg_file: str) -> str:
+    """Where the duration history for `rdg_file` lives. Read at call time, so RDG_CACHE_DIR holds."""
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return os.path.join(config.CACHE_DIR, "history", f"{digest}.json")
+
+
+def load_durations(rdg_file: str) -> dict:
+    """{(dest, formula): seconds} from earlier runs; empty when there is no usable history."""
+    path = history_path(rdg_file)
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable step history '{path}': {e}")
+        return {}
+    durations = {}
+    for dest, by_formula in data.get("steps", {}).items():
+        for formula, seconds in by_formula.items():
+            if isinstance(seconds, (int, float)) and seconds >= 0:
+                durations[(dest, formula)] = float(seconds)
+    return durations
+
+
+def record_durations(rdg_file: str, observed: dict) -> None:
+    """Fold this run's {(dest, formula): seconds} into the history. Never raises.
+
+    Written to a temporary file and renamed into place, so a reader never sees half a file and
+    two concurrent runs of one notebook cost at most one run's observations.
+    """
+    if not observed:
+        return
+    merged = load_durations(rdg_file)
+    for key, seconds in observed.items():
+        previous = merged.get(key)
+        merged[key] = seconds if previous is None else (
+            SMOOTHING * seconds + (1 - SMOOTHING) * previous)
+    steps = {}
+    for (dest, formula), seconds in sorted(merged.items()):
+        steps.setdefault(dest, {})[formula] = round(seconds, 4)
+    path = history_path(rdg_file)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rdg_file": os.path.abspath(rdg_file), "steps": steps}, f, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"Could not record step history '{path}': {e}")
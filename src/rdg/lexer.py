@@ -0,0 +1,191 @@
+"""The rdg line lexer — one left-to-right pass per line, with the column of every error.
+
+An rdg line is
+
+    dest=FORMULA(name=value, name="quoted value", name='quoted value', ...)
+
+and parser.parse_rdg_line used to take it apart with two regexes. The argument split,
+`,\\s*(?=(?:[^"]*"[^"]*")*[^"]*$)`, decides whether a comma is outside a string by re-counting the
+double quotes from that comma to the END of the line. That is quadratic in the line: a generated
+notebook with multi-kilobyte inline templates spent most of its planning time in it. It also only
+knew double quotes, so a comma inside a single-quoted value split the value.
+
+lex_rdg_line walks the line once. It consumes runs of ordinary characters with precompiled regexes
+that only look forward from the current position, so every character is examined a bounded number
+of times. The result is a small syntax tree: an RdgLine with the stripped destination and formula
+name, and one Argument per `name=value` with the column it started at and the quote it was written
+with.
+
+What a line means is unchanged for every line the regexes read correctly. Two things they got wrong
+are fixed: a comma inside a single-quoted value no longer splits it, and an escaped \" no longer
+counts toward the quote parity that decided where to split. The rules:
+
+  - the destination is everything before the first '=', the formula name everything up to '(';
+  - a value that begins with a quote runs to the matching unescaped quote. Inside it, \\" and \\'
+    become the bare quote and every other backslash is kept as written (templates carry \\n
+    through to the formula untouched);
+  - any other value is bare. It runs to the next ',' or to the ')' that closes the arguments, and
+    is kept as written, minus surrounding whitespace. Balanced parentheses and double-quoted runs
+    inside it are part of the value, as they were before;
+  - empty arguments (`a=1,,b=2`, a trailing comma) are skipped, and a repeated name keeps its last
+    value.
+
+Lines the regexes accepted by ignoring part of them are now errors: text after the closing ')',
+text after a quoted value's closing quote, and a quote that is never closed. Every error is an
+RdgSyntaxError that names the 1-based column in the line as written.
+"""
+
+import collections
+import re
+
+from .functions import RdgParserError
+
+RdgLine = collections.namedtuple("RdgLine", "dest formula arguments")
+RdgLine.__doc__ = """One parsed rdg line. `arguments` is a tuple of Argument, in line order."""
+
+Argument = collections.namedtuple("Argument", "name value quote column")
+Argument.__doc__ = """One `name=value`. `quote` is '"' or "'" for a quoted value, '' for a bare one;
+`column` is where the name starts (1-based)."""
+
+_SPACE = re.compile(r"\s*")
+_DEST = re.compile(r"[^=]*")
+_FORMULA = re.compile(r"[^()]*")
+_NAME = re.compile(r"[^=,()]*")
+_QUOTED = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+_BARE = re.compile(r'[^,()"]*')
+_BARE_QUOTED = re.compile(r'[^"]*')
+# The common argument in one match: a plain name, then a quoted value with no backslash in it or a
+# bare value with no quote, parenthesis or backslash in it. Anything else takes the scanning path.
+_SIMPLE_ARGUMENT = re.compile(
+    r"""([^=,()"'\s][^=,()"']*?)\s*=\s*(?:"([^"\\]*)"|'([^'\\]*)'|([^,()"'\\]*?))\s*(?=[,)])""")
+
+
+class RdgSyntaxError(RdgParserError):
+    """A line that does not lex. `column` is 1-based, counted in the line as written."""
+
+    def __init__(self, kind: str, column: int, problem: str):
+        self.kind = kind
+        self.column = column
+        self.problem = problem
+        super().__init__(f"{kind} at column {column}: {problem}")
+
+
+def lex_rdg_line(line: str):
+    """The RdgLine for `line`, or None for a blank line or a # comment."""
+    line = line.rstrip("\r\n")
+    end = len(line)
+    i = _SPACE.match(line).end()
+    if i == end or line[i] == "#":
+        return None
+
+    j = _DEST.match(line, i).end()
+    if j == end:
+        raise RdgSyntaxError("Invalid line format", end + 1, "expected '=' after the destination")
+    dest = line[i:j].strip()
+    if not dest:
+        raise RdgSyntaxError("Invalid line format", i + 1, "missing destination before '='")
+
+    i = j + 1
+    j = _FORMULA.match(line, i).end()
+    if j == end or line[j] != "(":
+        raise RdgSyntaxError("Invalid line format", j + 1, "expected '(' after the formula name")
+    formula = line[i:j].strip()
+    if not formula:
+        raise RdgSyntaxError("Invalid line format", j + 1, "missing formula name before '('")
+
+    arguments = []
+    i = j + 1
+    while True:
+        i = _SPACE.match(line, i).end()
+        if i == end:
+            raise RdgSyntaxError("Invalid line format", end + 1, "missing ')' to close the arguments")
+        if line[i] == ")":
+            break
+        if line[i] == ",":
+            i += 1
+            continue
+        argument, i = _lex_argument(line, i)
+        arguments.append(argument)
+        if line[i] == ",":
+            i += 1
+
+    rest = _SPACE.match(line, i + 1).end()
+    if rest != end:
+        raise RdgSyntaxError("Invalid line format", rest + 1, "unexpected text after ')'")
+    return RdgLine(dest, formula, tuple(arguments))
+
+
+def _lex_argument(line: str, start: int):
+    """(Argument, position of the ',' or ')' that ends it)."""
+    simple = _SIMPLE_ARGUMENT.match(line, start)
+    if simple is not None:
+        name, double, single, bare = simple.groups()
+        if double is not None:
+            return Argument(name, double, '"', start + 1), simple.end()
+        if single is not None:
+            return Argument(name, single, "'", start + 1), simple.end()
+        return Argument(name, bare, "", start + 1), simple.end()
+
+    end = len(line)
+    j = _NAME.match(line, start).end()
+    if j == end or line[j] != "=":
+        raise RdgSyntaxError("Invalid argument format", start + 1,
+                             f"expected '=' after argument name '{line[start:j].strip()}'")
+    name = line[start:j].strip()
+    if not name:
+        raise RdgSyntaxError("Invalid argument format", start + 1, "missing argument name before '='")
+
+    i = _SPACE.match(line, j + 1).end()
+    quote = line[i] if i < end and line[i] in _QUOTED else ""
+    if quote:
+        value, i = _lex_quoted(line, i, quote)
+        i = _SPACE.match(line, i).end()
+        if i == end:
+            raise RdgSyntaxError("Invalid line format", end + 1, "missing ')' to close the arguments")
+        if line[i] not in ",)":
+            raise RdgSyntaxError("Invalid argument format", i + 1,
+                                 f"expected ',' or ')' after the quoted value of '{name}'")
+        return (Argument(name, value, quote, start + 1), i)
+
+    value_start, depth = i, 0
+    while True:
+        i = _BARE.match(line, i).end()
+        if i == end:
+            raise RdgSyntaxError("Invalid line format", end + 1, "missing ')' to close the arguments")
+        c = line[i]
+        if c == '"':
+            close = _BARE_QUOTED.match(line, i + 1).end()
+            if close == end:
+                raise RdgSyntaxError("Invalid argument format", i + 1,
+                                     f"unterminated string in the value of '{name}'")
+            i = close + 1
+        elif c == "(":
+            depth += 1
+            i += 1
+        elif c == ")" and depth:
+            depth -= 1
+            i += 1
+        else:  # ',' or the ')' that closes the arguments
+            return (Argument(name, line[value_start:i].strip(), "", start + 1), i)
+
+
+def _lex_quoted(line: str, i: int, quote: str):
+    """(unescaped value, position just past the closing quote) for the string opening at i."""
+    end = len(line)
+    run = _QUOTED[quote]
+    pieces = []
+    j = i + 1
+    while True:
+        k = run.match(line, j).end()
+        pieces.append(line[j:k])
+        if k == end:
+            raise RdgSyntaxError("Invalid argument format", i + 1, "unterminated string")
+        if line[k] == quote:
+            return "".join(pieces), k + 1
+        # A backslash: \" and \' stand for the quote; any other backslash is kept as written.
+        if k + 1 < end and line[k + 1] in "\"'":
+            pieces.append(line[k + 1])
+            j = k + 2
+        else:
+            pieces.append("\\")
+            j = k + 1
@@ -0,0 +1,205 @@
+"""RDG_INCREMENTAL — skip steps whose inputs have not changed since they last ran.
+
+Opt-in: with RDG_INCREMENTAL=1 both runners consult a per-notebook build manifest. Without it,
+every step deletes and rewrites its destination exactly as it always has.
+
+For each step the manifest records a FINGERPRINT and the bytes it produced:
+
+    line     sha256 of the PARSED step — destination, formula, arguments, and for a model formula
+             the resolved model/effort this run would call. Parsed, not raw, so re-indenting a
+             line is not a change; resolved, so changing RDG_GEMINI_MODEL is one.
+    inputs   sha256 over every file the step's argument values name (each value split on commas,
+             the same join the planner uses for its edges), or the fact that a name is absent.
+    output   sha256, size and mtime of the destination as this engine wrote it.
+
+and, for a step that called a model, the response-cache keys it used (`cache_keys`): the manifest
+is what a later run will trust, so `cache gc` keeps those answers (manifest_cache_keys).
+
+A step is skipped when its fingerprint matches AND its destination still holds the recorded bytes;
+the file and its mtime are left alone. Anything else runs: an edited or deleted destination, a
+failed previous run (its ## ERROR bytes never match a recorded output), a changed input.
+
+EARLY CUTOFF comes from fingerprinting input CONTENT rather than timestamps. A step that re-runs
+and produces byte-identical output changes nothing in its dependents' fingerprints, so they skip —
+the make/ninja `restat` behaviour, with no second mechanism to keep in step.
+
+ONLY KNOWN_SAFE formulas are ever skipped: their reads are exactly the paths their arguments name,
+so the fingerprint covers everything they can see. A walker or an external formula reads things the
+line does not name; its inputs cannot be fingerprinted, so it always runs — and its dependents
+still cut off when it rewrites the same bytes.
+
+One JSON file per notebook under CACHE_DIR/manifests, named like the duration history (history.py)
+by the md5 of the notebook's absolute path.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from . import config
+from .functions import MODEL_FORMULAS
+
+# Bump when the fingerprint recipe changes: every recorded step then simply runs once more.
+MANIFEST_VERSION = 1
+
+
+def incremental_enabled() -> bool:
+    return os.environ.get("RDG_INCREMENTAL") == "1"
+
+
+def manifest_path(rdg_file: str) -> str:
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return os.path.join(config.CACHE_DIR, "manifests", f"{digest}.json")
+
+
+def open_manifest(rdg_file: str):
+    """The notebook's BuildManifest when RDG_INCREMENTAL=1, else None (and nothing is read)."""
+    if not incremental_enabled():
+        return None
+    return BuildManifest(rdg_file)
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """What each step of one notebook last produced, and from what. Thread-safe for record()."""
+
+    def __init__(self, rdg_file: str):
+        self.path = manifest_path(rdg_file)
+        self.rdg_file = os.path.abspath(rdg_file)
+        self._lock = threading.Lock()
+        self._steps = {}
+        self.skipped = set()  # destinations skipped this run; their ~0s is no duration to learn
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self._steps = data.get("steps", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable build manifest '{self.path}': {e}")
+
+    def fingerprint(self, file_dir, dest, formula_name, arguments, standard):
+        """{"line": ..., "inputs": ...} for a step. The caller decides whether the step is one
+        whose reads its arguments fully name (parser.KNOWN_SAFE); only those are fingerprinted."""
+        identity = None
+        if formula_name in MODEL_FORMULAS:
+            identity = [config.RDG_PRIMARY,
+                        *config.resolve_standard_params(standard.get("model"), standard.get("effort"))]
+        line = json.dumps([dest, formula_name, sorted(arguments.items()), sorted(standard.items()),
+                           identity], sort_keys=True)
+
+        inputs = hashlib.sha256()
+        for name, value in sorted(arguments.items()):
+            for piece in str(value).split(","):
+                piece = piece.strip()
+                if not piece:
+                    continue
+                path = os.path.join(file_dir, piece)
+                inputs.update(f"{name}\0{piece}\0".encode())
+                if os.path.isfile(path):
+                    inputs.update(_sha256_file(path).encode())
+                else:
+                    inputs.update(b"absent")
+                inputs.update(b"\0")
+        return {"line": hashlib.sha256(line.encode()).hexdigest(), "inputs": inputs.hexdigest()}
+
+    def is_current(self, dest, output_path, fingerprint) -> bool:
+        """True when `fingerprint` matches the last run AND the destination still holds its bytes."""
+        if fingerprint is None:
+            return False
+        entry = self._steps.get(dest)
+        if not entry or entry.get("line") != fingerprint["line"] or \
+                entry.get("inputs") != fingerprint["inputs"]:
+            return False
+        try:
+            st = os.stat(output_path)
+        except OSError:
+            return False
+        if st.st_size != entry.get("size"):
+            return False
+        # Same mtime: untouched since this engine wrote it, no need to read it back.
+        if st.st_mtime_ns != entry.get("mtime_ns") and _sha256_file(output_path) != entry.get("output"):
+            return False
+        with self._lock:
+            self.skipped.add(dest)
+        return True
+
+    def record(self, dest, output_path, fingerprint, output_text, cache_keys=None) -> None:
+        """Remember what a successful step produced. A step with no fingerprint is forgotten."""
+        with self._lock:
+            if fingerprint is None:
+                self._steps.pop(dest, None)
+                return
+            try:
+                st = os.stat(output_path)
+            except OSError:
+                self._steps.pop(dest, None)
+                return
+            self._steps[dest] = {
+                **fingerprint,
+                "output": hashlib.sha256(output_text.encode()).hexdigest(),
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+            }
+            if cache_keys:
+                self._steps[dest]["cache_keys"] = sorted(set(cache_keys))
+
+    def save(self) -> None:
+        """Persist atomically. Never raises: a lost manifest costs one full run, not this one."""
+        with self._lock:
+            payload = {"version": MANIFEST_VERSION, "rdg_file": self.rdg_file,
+                       "steps": dict(sorted(self._steps.items()))}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save build manifest '{self.path}': {e}")
+
+
+
+def manifest_cache_keys(cache_dir: str) -> set:
+    """Every response-cache key recorded by the manifest of a notebook that still exists — what
+    `cache gc` must keep for the next incremental run to skip what it skipped before."""
+    keys = set()
+    folder = os.path.join(cache_dir, "manifests")
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return keys
+    for name in names:
+        if name.endswith(".json"):
+            keys |= _recorded_keys(os.path.join(folder, name))
+    return keys
+
+
+def notebook_manifest_keys(cache_dir: str, rdg_file: str) -> set:
+    """The cache keys one notebook's manifest under `cache_dir` records (bundle export)."""
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return _recorded_keys(os.path.join(cache_dir, "manifests", f"{digest}.json"))
+
+
+def _recorded_keys(path: str) -> set:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable build manifest '{path}': {e}")
+        return set()
+    if not os.path.exists(data.get("rdg_file", "")):
+        return set()  # the notebook is gone; its manifest protects nothing
+    return {key for step in data.get("steps", {}).values() for key in step.get("cache_keys", ())}
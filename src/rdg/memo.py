@@ -0,0 +1,128 @@
+"""The in-process memo in front of the model backends, bounded by bytes rather than by count.
+
+memoized_gemini_call and ollama_call used to be lru_cache(maxsize=None). Every prompt string,
+often a whole GLOBTOMARKDOWN dump, stayed alive for the life of the process as a key, and every
+answer as a value. A one-shot run never noticed. A long-lived process (a workspace run over many
+notebooks, a REPL driving run after run) grew until it was killed.
+
+ByteBudgetMemo keys an answer by the sha256 of the call's arguments, so the prompt itself is
+dropped as soon as the call returns. Answers are kept in least-recently-used order and the
+oldest go once their total size passes the budget (config.MEMO_MAX_BYTES, RDG_MEMO_MAX_SIZE).
+An answer larger than the whole budget is simply not kept. Hits, misses and evictions are
+counted; report_memos() emits them as one "memo" event per memo at the end of a run.
+
+The decorated function keeps lru_cache's cache_clear() and cache_info(), so callers and tests
+that reset the memo between cases need no change.
+"""
+
+import collections
+import functools
+import hashlib
+import inspect
+import sys
+import threading
+
+from . import config
+from .events import emit
+
+MemoInfo = collections.namedtuple("MemoInfo", "hits misses evictions entries currbytes maxbytes")
+
+MISSING = object()
+_memos = []  # every ByteBudgetMemo made, for report_memos
+
+
+def digest(values) -> bytes:
+    """The memo key for a call's argument values. Strings are hashed by their UTF-8 bytes, anything
+    else by its repr, each length-prefixed so ("ab", "c") and ("a", "bc") differ."""
+    h = hashlib.sha256()
+    for value in values:
+        if isinstance(value, str):
+            data, kind = value.encode(), b"s"
+        else:
+            data, kind = repr(value).encode(), b"r"
+        h.update(b"%s%d:" % (kind, len(data)))
+        h.update(data)
+    return h.digest()
+
+
+class ByteBudgetMemo:
+    """Answers by digest, least recently used first out once they hold more than max_bytes."""
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # digest -> (answer, size)
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        _memos.append(self)
+
+    def lookup(self, key: bytes):
+        """The answer stored under `key`, or MISSING. Counts a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def store(self, key: bytes, answer) -> None:
+        size = sys.getsizeof(answer) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (answer, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> MemoInfo:
+        with self._lock:
+            return MemoInfo(self.hits, self.misses, self.evictions, len(self._entries),
+                            self._bytes, self.max_bytes)
+
+
+def memoized(name: str, max_bytes=None):
+    """lru_cache(maxsize=None) with a byte budget: memoise a function on all of its arguments,
+    keyword or positional alike. The memo is on the wrapper as `.memo`."""
+    def decorate(fn):
+        memo = ByteBudgetMemo(name, config.MEMO_MAX_BYTES if max_bytes is None else max_bytes)
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = digest(bound.arguments.values())
+            answer = memo.lookup(key)
+            if answer is MISSING:
+                answer = fn(*args, **kwargs)
+                memo.store(key, answer)
+            return answer
+
+        wrapper.memo = memo
+        wrapper.cache_clear = memo.clear
+        wrapper.cache_info = memo.info
+        return wrapper
+    return decorate
+
+
+def report_memos() -> None:
+    """One "memo" event per memo that was asked anything this run (RDG_EVENTS=jsonl)."""
+    for memo in _memos:
+        info = memo.info()
+        if info.hits or info.misses:
+            emit("memo", name=memo.name, **info._asdict())
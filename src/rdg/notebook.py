@@ -0,0 +1,162 @@
+"""Parse once — the lexed notebook every consumer shares, and its on-disk plan cache.
+
+A notebook used to be parsed once per consumer: the planner lexed every line, the runner lexed
+each line again as it started the step, file_ops (and with it the chat context) lexed the file a
+third time, and the validator took it apart with regexes of its own. load_notebook lexes a file
+once and hands every one of them the same Notebook: one NotebookLine per physical line, carrying
+the lexer's RdgLine, or the RdgSyntaxError that line raises, or neither for a blank line or a
+comment.
+
+With RDG_PARSE_CACHE=1 the lexed form is also kept on disk, under CACHE_DIR/notebooks, named like
+the duration history (history.py) by the md5 of the notebook's absolute path and valid for the
+sha256 of the file's bytes. A process that starts on an unchanged notebook — a watch loop
+re-running the CLI, a daemon, a workspace run over hundreds of notebooks — reads that instead of
+lexing. Opt-in, like RDG_INCREMENTAL: CACHE_DIR defaults to a directory in the working tree, and a
+plain run should not leave a file there per notebook it loads. Within a process the last Notebook
+per file is memoized either way.
+
+Only SYNTAX is cached. Whether a formula exists, and what its standard parameters mean, depend on
+the formula registry of the process that runs the notebook (RDG_FORMULA_PATH, RDG_PRIMARY); those
+checks stay where they are (parser.resolve_rdg_line) and run on every load, so a cached notebook
+can never hide a formula that has since gone away. The key is therefore the file's bytes and
+NOTEBOOK_VERSION, which is bumped whenever the lexer's output for some line would change.
+"""
+
+import collections
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+
+from . import config
+from .lexer import Argument, RdgLine, RdgSyntaxError, lex_rdg_line
+
+NOTEBOOK_VERSION = 1
+
+NotebookLine = collections.namedtuple("NotebookLine", "number text syntax error")
+NotebookLine.__doc__ = """One physical line: its 1-based number, its text as read (newline kept),
+and either `syntax` (a lexer.RdgLine) or `error` (the lexer.RdgSyntaxError it raises). Both are None
+for a blank line or a comment."""
+
+_memo_lock = threading.Lock()
+_memo = {}
+
+
+class Notebook:
+    """A lexed rdg file. `lines` holds every physical line, in order; `digest` is the sha256 of the
+    bytes they were lexed from."""
+
+    def __init__(self, rdg_file: str, digest: str, lines: list):
+        self.rdg_file = rdg_file
+        self.digest = digest
+        self.lines = lines
+
+    def rules(self):
+        """The lines that are not blank or comments — steps, and lines that will not lex."""
+        return [line for line in self.lines if line.syntax is not None or line.error is not None]
+
+
+def parse_cache_enabled() -> bool:
+    return os.environ.get("RDG_PARSE_CACHE") == "1"
+
+
+def notebook_cache_path(rdg_file: str) -> str:
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return os.path.join(config.CACHE_DIR, "notebooks", f"{digest}.json")
+
+
+def load_notebook(rdg_file: str) -> Notebook:
+    """The Notebook for `rdg_file` as it is on disk now. Raises FileNotFoundError like open()."""
+    path = os.path.abspath(rdg_file)
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with _memo_lock:
+        notebook = _memo.get(path)
+    if notebook is not None and notebook.digest == digest:
+        return notebook
+
+    # Decoded exactly as iterating open(rdg_file, 'r') decodes it: same encoding, same universal
+    # newlines, so a line's text is what the serial loop always saw.
+    texts = io.TextIOWrapper(io.BytesIO(data)).readlines()
+    cached = parse_cache_enabled()
+    notebook = _read_cache(path, digest, texts) if cached else None
+    if notebook is None:
+        notebook = Notebook(path, digest, [_lex(number, text)
+                                           for number, text in enumerate(texts, 1)])
+        if cached:
+            _write_cache(notebook)
+    with _memo_lock:
+        _memo[path] = notebook
+    return notebook
+
+
+def _lex(number: int, text: str) -> NotebookLine:
+    try:
+        return NotebookLine(number, text, lex_rdg_line(text), None)
+    except RdgSyntaxError as e:
+        return NotebookLine(number, text, None, e)
+
+
+# On disk each line is 0 for a blank or a comment, [dest, formula, arguments] for a step (each
+# argument [name, value, quote, column]), or [null, kind, column, problem] for a line that will not
+# lex. Line texts are not stored: they come from the file itself, which was read to hash it anyway.
+def _encode(line: NotebookLine):
+    if line.syntax is not None:
+        return [line.syntax.dest, line.syntax.formula,
+                [list(argument) for argument in line.syntax.arguments]]
+    if line.error is not None:
+        return [None, line.error.kind, line.error.column, line.error.problem]
+    return 0
+
+
+def _decode(number: int, text: str, entry) -> NotebookLine:
+    # Runs once per line and argument of a 100k-line notebook: no constructor calls.
+    if entry == 0:
+        return _line((number, text, None, None))
+    if entry[0] is None:
+        return _line((number, text, None, RdgSyntaxError(*entry[1:])))
+    syntax = _rdg_line((entry[0], entry[1], tuple(map(_argument, entry[2]))))
+    return _line((number, text, syntax, None))
+
+
+# tuple.__new__ bound to each type: what _make does, without a Python frame per call.
+_line, _rdg_line, _argument = (functools.partial(tuple.__new__, cls)
+                               for cls in (NotebookLine, RdgLine, Argument))
+
+
+def _read_cache(path: str, digest: str, texts: list):
+    """The cached Notebook for these bytes (decoded as `texts`), or None. A corrupt cache file is
+    a miss."""
+    try:
+        with open(notebook_cache_path(path), "r") as f:
+            data = json.load(f)
+        if data.get("version") != NOTEBOOK_VERSION or data.get("digest") != digest:
+            return None
+        if len(data["lines"]) != len(texts):
+            raise ValueError("line count does not match the file")
+        return Notebook(path, digest, [_decode(number, text, entry) for number, (text, entry)
+                                       in enumerate(zip(texts, data["lines"]), 1)])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+        logging.warning(f"Ignoring unreadable notebook cache for '{path}': {e}")
+        return None
+
+
+def _write_cache(notebook: Notebook) -> None:
+    """Persist atomically. Never raises: a lost cache costs one more lex."""
+    target = notebook_cache_path(notebook.rdg_file)
+    payload = {"version": NOTEBOOK_VERSION, "rdg_file": notebook.rdg_file,
+               "digest": notebook.digest, "lines": [_encode(line) for line in notebook.lines]}
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps(payload, separators=(",", ":")))  # dumps: the C encoder
+        os.replace(tmp, target)
+    except OSError as e:
+        logging.warning(f"Could not save notebook cache '{target}': {e}")
@@ -1,18 +1,37 @@
+import asyncio
+import bisect
+import collections
+import contextlib
+import contextvars
+import fnmatch
+import functools
+import heapq
 import re
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Any
 from .functions import (
+    ASYNC_TWINS,
     FUNCTION_REGISTRY,
     MODEL_FORMULAS,
     BUILTIN_FORMULAS,
+    RESOURCE_CLASSES,
     STANDARD_PARAM_NAMES,
     RdgParserError,
     _READ_FENCE,
+    collecting_cache_keys,
+    resource_class,
 )
 from .config import validate_effort
 from .events import emit
+from .history import load_durations, record_durations
+from .lexer import lex_rdg_line
+from .notebook import load_notebook
+from .bundle import note_run_keys, save_run_keys
+from .manifest import open_manifest
+from .traces import ReadTrace, open_traces, step_fingerprint, traced
 
 
 def _pop_standard_params(formula_name: str, arguments: dict) -> dict:
@@ -60,58 +79,36 @@ def _pop_standard_params(formula_name: str, arguments: dict) -> dict:
     return present
 
 def parse_rdg_line(line: str, file_dir: str = ".") -> tuple[str, str, dict[str, Any]]:
-    """Parses a single line of the rdg file."""
-    line = line.strip()
-    if not line or line.startswith("#"):
-        return None, None, None
+    """Parses a single line of the rdg file: (dest, formula name, {argument: value}), or
+    (None, None, None) for a blank line or a comment. The grammar lives in lexer.py; errors are
+    lexer.RdgSyntaxError, an RdgParserError naming the column."""
+    return resolve_rdg_line(lex_rdg_line(line))
 
-    match = re.match(r"([^=]+)=([^()]+)\((.*)\)", line)
-    if not match:
-        raise RdgParserError(f"Invalid line format: {line}")
 
-    output_file, formula_name, arguments_str = match.groups()
-    output_file = output_file.strip()
-    formula_name = formula_name.strip()
+def resolve_rdg_line(syntax) -> tuple[str, str, dict[str, Any]]:
+    """parse_rdg_line for a line lexed already (a lexer.RdgLine, or None for a blank line or a
+    comment). The checks that depend on this process's formula registry happen here, never in the
+    lexer, so a cached notebook (notebook.py) is checked against the formulas that will run it.
+    The arguments dict is new on every call: the runners pop the standard parameters out of it."""
+    if syntax is None:
+        return None, None, None
 
-    if formula_name not in FUNCTION_REGISTRY:
-        raise RdgParserError(f"Unknown formula: {formula_name}")
+    if syntax.formula not in FUNCTION_REGISTRY:
+        raise RdgParserError(f"Unknown formula: {syntax.formula}")
 
-    arguments = {}
-    # Regex to split on commas outside of quotes
-    argument_pairs = re.split(r',\s*(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)', arguments_str)
+    arguments = {argument.name: argument.value for argument in syntax.arguments}
+    return syntax.dest, syntax.formula, arguments
 
-    for arg_pair in argument_pairs:
-        arg_pair = arg_pair.strip()
-        if not arg_pair:
-            continue
-        arg_match = re.match(r"([^=]+)=(.*)", arg_pair)
-        if not arg_match:
-            raise RdgParserError(f"Invalid argument format: {arg_pair}")
-        arg_name, arg_value = arg_match.groups()
-        arg_name = arg_name.strip()
-        arg_value = arg_value.strip()
-        
-        # check if string or file
-        if (arg_value.startswith('"') and arg_value.endswith('"')) or (arg_value.startswith("'") and arg_value.endswith("'")):
-            # string, so we strip it and handle escaped quotes
-            arg_value = arg_value[1:-1]
-            arg_value = arg_value.replace('\\"', '"').replace("\\'", "'")
-            arguments[arg_name] = arg_value
-        else:
-            # file path so we expand it with file_dir and handle relative paths
-            arguments[arg_name] = arg_value
-            
 
-    return output_file, formula_name, arguments
-
-
-def _run_step(rdg_file: str, file_dir: str, line: str, fence=None, progress=None) -> int:
+def _run_step(rdg_file: str, file_dir: str, line: str, fence=None, progress=None,
+              wait_ms=None, manifest=None, traces=None, syntax=None) -> int:
     """Execute one line of an rdg file. Returns 1 if the step failed, else 0.
 
-    This is the serial loop body, extracted verbatim so the serial path and the RDG_JOBS wave
+    This is the serial loop body, extracted verbatim so the serial path and the RDG_JOBS
     runner share one implementation — per-step semantics (parse inside the try, delete the
     destination before the formula runs, write ## ERROR into the step's own destination on
-    failure) cannot drift between the two.
+    failure) cannot drift between the two. The asyncio runner (_run_step_async) is the same
+    three pieces — _begin_step, _finish_step, _fail_step — around an awaited formula call.
 
     `fence` is only ever set by the parallel runner: (all_destinations, allowed_destinations,
     step_label). It arms the read-fence in process_input for the duration of the formula call.
@@ -121,64 +118,156 @@ def _run_step(rdg_file: str, file_dir: str, line: str, fence=None, progress=None
     `progress` is (index, total), 1-based, when the caller knows it. Both runners pass it; step
     events (events.py, RDG_EVENTS=jsonl) carry it so a live reader can render [i/n]. Emission
     lives HERE so the two runners cannot drift on observability either.
+
+    `wait_ms` is how long the step sat on the parallel runner's ready queue before a worker took
+    it; it rides step_start when known. The serial loop has no queue and passes nothing.
+    
+    `manifest` is the notebook's BuildManifest under RDG_INCREMENTAL=1 (manifest.py), else None.
+    A step whose fingerprint matches it returns before its destination is touched; step_end then
+    says skipped, with nothing in wrote.
+
+    `traces` is the notebook's TraceStore under RDG_TRACE_READS=1 (traces.py), else None. A step
+    the planner cannot see into runs under the read tracer, and its trace is stored if it succeeds.
+
+    `syntax` is the line as the notebook already lexed it (notebook.py), so the step is not lexed
+    twice; None lexes `line` here, inside the try, which is also how a line that will not lex
+    reports its error.
     """
-    output_path = None
-    formula_name = None
-    i, n = progress if progress is not None else (None, None)
+    step = _StepRun(line, file_dir, progress, syntax)
     try:
-        output_file, formula_name, arguments = parse_rdg_line(line, file_dir)
-        if not output_file:  # skip empty lines or comments
+        if not _begin_step(step, wait_ms, manifest, traces):
             return 0
-        emit("step_start", i=i, n=n, dest=output_file, formula=formula_name)
-
-        # Resolved before the formula is looked up, so the error handlers always have a
-        # path to write to. An unknown formula used to raise KeyError here, and the
-        # handler then raised UnboundLocalError on output_path, aborting the file.
-        output_path = os.path.join(file_dir, output_file)
-        formula = FUNCTION_REGISTRY[formula_name]
-
-        # Standard parameters come out of the argument bag BEFORE anything is deleted or written:
-        # they are the step's dispatch policy, not its content, and a bad level must not cost the
-        # destination's previous bytes any later than a bad line already does.
-        standard = _pop_standard_params(formula_name, arguments)
-
-        # Create the output directory if it doesn't exist
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-
-        # Delete the output file if it exists
-        if os.path.exists(output_path):
-            os.remove(output_path)
-
-        if fence is not None:
-            token = _READ_FENCE.set(fence)
-            try:
-                result = formula(rdg_file, **standard, **arguments)
-            finally:
-                _READ_FENCE.reset(token)
-        else:
-            result = formula(rdg_file, **standard, **arguments)
-
-        with open(output_path, 'w') as outfile:
-            outfile.write(result)
-        emit("step_end", i=i, n=n, dest=output_file, formula=formula_name, ok=True, wrote=[output_file])
+        with _fenced(fence), traced(step.trace), collecting_cache_keys(step.cache_keys):
+            result = step.formula(rdg_file, **step.kwargs)
+        _finish_step(step, result, manifest)
+        note_run_keys(rdg_file, step.cache_keys)
         return 0
-    except KeyError as e:
-        print(f"Unknown formula on line '{line.strip()}': {e}", file=sys.stderr)
-        _write_error(output_path, f"Unknown formula: {e}")
-        emit("step_end", i=i, n=n, dest=_dest_or_none(output_path, file_dir), formula=formula_name, ok=False, wrote=_wrote(output_path, file_dir))
-        return 1
-    except RdgParserError as e:
-        print(f"Error processing line '{line.strip()}': {e}", file=sys.stderr)
-        _write_error(output_path, e)
-        emit("step_end", i=i, n=n, dest=_dest_or_none(output_path, file_dir), formula=formula_name, ok=False, wrote=_wrote(output_path, file_dir))
-        return 1
     except Exception as e:
-        print(f"An unexpected error occurred processing line '{line.strip()}': {e}", file=sys.stderr)
-        _write_error(output_path, e)
-        emit("step_end", i=i, n=n, dest=_dest_or_none(output_path, file_dir), formula=formula_name, ok=False, wrote=_wrote(output_path, file_dir))
-        return 1
+        return _fail_step(step, e)
+
+
+class _StepRun:
+    """One step on its way through _run_step: what it resolved so far, for the error handlers."""
+
+    __slots__ = ("line", "syntax", "file_dir", "i", "n", "output_file", "output_path",
+                 "formula_name", "formula", "kwargs", "fingerprint", "cache_keys", "traces",
+                 "trace")
+
+    def __init__(self, line, file_dir, progress, syntax=None):
+        self.line = line
+        self.syntax = syntax
+        self.file_dir = file_dir
+        self.i, self.n = progress if progress is not None else (None, None)
+        self.output_file = None
+        self.output_path = None
+        self.formula_name = None
+        self.formula = None
+        self.kwargs = None
+        self.fingerprint = None
+        self.cache_keys = None
+        self.traces = None
+        self.trace = None
+
+
+def _begin_step(step: _StepRun, wait_ms, manifest, traces=None) -> bool:
+    """Parse, announce and clear the destination. False when there is nothing to run: a blank or
+    comment line, or a step the manifest proves current (its step_end is emitted here)."""
+    syntax = step.syntax if step.syntax is not None else lex_rdg_line(step.line)
+    output_file, formula_name, arguments = resolve_rdg_line(syntax)
+    if not output_file:  # skip empty lines or comments
+        return False
+    step.output_file, step.formula_name = output_file, formula_name
+    if wait_ms is None:
+        emit("step_start", i=step.i, n=step.n, dest=output_file, formula=formula_name)
+    else:
+        emit("step_start", i=step.i, n=step.n, dest=output_file, formula=formula_name,
+             wait_ms=wait_ms)
+
+    # Resolved before the formula is looked up, so the error handlers always have a
+    # path to write to. An unknown formula used to raise KeyError here, and the
+    # handler then raised UnboundLocalError on output_path, aborting the file.
+    output_path = step.output_path = os.path.join(step.file_dir, output_file)
+    step.formula = FUNCTION_REGISTRY[formula_name]
+
+    # Standard parameters come out of the argument bag BEFORE anything is deleted or written:
+    # they are the step's dispatch policy, not its content, and a bad level must not cost the
+    # destination's previous bytes any later than a bad line already does.
+    standard = _pop_standard_params(formula_name, arguments)
+    step.kwargs = {**standard, **arguments}
+
+    # Fingerprinted BEFORE the destination is deleted, from the inputs the formula is about to
+    # read. Only KNOWN_SAFE formulas: their arguments name everything they can see.
+    if manifest is not None and formula_name in KNOWN_SAFE:
+        step.fingerprint = manifest.fingerprint(step.file_dir, output_file, formula_name,
+                                                arguments, standard)
+        if manifest.is_current(output_file, output_path, step.fingerprint):
+            emit("step_end", i=step.i, n=step.n, dest=output_file, formula=formula_name, ok=True,
+                 wrote=[], skipped=True)
+            return False
+    # Recorded with the step (manifest), so `cache gc` keeps these answers, and with the run
+    # (bundle.py), so `cache export` can ship them.
+    step.cache_keys = []
+
+    # Traced: the steps whose reads the planner cannot derive from the line (plan_rdg_file).
+    if traces is not None and formula_name not in KNOWN_SAFE and formula_name not in WALKER_READ_SETS:
+        step.traces, step.trace = traces, ReadTrace()
+
+    # Create the output directory if it doesn't exist
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Delete the output file if it exists
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return True
+
+
+@contextlib.contextmanager
+def _fenced(fence):
+    """Arm the read-fence for the formula call when the runner supplied one."""
+    if fence is None:
+        yield
+        return
+    token = _READ_FENCE.set(fence)
+    try:
+        yield
+    finally:
+        _READ_FENCE.reset(token)
+
+
+def _finish_step(step: _StepRun, result: str, manifest) -> None:
+    with open(step.output_path, 'w') as outfile:
+        outfile.write(result)
+    if manifest is not None:
+        manifest.record(step.output_file, step.output_path, step.fingerprint, result,
+                        step.cache_keys)
+    if step.trace is not None:
+        step.traces.record(step.output_file,
+                           step_fingerprint(step.output_file, step.formula_name, step.formula,
+                                            step.kwargs),
+                           step.trace)
+    emit("step_end", i=step.i, n=step.n, dest=step.output_file, formula=step.formula_name,
+         ok=True, wrote=[step.output_file])
+
+
+def _fail_step(step: _StepRun, e: Exception) -> int:
+    """Report a failed step and write ## ERROR into its destination. Always returns 1."""
+    line = step.line.strip()
+    if step.trace is not None:
+        step.traces.forget(step.output_file)
+    if isinstance(e, KeyError):
+        print(f"Unknown formula on line '{line}': {e}", file=sys.stderr)
+        _write_error(step.output_path, f"Unknown formula: {e}")
+    elif isinstance(e, RdgParserError):
+        print(f"Error processing line '{line}': {e}", file=sys.stderr)
+        _write_error(step.output_path, e)
+    else:
+        print(f"An unexpected error occurred processing line '{line}': {e}", file=sys.stderr)
+        _write_error(step.output_path, e)
+    emit("step_end", i=step.i, n=step.n, dest=_dest_or_none(step.output_path, step.file_dir),
+         formula=step.formula_name, ok=False, wrote=_wrote(step.output_path, step.file_dir))
+    return 1
 
 
 def _dest_or_none(output_path, file_dir):
@@ -194,30 +283,52 @@ def _wrote(output_path, file_dir):
     return [dest] if dest is not None else []
 
 
-def process_rdg_file(rdg_file: str, file_dir: str = ".") -> int:
-    """Process the given rdg file. Returns the number of steps that failed."""
+def process_rdg_file(rdg_file: str, file_dir: str = ".", targets=None) -> int:
+    """Process the given rdg file. Returns the number of steps that failed.
+
+    `targets` (destinations or glob patterns) restricts the run to the steps they need; see
+    select_targets. The selection is computed from the plan, so a file the planner refuses runs
+    in full, with the reason on stderr — a superset of what was asked for, never a guess.
+    """
     failures = 0
+    partial = False
+    manifest = open_manifest(rdg_file)
+    traces = open_traces(rdg_file)
     try:
-        with open(rdg_file, 'r') as f:
-            lines = f.readlines()
-        # Steps are counted up front so progress events can say [i/n]; comments and blanks are
-        # excluded from n the same way _run_step skips them, so n matches what actually runs.
-        real = [ln for ln in lines if ln.strip() and not ln.strip().startswith('#')]
-        total = len(real)
-        step_no = 0
-        for line in lines:
-            # Parsing happens INSIDE the per-line try (in _run_step). Outside it, a single
-            # malformed line or unknown formula raised past the loop to the file-level handler
-            # below, which silently abandoned every remaining line — and the CLI still
-            # reported success.
-            if line.strip() and not line.strip().startswith('#'):
-                step_no += 1
-                failures += _run_step(rdg_file, file_dir, line, progress=(step_no, total))
+        # Comments and blanks are not steps: they never run, and are excluded from n so progress
+        # events ([i/n]) count what actually runs.
+        rules = [(line.text, line.syntax) for line in load_notebook(rdg_file).rules()]
+        if targets or reorder_enabled():
+            # Under RDG_REORDER the plan's order IS the run order, serial included.
+            steps, _, _, reason, selected = _plan_selection(rdg_file, file_dir, targets)
+            if reason is None:
+                chosen = range(len(steps)) if selected is None else sorted(selected)
+                partial = len(chosen) < len(steps)
+                rules = [(steps[i].line, steps[i].syntax) for i in chosen]
+            elif targets:
+                print(f"Target selection unavailable, running every step — {reason}",
+                      file=sys.stderr)
             else:
-                failures += _run_step(rdg_file, file_dir, line)
+                print(f"RDG_REORDER: running in line order — {reason}", file=sys.stderr)
+        total = len(rules)
+        for step_no, (line, syntax) in enumerate(rules, 1):
+            # A line's errors — it will not lex, its formula is unknown — are raised INSIDE the
+            # per-line try (in _run_step). Outside it, a single malformed line or unknown formula
+            # raised past the loop to the file-level handler below, which silently abandoned
+            # every remaining line — and the CLI still reported success.
+            failures += _run_step(rdg_file, file_dir, line, progress=(step_no, total),
+                                  manifest=manifest, traces=traces, syntax=syntax)
+        if manifest is not None:
+            manifest.save()
+        if traces is not None:
+            traces.save()
+        save_run_keys(rdg_file, partial)
     except FileNotFoundError:
         print(f"Error: RDF file not found at '{rdg_file}'", file=sys.stderr)
         return 1
+    except RdgParserError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
         return 1
@@ -256,17 +367,36 @@ def _write_error(output_path, error):
 #             path-normalized) equals i's normalized destination. That is exactly the join the
 #             engine itself performs at run time: process_input resolves an argument against the
 #             file's directory and reads it if it exists.
-#   BARRIER   a step whose formula is not in KNOWN_SAFE runs alone — after everything before it,
-#             before everything after it. KNOWN_SAFE holds only formulas verified to read the
-#             filesystem exclusively through paths named in their argument values. Everything else
-#             — the glob/directory walkers, and every externally loaded formula — reads things its
-#             arguments do not name, so its true edges are unknowable from the text.
+#   WALKER    the glob/directory walkers (WALKER_READ_SETS) read files their arguments do not
+#             name one by one, but their arguments DO bound what they can see: a glob pattern, a
+#             directory subtree. The planner resolves that bound at plan time and adds an edge
+#             from every earlier step whose destination falls inside it. A walker whose bound also
+#             covers a LATER step's destination reads that step's previous-run bytes serially, and
+#             only a barrier preserves that — so it stays one.
+#   TRACED    under RDG_TRACE_READS=1, any other step with a current trace (traces.py) — what it
+#             opened and listed the last time it ran this exact line with this exact code — is
+#             planned like a walker over that read set (_traced_reads). No trace, a stale one, or a
+#             trace that touched a later destination or wrote elsewhere in the tree: a barrier.
+#   BARRIER   a step whose formula is neither in KNOWN_SAFE nor a resolvable walker runs alone —
+#             after everything before it, before everything after it. KNOWN_SAFE holds only
+#             formulas verified to read the filesystem exclusively through paths named in their
+#             argument values. Everything else — every externally loaded formula, above all —
+#             reads things its arguments do not name, so its true edges are unknowable from the text.
 #   REFUSE    a duplicate destination, a forward reference (an argument naming a LATER step's
 #             destination), or any unparseable line -> the whole file runs serially, with the
 #             reason on stderr. Serial has defined semantics for all three; a reordering does not.
+#   REORDER   under RDG_REORDER=1 the author opts out of line order as the contract: a forward
+#             reference, and a walker or traced read set covering a later destination, become
+#             edges like any other, and the steps are put in topological order (_reorder), line
+#             order breaking ties. Barriers keep their place — they may read or write anything — so
+#             an edge that would have to cross one is a cycle, as is any real cycle of reads. A
+#             cycle is refused with its path; the serial loop runs in the same reordered order, so
+#             RDG_JOBS=1 and RDG_JOBS=N still agree byte for byte.
 #
 # Every edge goes from a lower index to a higher one and forward references are refused, so the
 # graph is acyclic by construction — there is no cycle detection because no cycle can be built.
+# Under RDG_REORDER the same holds after _reorder has renumbered the steps, which is where cycles
+# are found.
 #
 # WHY THE CAUTION IS NOT OPTIONAL. A missed edge here does not crash. The engine deletes a
 # destination before writing it, and process_input treats a nonexistent path as literal text — so
@@ -281,139 +411,891 @@ KNOWN_SAFE = {
 }
 
 
+def _glob_regex(pattern: str):
+    """A regex matching AT LEAST every path glob.glob(pattern, recursive=True) can return.
+
+    Over-approximation is the safe direction: a path matched here that glob would skip costs an
+    unneeded edge, never a missed one. So `**` crosses directories wherever it appears, and hidden
+    files match like any other. Character classes are translated as fnmatch does.
+    """
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        c = pattern[i]
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < len(pattern) and pattern[j] == "!":
+                j += 1
+            if j < len(pattern) and pattern[j] == "]":
+                j += 1
+            j = pattern.find("]", j)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                stuff = re.sub(r"([\\\[&~|])", r"\\\1", pattern[i + 1:j])
+                if stuff.startswith("!"):
+                    stuff = "^" + stuff[1:]
+                elif stuff.startswith("^"):
+                    stuff = "\\" + stuff
+                out.append(f"[{stuff}]")
+                i = j + 1
+                continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out) + r"\Z", re.DOTALL)
+
+
+# What a walker (or a traced step) can read. `contains` is the exact test over normalized paths;
+# `roots` are path prefixes every member starts with — how the planner finds the candidates
+# without testing every destination in the file — or None when nothing bounds the set.
+_ReadSet = collections.namedtuple("_ReadSet", "roots contains")
+
+
+def _glob_reads(file_dir: str, arguments: dict):
+    pattern = arguments.get("pattern")
+    if pattern is None:
+        return None
+    parts = pattern.replace(os.sep, "/").split("/")
+    wild = [k for k, part in enumerate(parts) if any(ch in part for ch in "*?[")]
+    if wild and ".." in parts[wild[0]:]:
+        # `src/*/../x` cannot be normalized without knowing what `*` matched.
+        return _ReadSet(None, lambda path: True)
+    literal = "/".join(parts[:wild[0]]) if wild else pattern
+    if not literal and pattern.startswith("/"):
+        literal = "/"
+    regex = _glob_regex(os.path.normpath(os.path.join(file_dir, pattern)).replace(os.sep, "/"))
+    return _ReadSet([os.path.normpath(os.path.join(file_dir, literal))],
+                    lambda path: regex.match(path.replace(os.sep, "/")) is not None)
+
+
+def _tree_reads(file_dir: str, roots: list):
+    roots = [os.path.normpath(os.path.join(file_dir, r)) for r in roots if r]
+    return _ReadSet(roots, lambda path: any(path == r or path.startswith(r.rstrip(os.sep) + os.sep)
+                                            for r in roots))
+
+
+def _directory_reads(file_dir: str, arguments: dict):
+    directory = arguments.get("directory")
+    return None if directory is None else _tree_reads(file_dir, [directory])
+
+
+def _paths_reads(file_dir: str, arguments: dict):
+    paths = arguments.get("paths")
+    return None if paths is None else _tree_reads(file_dir, [p.strip() for p in paths.split(",")])
+
+
+# Walker formula -> f(file_dir, arguments) returning the _ReadSet of every file the step can read
+# (or list), or None when the arguments do not bound it. Each mirrors how its formula interprets
+# its arguments: DIRECTORYTOMARKDOWN takes one directory, verbatim; the `paths=` walkers split on
+# commas; GLOBTOMARKDOWN's `exclude=` is ignored, which only widens the set.
+WALKER_READ_SETS = {
+    "GLOBTOMARKDOWN": _glob_reads,
+    "DIRECTORYTOMARKDOWN": _directory_reads,
+    "FILESORDIRECTORIESTOMARKDOWN": _paths_reads,
+    "LISTPATHS": _paths_reads,
+}
+
+
+def _traced_reads(store, file_dir: str, step):
+    """A step's recorded read set, or None when it must stay a barrier: tracing is off, there is no
+    trace for this exact line and formula code, or the traced run wrote inside the notebook's
+    directory anywhere but its own destination — a write the plan cannot order. A listed directory
+    covers everything beneath it, as a walker's root does."""
+    if store is None:
+        return None
+    try:
+        formula = FUNCTION_REGISTRY[step.formula]
+        trace = store.current(step.dest, step_fingerprint(step.dest, step.formula, formula,
+                                                          step.args))
+    except Exception:  # an unreadable formula source is just an untraceable step
+        return None
+    if trace is None:
+        return None
+    reads, listed, writes = trace
+    root = os.path.abspath(file_dir).rstrip(os.sep) + os.sep
+    own = os.path.abspath(step.norm)
+    if any(w != own and w.startswith(root) for w in writes):
+        return None
+    prefixes = [d.rstrip(os.sep) + os.sep for d in listed]
+
+    def touched(path):
+        path = os.path.abspath(path)
+        return path in reads or path in writes or any(path.startswith(r) for r in prefixes)
+    return _ReadSet(sorted(reads | writes | listed), touched)
+
+
+class PlanStep:
+    """One line of a plan. `reads` holds the indexes of the steps whose destinations this step's
+    arguments name or, for a walker or a traced step, whose destinations fall inside its read set —
+    its DATA predecessors, as opposed to the ordering a barrier imposes. `label` names it in
+    messages ("step 3"; workspace.py prefixes the notebook). `written` is its index in line order;
+    only RDG_REORDER makes it differ from `index`.
+
+    Slotted: a generated notebook can hold 100k of these, and the planner touches every one."""
+
+    __slots__ = ("index", "written", "line", "syntax", "dest", "norm", "formula", "args", "reads",
+                 "barrier", "traced", "rdg_file", "file_dir", "label")
+
+    def __init__(self, index, line, syntax, dest, norm, formula, args, rdg_file, file_dir, label):
+        self.index = index
+        self.written = index
+        self.line = line
+        self.syntax = syntax
+        self.dest = dest
+        self.norm = norm
+        self.formula = formula
+        self.args = args
+        self.reads = set()
+        self.barrier = False
+        self.traced = False
+        self.rdg_file = rdg_file
+        self.file_dir = file_dir
+        self.label = label
+
+    def kind(self) -> str:
+        """How the planner placed the step, as RDG_JOBS=plan prints it."""
+        if self.barrier:
+            return "barrier"
+        if self.formula in KNOWN_SAFE:
+            return "safe"
+        return "traced" if self.traced else "walker"
+
+
 def plan_rdg_file(rdg_file: str, file_dir: str = "."):
     """Derive the wave plan for a file, or the reason it must run serially.
 
-    Returns (steps, waves, edges, reason). `reason` is None when the plan is usable; otherwise it
+    Returns (steps, waves, preds, reason). `reason` is None when the plan is usable; otherwise it
     says why the file falls back to the serial loop, and the other fields describe what WAS parsed.
-    steps: list of dicts {index, line, dest, norm, formula}. waves: list of lists of step indexes.
-    edges: set of (i, j) pairs meaning i must complete before j starts.
+    steps: list of PlanStep, in line order. waves: list of lists of step indexes.
+    preds: preds[j] is the sorted list of step indexes that must complete before step j starts.
+
+    Barriers stay IMPLICIT in preds: a barrier waits for the steps since the previous barrier (and
+    that barrier), and every later step waits for the nearest barrier above it. That is the same
+    order as "after everything before it, before everything after it", by transitivity, in O(n)
+    entries instead of O(n) per barrier.
     """
-    def norm(p):
-        return os.path.normpath(os.path.join(file_dir, p))
+    steps, reason = _parse_steps(rdg_file, file_dir)
+    if reason is not None:
+        return steps, [], [], reason
+    preds, reason = _link_steps(steps)
+    if reason is not None:
+        return steps, [], [], reason
+    return steps, _waves(preds), preds, None
 
+
+def _parse_steps(rdg_file: str, file_dir: str):
+    """(steps, reason) — the file's PlanSteps, unlinked, from its shared Notebook (notebook.py)."""
     steps = []
-    with open(rdg_file, 'r') as f:
-        for raw in f:
-            stripped = raw.strip()
-            if not stripped or stripped.startswith("#"):
-                continue
-            try:
-                dest, formula_name, arguments = parse_rdg_line(raw, file_dir)
-            except RdgParserError as e:
-                return steps, [], set(), f"line will not parse ({e})"
-            if not dest:
-                continue
-            steps.append({
-                "index": len(steps), "line": raw, "dest": dest, "norm": norm(dest),
-                "formula": formula_name, "args": arguments,
-            })
+    for line in load_notebook(rdg_file).rules():
+        try:
+            if line.error is not None:
+                raise line.error
+            dest, formula_name, arguments = resolve_rdg_line(line.syntax)
+        except RdgParserError as e:
+            return steps, f"line {line.number} will not parse ({e})"
+        steps.append(PlanStep(len(steps), line.text, line.syntax, dest,
+                              os.path.normpath(os.path.join(file_dir, dest)), formula_name,
+                              arguments, rdg_file, file_dir, f"step {len(steps) + 1}"))
+    return steps, None
+
+
+def _link_steps(steps: list):
+    """(preds, reason) — apply the EDGE / WALKER / TRACED / BARRIER rules to parsed steps, in
+    place, and return the per-step predecessor lists (see plan_rdg_file). Steps may come from
+    several notebooks (workspace.py): each resolves its arguments against its own file_dir, and
+    every rule works on normalized paths, so a destination one notebook writes and another names
+    is an edge like any other.
 
+    Linear in the number of steps plus the edges found: argument joins are dict lookups, and a
+    read set's candidates come from a sorted index of destinations by prefix (bisect), not from
+    testing every step.
+
+    Under RDG_REORDER=1 (the REORDER rule) `steps` is put in topological order in place and
+    renumbered before preds are built; a cycle is the returned reason.
+    """
+    reorder = reorder_enabled()
     by_norm = {}
     for s in steps:
-        if s["norm"] in by_norm:
-            return steps, [], set(), f"duplicate destination '{s['dest']}'"
-        by_norm[s["norm"]] = s["index"]
+        if s.norm in by_norm:
+            return [], f"duplicate destination '{s.dest}'"
+        by_norm[s.norm] = s.index
 
-    edges = set()
     for s in steps:
-        for value in s["args"].values():
+        for value in s.args.values():
             for piece in str(value).split(","):
                 piece = piece.strip()
                 if not piece:
                     continue
-                producer = by_norm.get(norm(piece))
-                if producer is None or producer == s["index"]:
+                producer = by_norm.get(os.path.normpath(os.path.join(s.file_dir, piece)))
+                if producer is None or producer == s.index:
                     continue
-                if producer > s["index"]:
-                    return steps, [], set(), (
-                        f"forward reference: step {s['index'] + 1} reads '{piece}', "
-                        f"written by later step {producer + 1}"
+                if producer > s.index and not reorder:
+                    return [], (
+                        f"forward reference: {s.label} reads '{piece}', "
+                        f"written by later {steps[producer].label}"
                     )
-                edges.add((producer, s["index"]))
+                s.reads.add(producer)
+
+    index = None
+    stores = {}
+    for s in steps:
+        if s.formula in KNOWN_SAFE:
+            continue
+        walker = WALKER_READ_SETS.get(s.formula)
+        if walker is not None:
+            reads = walker(s.file_dir, s.args)
+        else:
+            if s.rdg_file not in stores:
+                stores[s.rdg_file] = open_traces(s.rdg_file)
+            reads = _traced_reads(stores[s.rdg_file], s.file_dir, s)
+            s.traced = reads is not None
+        if reads is not None:
+            if index is None:
+                index = sorted((os.path.abspath(o.norm), o.index) for o in steps)
+            inside = [i for i in _candidates(index, reads.roots)
+                      if i != s.index and reads.contains(steps[i].norm)]
+            if reorder or all(i < s.index for i in inside):
+                s.reads.update(inside)
+                continue
+        s.barrier = True
+        s.traced = False
+
+    if reorder:
+        reason = _reorder(steps)
+        if reason is not None:
+            return [], reason
+
+    return _ordering_preds(steps), None
+
+
+def _ordering_preds(steps: list, members=None) -> list:
+    """Per-step predecessor lists for linked `steps`, over the steps in `members` (every step
+    when None; the others get no preds). A barrier waits for the nearest member barrier above it
+    and every member since; any other step for that barrier and the members it reads below it.
+    Reads from above the barrier are ordered through it — which holds only while that barrier
+    runs, so a targeted run builds its preds from its own selection, not from the whole file's."""
+    preds = [[] for _ in steps]
+    previous = None  # the nearest member barrier above
+    since = []  # the members after it
+    for s in steps:
+        if members is not None and s.index not in members:
+            continue
+        if s.barrier:
+            preds[s.index] = ([] if previous is None else [previous]) + since
+            previous, since = s.index, []
+        else:
+            own = {i for i in s.reads if (members is None or i in members)
+                   and (previous is None or i > previous)}
+            if previous is not None:
+                own.add(previous)
+            preds[s.index] = sorted(own)
+            since.append(s.index)
+    return preds
+
 
+def reorder_enabled() -> bool:
+    return os.environ.get("RDG_REORDER") == "1"
+
+
+def _reorder(steps: list):
+    """The REORDER rule: renumber `steps` in place into a topological order of their reads, or
+    return the cycle that prevents one.
+
+    Barriers split the steps into segments and stay where they are written. Inside a segment,
+    steps are released in line order among those whose reads have all been placed (Kahn's
+    algorithm on a heap of line indexes), so a notebook without forward reads keeps its order
+    exactly and a moved step moves no further than its producers force it. A read that points past
+    the segment's closing barrier cannot be satisfied without moving the barrier: that is a cycle
+    through it.
+    """
+    def named(i):
+        return f"{steps[i].label} ({steps[i].dest})"
+
+    n = len(steps)
+    order = []
+    start = 0
+    while start < n:
+        end = start
+        while end < n and not steps[end].barrier:
+            end += 1
+        # Segment [start, end); `end` is its closing barrier, or n.
+        for i in range(start, min(end + 1, n)):
+            late = [r for r in steps[i].reads if r >= end and r != i]
+            if late:
+                r = min(late)
+                if i == end:
+                    return (f"dependency cycle: {named(i)} needs later {named(r)}, but runs as a "
+                            f"barrier where it is written")
+                return (f"dependency cycle: {named(i)} needs {named(r)}, which runs after barrier "
+                        f"{named(end)}, which runs after {named(i)}")
+        waiting, succs = {}, collections.defaultdict(list)
+        for i in range(start, end):
+            inside = [r for r in steps[i].reads if r >= start]
+            waiting[i] = len(inside)
+            for r in inside:
+                succs[r].append(i)
+        ready = [i for i in range(start, end) if not waiting[i]]
+        heapq.heapify(ready)
+        while ready:
+            i = heapq.heappop(ready)
+            order.append(i)
+            for k in succs[i]:
+                waiting[k] -= 1
+                if not waiting[k]:
+                    heapq.heappush(ready, k)
+        if len(order) < end:
+            return f"dependency cycle: {_cycle_path(steps, waiting, start, named)}"
+        if end < n:
+            order.append(end)
+        start = end + 1
+
+    if order == list(range(n)):
+        return None
+    new_of = [0] * n
+    for new, old in enumerate(order):
+        new_of[old] = new
+    steps[:] = [steps[old] for old in order]
     for s in steps:
-        if s["formula"] not in KNOWN_SAFE:
-            for other in steps:
-                if other["index"] < s["index"]:
-                    edges.add((other["index"], s["index"]))
-                elif other["index"] > s["index"]:
-                    edges.add((s["index"], other["index"]))
-
-    # Kahn layering. Acyclic by construction (every edge goes forward), so this always terminates.
-    preds = {s["index"]: set() for s in steps}
-    for i, j in edges:
-        preds[j].add(i)
-    waves, placed = [], set()
-    while len(placed) < len(steps):
-        wave = [i for i in preds if i not in placed and preds[i] <= placed]
-        waves.append(sorted(wave))
-        placed.update(wave)
-
-    return steps, waves, edges, None
-
-
-def print_plan(rdg_file: str, file_dir: str = ".") -> int:
+        s.index = new_of[s.index]
+        s.reads = {new_of[r] for r in s.reads}
+    return None
+
+
+def _cycle_path(steps: list, waiting: dict, start: int, named) -> str:
+    """One cycle among the steps Kahn's algorithm could not release, as "a needs b needs ... a".
+    Every unreleased step still waits on an unreleased read in its segment, so following those
+    reads from the first one must come back around."""
+    stuck = {i for i, count in waiting.items() if count}
+    path, seen = [], {}
+    i = min(stuck)
+    while i not in seen:
+        seen[i] = len(path)
+        path.append(i)
+        i = min(r for r in steps[i].reads if r in stuck)
+    cycle = path[seen[i]:] + [i]
+    return " needs ".join(named(k) for k in cycle)
+
+
+def _candidates(index: list, roots):
+    """Indexes of the steps whose absolute destination starts with one of `roots` (all of them
+    when roots is None). `index` is [(absolute destination, step index)], sorted."""
+    if roots is None:
+        return [i for _path, i in index]
+    found = set()
+    for root in roots:
+        root = os.path.abspath(root)
+        k = bisect.bisect_left(index, (root,))
+        while k < len(index) and index[k][0].startswith(root):
+            found.add(index[k][1])
+            k += 1
+    return sorted(found)
+
+
+def _waves(preds: list) -> list:
+    """Layering for print_plan: a step's wave is one past its latest predecessor's. The executor
+    does not run wave by wave (see _execute_plan). Every edge points forward, so one pass in index
+    order sees each step's predecessors placed."""
+    level = []
+    waves = []
+    for p in preds:
+        w = 1 + max((level[i] for i in p), default=-1)
+        level.append(w)
+        if w == len(waves):
+            waves.append([])
+        waves[w].append(len(level) - 1)
+    return waves
+
+
+def select_targets(steps: list, targets: list, file_dir: str = ".") -> set:
+    """The indexes of the steps needed to build `targets`: the matching steps and their ancestors.
+
+    A target is a destination as written in the .rdg file (resolved against its directory, like
+    every destination) or a glob pattern over destinations. A target that matches no step raises
+    RdgParserError — building nothing and exiting 0 would look exactly like an up-to-date target.
+
+    Ancestry follows DATA edges (a step's `reads`), not the ordering barriers impose on the whole
+    file: a barrier is included only when a selected step actually reads its destination. Once
+    included, a barrier pulls in every step above it, because it may read anything they write.
+    """
+    selected, stack = set(), []
+    for target in targets:
+        wanted = os.path.normpath(os.path.join(file_dir, target))
+        matched = [s.index for s in steps
+                   if s.norm == wanted or fnmatch.fnmatchcase(s.dest, target)
+                   or fnmatch.fnmatchcase(os.path.normpath(s.dest), os.path.normpath(target))]
+        if not matched:
+            raise RdgParserError(f"no step writes '{target}'")
+        stack.extend(matched)
+    covered = 0  # every step below this index is already on its way in, via a barrier
+    while stack:
+        j = stack.pop()
+        if j in selected:
+            continue
+        selected.add(j)
+        stack.extend(steps[j].reads)
+        if steps[j].barrier and j > covered:
+            stack.extend(range(covered, j))
+            covered = j
+    return selected
+
+
+def _plan_selection(rdg_file: str, file_dir: str, targets):
+    """(steps, waves, preds, reason, selected) — selected is None when every step runs."""
+    steps, waves, preds, reason = plan_rdg_file(rdg_file, file_dir)
+    if reason is not None or not targets:
+        return steps, waves, preds, reason, None
+    return steps, waves, preds, reason, select_targets(steps, targets, file_dir)
+
+
+def print_plan(rdg_file: str, file_dir: str = ".", targets=None) -> int:
     """RDG_JOBS=plan — show what would run in which wave. Executes nothing, writes nothing."""
     try:
-        steps, waves, edges, reason = plan_rdg_file(rdg_file, file_dir)
+        steps, waves, preds, reason, selected = _plan_selection(rdg_file, file_dir, targets)
     except FileNotFoundError:
         print(f"Error: RDF file not found at '{rdg_file}'", file=sys.stderr)
         return 1
+    except RdgParserError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
     if reason is not None:
         print(f"serial fallback: {reason}")
         return 0
-    preds = {s["index"]: sorted(i for i, j in edges if j == s["index"]) for s in steps}
+    _print_waves(steps, waves, preds, selected)
+    return 0
+
+
+def _print_waves(steps, waves, preds, selected=None, where=None):
+    """The body of print_plan. `where(step)` prefixes each destination (workspace.py names the
+    notebook there); steps are numbered by plan index."""
     for w, wave in enumerate(waves):
+        if selected is not None:
+            wave = [i for i in wave if i in selected]
+            if not wave:
+                continue
         print(f"wave {w}:")
         for i in wave:
             s = steps[i]
-            kind = "safe" if s["formula"] in KNOWN_SAFE else "barrier"
             after = f"  after {[p + 1 for p in preds[i]]}" if preds[i] else ""
-            print(f"  step {i + 1}  {s['formula']:<16} -> {s['dest']}  [{kind}]{after}")
-    return 0
+            dest = s.dest if where is None else f"{where(s)}{s.dest}"
+            moved = f"  (written as step {s.written + 1})" if s.written != i else ""
+            print(f"  step {i + 1}  {s.formula:<16} -> {dest}  [{s.kind()}]{after}{moved}")
 
 
-def process_rdg_file_parallel(rdg_file: str, file_dir: str = ".", jobs: int = 2) -> int:
-    """Wave-scheduled execution. Falls back to the serial loop whenever the plan cannot be proven.
+def class_limits(overrides=None) -> dict:
+    """{resource class: slots} for the classes that have a limit; an absent class is bounded only
+    by RDG_JOBS.
+
+    Each class reads RDG_JOBS_<CLASS> (claude-cli -> RDG_JOBS_CLAUDE_CLI); `overrides`, from the
+    CLI's --limit CLASS=N, wins over the environment. A limit that is not a positive integer, or a
+    class the engine does not know, is an error rather than a quietly unlimited class.
+    """
+    limits = {}
+    for cls in RESOURCE_CLASSES:
+        var = "RDG_JOBS_" + cls.upper().replace("-", "_")
+        raw = os.environ.get(var, "").strip()
+        if not raw:
+            continue
+        if not raw.isdigit() or int(raw) < 1:
+            raise RdgParserError(f"{var}={raw!r} is not a positive integer")
+        limits[cls] = int(raw)
+    for cls, n in (overrides or {}).items():
+        if cls not in RESOURCE_CLASSES:
+            raise RdgParserError(
+                f"unknown resource class '{cls}' (allowed: {', '.join(RESOURCE_CLASSES)})")
+        if n < 1:
+            raise RdgParserError(f"limit for '{cls}' must be at least 1, got {n}")
+        limits[cls] = n
+    return limits
+
+
+def process_rdg_file_parallel(rdg_file: str, file_dir: str = ".", jobs: int = 2,
+                              targets=None, limits=None, use_async=False) -> int:
+    """Dependency-scheduled execution. Falls back to the serial loop whenever the plan cannot be proven.
 
     Semantics are the serial loop's, re-ordered only where the plan proves independence: the same
     _run_step body, a failed step still writes ## ERROR into its own destination, and its
     dependents still run afterward and read those bytes — exactly as they would serially.
+
+    `targets` restricts the run to the steps those destinations need (select_targets). `limits`
+    caps concurrent steps per resource class (class_limits). `use_async` drives the plan on an
+    event loop (RDG_ASYNC=1, _execute_plan_async) instead of a thread per step.
     """
     try:
-        steps, waves, edges, reason = plan_rdg_file(rdg_file, file_dir)
+        limits = class_limits(limits)
+        threads = _async_formula_threads() if use_async else None
+        steps, _, preds, reason, selected = _plan_selection(rdg_file, file_dir, targets)
     except FileNotFoundError:
         print(f"Error: RDF file not found at '{rdg_file}'", file=sys.stderr)
         return 1
+    except RdgParserError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
         return 1
     if reason is not None:
         print(f"RDG_JOBS: serial fallback — {reason}", file=sys.stderr)
-        return process_rdg_file(rdg_file, file_dir)
-
-    # For the read-fence: what each step is ALLOWED to read is its transitive predecessors'
-    # destinations (plus its own, which it just deleted). Reading any OTHER step's destination
-    # means the edge inference missed a dependency — that must be loud, never a stale read.
-    ancestors = {s["index"]: set() for s in steps}
-    for wave in waves:
-        for j in wave:
-            for i, k in edges:
-                if k == j:
-                    ancestors[j].add(i)
-                    ancestors[j] |= ancestors[i]
-    all_dests = {s["norm"]: f"step {s['index'] + 1} ({s['dest']})" for s in steps}
+        return process_rdg_file(rdg_file, file_dir, targets)
+    if use_async:
+        return asyncio.run(_execute_plan_async(steps, preds, jobs, threads, selected, limits))
+    return _execute_plan(steps, preds, jobs, selected, limits)
 
-    failures = 0
-    with ThreadPoolExecutor(max_workers=max(2, jobs)) as pool:
-        for wave in waves:
-            futures = []
-            for i in wave:
-                s = steps[i]
-                allowed = {steps[a]["norm"] for a in ancestors[i]} | {s["norm"]}
-                fence = (all_dests, allowed, f"step {i + 1} ({s['dest']})")
-                futures.append(pool.submit(_run_step, rdg_file, file_dir, s["line"], fence, (i + 1, len(steps))))
-            for fut in futures:
-                failures += fut.result()
-    return failures
\ No newline at end of file
+
+def _execute_plan(steps: list, preds: list, jobs: int, selected=None, limits=None) -> int:
+    """Run a proven plan on a ready queue. Returns the number of steps that failed.
+
+    Waves are the PLAN's presentation (print_plan), not the executor's: a wave barrier makes every
+    step of wave k+1 wait for the slowest step of wave k, even a step whose only predecessor
+    finished seconds earlier. Here a step becomes ready the moment its OWN predecessors from the
+    edge set have completed, and starts as soon as a worker is free. The scheduler holds the
+    ready queue itself rather than handing every ready step to the pool, so the order in which
+    ready steps start stays a decision made in one place (_ReadyQueue), shared with the asyncio
+    runner.
+
+    Queue wait — from "all predecessors done" to "a worker picked it up" — rides the step_start
+    event as wait_ms, and one `schedule` event closes the run with the totals, so the gain over
+    waves is measured rather than asserted.
+
+    When more steps are ready than there are workers, the one with the longest remaining chain
+    starts first (_critical_path_ranks), costed by durations measured on earlier runs
+    (history.py); line order breaks ties. Each successful step's duration is recorded back when
+    the run ends. Only the START order changes — never an artifact.
+
+    `selected`, when given, is the set of step indexes to run; it is closed under data ancestry
+    (select_targets), and predecessors outside it are ignored.
+
+    `limits` ({resource class: slots}, class_limits) bounds how many steps of one class run at
+    once, inside the global worker count. The highest-ranked ready step whose class has a free slot
+    starts; a step held back by its class keeps its place in the queue and does not block ready
+    steps of other classes behind it. A class with no entry shares only the global bound.
+
+    Each step runs against its own notebook (its rdg_file and file_dir), so one plan may span
+    several notebooks (workspace.py) under one worker budget.
+    """
+    queue = _ReadyQueue(steps, preds, max(2, jobs), selected, limits)
+    running = {}
+    with ThreadPoolExecutor(max_workers=queue.workers, thread_name_prefix="rdg-step") as pool:
+        while queue.ready or running:
+            while len(running) < queue.workers:
+                i = queue.next_ready()
+                if i is None:
+                    break
+                running[pool.submit(_run_ready_step, steps[i], queue.fence(i),
+                                    queue.progress(i), queue.ready_at[i], *queue.stores(i))] = i
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                queue.finished(running.pop(fut), *fut.result())
+    return queue.close("ready-queue")
+
+
+class _ReadyQueue:
+    """The scheduling state both RDG_JOBS executors share: which steps are ready, which one starts
+    next, and the bookkeeping each finished step feeds back. The executors own only their workers.
+    """
+
+    def __init__(self, steps, preds, workers, selected=None, limits=None):
+        if selected is not None:
+            # The file's preds order reads through barriers that this run may not include.
+            preds = _ordering_preds(steps, selected)
+        self.steps = steps
+        self.preds = preds
+        self.workers = workers
+        self.succs = [[] for _ in steps]
+        for j, p in enumerate(preds):
+            for i in p:
+                self.succs[i].append(j)
+        if selected is None:
+            selected = set(range(len(steps)))
+        self.selected = selected
+        # 1-based position among the steps that will actually run, for [i/n] progress.
+        self.ordinal = {i: k + 1 for k, i in enumerate(sorted(selected))}
+        self.total = len(selected)
+
+        # For the read-fence: what each step is ALLOWED to read is the destinations of the steps
+        # ordered with it — its transitive predecessors, which have finished, and its transitive
+        # successors, which cannot start until it has (a barrier walker reading a later step's
+        # previous-run bytes does exactly what the serial loop does) — plus its own, which it just
+        # deleted. Reading any OTHER step's destination means the edge inference missed a
+        # dependency — that must be loud, never a stale read. Ordering is answered per read
+        # (ordered), not materialized per step: ancestor sets of a long chain are O(n^2). Paths
+        # are absolute: walkers resolve against the rdg file's absolute directory, process_input
+        # against file_dir as given.
+        self.barriers = [s.index for s in steps if s.barrier and s.index in selected]
+        self.index_of = {}
+        self.all_dests = {}
+        for s in steps:
+            path = os.path.abspath(s.norm)
+            self.index_of[path] = s.index
+            self.all_dests[path] = f"{s.label} ({s.dest})"
+
+        # Per-notebook state: history, manifest and traces are each keyed by notebook on disk.
+        self.notebooks = list(dict.fromkeys(s.rdg_file for s in steps))
+        durations = {}
+        for nb in self.notebooks:
+            for (dest, formula), seconds in load_durations(nb).items():
+                durations[(nb, dest, formula)] = seconds
+        self.rank = _critical_path_ranks(steps, self.succs, durations)
+        # Counted within the selection: an unselected barrier above a selected step orders nothing
+        # that runs, and waiting for it would wait forever.
+        self.remaining = {j: sum(1 for i in preds[j] if i in selected) for j in selected}
+        self.started_run = time.monotonic()
+        self.ready_at = {}
+        self.ready = []
+        for i in sorted(i for i, n in self.remaining.items() if n == 0):
+            heapq.heappush(self.ready, (-self.rank[i], i))
+            self.ready_at[i] = self.started_run
+
+        self.limits = limits or {}
+        self.step_class = {i: resource_class(steps[i].formula) for i in selected}
+        self.in_flight = dict.fromkeys(RESOURCE_CLASSES, 0)
+        self.failures = 0
+        self.waits = []
+        self.observed = {nb: {} for nb in self.notebooks}
+        self.manifests = {nb: open_manifest(nb) for nb in self.notebooks}
+        self.traces = {nb: open_traces(nb) for nb in self.notebooks}
+
+    def next_ready(self):
+        """Take the highest-ranked ready step whose class has a free slot, or None."""
+        # Pop past steps whose class is full; they go back with their rank unchanged.
+        held = []
+        picked = None
+        while self.ready:
+            entry = heapq.heappop(self.ready)
+            cls = self.step_class[entry[1]]
+            if self.in_flight[cls] < self.limits.get(cls, self.workers):
+                picked = entry[1]
+                break
+            held.append(entry)
+        for entry in held:
+            heapq.heappush(self.ready, entry)
+        if picked is not None:
+            self.in_flight[self.step_class[picked]] += 1
+        return picked
+
+    def fence(self, i):
+        s = self.steps[i]
+        return (self.all_dests, _OrderedWith(self, i), f"{s.label} ({s.dest})")
+
+    def ordered(self, i, k) -> bool:
+        """Whether steps i and k can never run at the same time: one is an ancestor of the other.
+
+        A step outside the selection does not run, so it races nothing. A selected barrier between
+        them (inclusive) orders them outright. Otherwise walk back from the later one through
+        preds; every edge points forward, so nothing below the earlier one can lead to it and the
+        walk stays inside [lo, hi]."""
+        if i == k or i not in self.selected or k not in self.selected:
+            return True
+        lo, hi = min(i, k), max(i, k)
+        b = bisect.bisect_left(self.barriers, lo)
+        if b < len(self.barriers) and self.barriers[b] <= hi:
+            return True
+        seen = bytearray(hi - lo)
+        stack = [hi]
+        while stack:
+            for p in self.preds[stack.pop()]:
+                if p == lo:
+                    return True
+                if p > lo and not seen[p - lo]:
+                    seen[p - lo] = 1
+                    stack.append(p)
+        return False
+
+    def progress(self, i):
+        return (self.ordinal[i], self.total)
+
+    def stores(self, i):
+        """(manifest, traces) for the notebook step i belongs to; either may be None."""
+        nb = self.steps[i].rdg_file
+        return self.manifests[nb], self.traces[nb]
+
+    def finished(self, i, failed, wait_s, run_s):
+        """Account for a finished step and release the successors it was the last wait for."""
+        self.in_flight[self.step_class[i]] -= 1
+        self.failures += failed
+        self.waits.append(wait_s)
+        s = self.steps[i]
+        manifest = self.manifests[s.rdg_file]
+        if not failed and (manifest is None or s.dest not in manifest.skipped):
+            self.observed[s.rdg_file][(s.dest, s.formula)] = run_s
+        for j in self.succs[i]:
+            if j not in self.selected:
+                continue
+            self.remaining[j] -= 1
+            if self.remaining[j] == 0:
+                heapq.heappush(self.ready, (-self.rank[j], j))
+                self.ready_at[j] = time.monotonic()
+
+    def close(self, mode) -> int:
+        """Persist what the run learned, emit the closing `schedule` event, return the failures."""
+        for nb in self.notebooks:
+            record_durations(nb, self.observed[nb])
+            if self.manifests[nb] is not None:
+                self.manifests[nb].save()
+            if self.traces[nb] is not None:
+                self.traces[nb].save()
+            save_run_keys(nb, partial=any(s.rdg_file == nb and i not in self.selected
+                                          for i, s in enumerate(self.steps)))
+        emit("schedule", mode=mode, jobs=self.workers, n=self.total,
+             wall_ms=_ms(time.monotonic() - self.started_run), wait_ms=_ms(sum(self.waits)),
+             max_wait_ms=_ms(max(self.waits, default=0.0)), limits=self.limits)
+        return self.failures
+
+
+class _OrderedWith:
+    """The read-fence's `allowed` for one step (functions._check_read_fence): a destination is
+    allowed when its step is ordered with this one (_ReadyQueue.ordered)."""
+
+    __slots__ = ("queue", "i")
+
+    def __init__(self, queue, i):
+        self.queue = queue
+        self.i = i
+
+    def __contains__(self, path):
+        k = self.queue.index_of.get(path)
+        return k is not None and self.queue.ordered(self.i, k)
+
+
+def _run_ready_step(plan_step, fence, progress, ready_at, manifest=None, traces=None):
+    """Worker-side wrapper: measure how long the step sat ready and how long it ran."""
+    started = time.monotonic()
+    wait_s = started - ready_at
+    failed = _run_step(plan_step.rdg_file, plan_step.file_dir, plan_step.line, fence, progress,
+                       wait_ms=_ms(wait_s), manifest=manifest, traces=traces,
+                       syntax=plan_step.syntax)
+    return failed, wait_s, time.monotonic() - started
+
+
+# ---------------------------------------------------------------------------
+# RDG_ASYNC=1 — the same ready queue, driven by one event loop
+# ---------------------------------------------------------------------------
+#
+# Under the thread executor every in-flight model call holds an OS thread blocked in the SDK or in
+# subprocess.run, so RDG_JOBS=200 on a fan-out notebook means 200 threads and their stacks. With
+# RDG_ASYNC=1 a step is a coroutine instead: model formulas that have an async twin
+# (functions.ASYNC_TWINS — the Gemini SDK's aio client, asyncio subprocesses for the Claude CLI,
+# Ollama's AsyncClient) await their call on the loop, and every other formula — local I/O and
+# external modules alike — runs on a small bounded thread pool (RDG_ASYNC_THREADS, default
+# ASYNC_FORMULA_THREADS). RDG_JOBS keeps its meaning: the number of steps in flight.
+#
+# Step semantics are _run_step's, from the same helpers; the scheduler is the same _ReadyQueue.
+# Only what a step waits on changes.
+ASYNC_FORMULA_THREADS = 8
+
+
+def async_enabled() -> bool:
+    return os.environ.get("RDG_ASYNC") == "1"
+
+
+def _async_formula_threads() -> int:
+    raw = os.environ.get("RDG_ASYNC_THREADS", "").strip()
+    if not raw:
+        return ASYNC_FORMULA_THREADS
+    if not raw.isdigit() or int(raw) < 1:
+        raise RdgParserError(f"RDG_ASYNC_THREADS={raw!r} is not a positive integer")
+    return int(raw)
+
+
+async def _execute_plan_async(steps: list, preds: list, jobs: int,
+                              threads: int = ASYNC_FORMULA_THREADS, selected=None,
+                              limits=None) -> int:
+    """_execute_plan on an event loop. Returns the number of steps that failed.
+
+    `threads` bounds the pool that runs formulas with no async twin.
+    """
+    queue = _ReadyQueue(steps, preds, max(2, jobs), selected, limits)
+    running = {}
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="rdg-step") as pool:
+        while queue.ready or running:
+            while len(running) < queue.workers:
+                i = queue.next_ready()
+                if i is None:
+                    break
+                task = asyncio.ensure_future(_run_step_async(
+                    steps[i], queue.fence(i), queue.progress(i), queue.ready_at[i],
+                    *queue.stores(i), pool))
+                running[task] = i
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                queue.finished(running.pop(task), *task.result())
+    return queue.close("async")
+
+
+async def _run_step_async(plan_step, fence, progress, ready_at, manifest, traces, threads):
+    """_run_ready_step for the event loop: (failed, wait_s, run_s).
+
+    Each step runs in its own task, and a task runs in its own copy of the context, so the fence
+    armed here is this step's alone. A formula handed to the thread pool gets a copy of that
+    context, fence included — run_in_executor does not carry it over by itself.
+    """
+    started = time.monotonic()
+    wait_s = started - ready_at
+    rdg_file = plan_step.rdg_file
+    step = _StepRun(plan_step.line, plan_step.file_dir, progress, plan_step.syntax)
+    try:
+        failed = 0
+        if _begin_step(step, _ms(wait_s), manifest, traces):
+            with _fenced(fence), traced(step.trace), collecting_cache_keys(step.cache_keys):
+                twin = ASYNC_TWINS.get(step.formula)
+                if twin is not None:
+                    result = await twin(rdg_file, **step.kwargs)
+                else:
+                    call = functools.partial(step.formula, rdg_file, **step.kwargs)
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        threads, contextvars.copy_context().run, call)
+            _finish_step(step, result, manifest)
+            note_run_keys(rdg_file, step.cache_keys)
+    except Exception as e:
+        failed = _fail_step(step, e)
+    return failed, wait_s, time.monotonic() - started
+
+
+# Cost of a step no earlier run has measured. A model call is the expensive thing in a notebook and
+# a file gather is not; without a measurement, that ordinal fact is all the scheduler can use, and
+# it is enough to start an unmeasured chain of model calls ahead of a row of gathers.
+UNMEASURED_MODEL_SECONDS = 1.0
+UNMEASURED_LOCAL_SECONDS = 0.01
+
+
+def _critical_path_ranks(steps: list, succs: dict, durations: dict) -> dict:
+    """{index: seconds} — the step's own cost plus the costliest chain of successors below it.
+
+    A step's cost is its measured duration (keyed by notebook, destination and formula); failing
+    that, the mean measured duration of the same formula elsewhere in the plan; failing that, a coarse
+    model-versus-local default. Edges all point forward, so one pass in reverse index order sees
+    every successor before its predecessors.
+    """
+    by_formula = {}
+    for (_notebook, _dest, formula), seconds in durations.items():
+        by_formula.setdefault(formula, []).append(seconds)
+
+    def cost(s):
+        measured = durations.get((s.rdg_file, s.dest, s.formula))
+        if measured is not None:
+            return measured
+        same = by_formula.get(s.formula)
+        if same:
+            return sum(same) / len(same)
+        return UNMEASURED_MODEL_SECONDS if s.formula in MODEL_FORMULAS else UNMEASURED_LOCAL_SECONDS
+
+    rank = {}
+    for s in reversed(steps):
+        i = s.index
+        rank[i] = cost(s) + max((rank[j] for j in succs[i]), default=0.0)
+    return rank
+
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
@@ -0,0 +1,185 @@
+"""Client-side rate limits for Gemini calls, and the 429 retry around them.
+
+Without a limiter, `RDG_JOBS` workers send requests as fast as they are ready. A wide wave goes
+over the project's per-minute quota, and every request past the cliff gets a 429. A 429 used to
+count as any other failure and sent the call to the Claude fallback, which is slower and bills
+another account, for a quota that would have let the call through a few seconds later.
+
+RDG_GEMINI_RPM and RDG_GEMINI_TPM set requests and tokens per minute. Each model has one
+RateLimiter, shared by every thread and the event loop in the process, with two token buckets.
+Each bucket holds one minute's allowance and refills continuously. A call reserves one request
+and its estimated tokens, then sleeps until both buckets can pay. Reservations may run a bucket
+negative, so calls queue in the order they asked instead of racing to retry. A prompt's tokens are
+estimated before the call as one per CHARS_PER_TOKEN characters. When the response reports its
+usage, the difference, output included, is charged to the token bucket. Unset or 0 is no limit.
+
+A 429 is retried up to RDG_GEMINI_RETRIES times (default 4) before the fallback runs. The wait
+is the server's hint when it gives one (google.rpc.RetryInfo's retryDelay, or a Retry-After
+header), otherwise exponential backoff with full jitter: uniform(0, min(MAX_BACKOFF,
+RDG_GEMINI_BACKOFF * 2**attempt)). The wait pauses the model's limiter, so other threads do not
+keep hitting the same quota while this one waits, and the retry itself queues behind the pause.
+
+Every wait is published as one "throttle" event (events.py) naming the model, the seconds waited
+and the cause: "rpm", "tpm", or "429" for a retry.
+
+Errors are duck-typed (`code`, `status`, `details`, `response`), as google.genai.errors.APIError
+carries them, so this module never imports the SDK.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+
+from .events import emit
+
+CHARS_PER_TOKEN = 4  # a rough English average; the response's usage corrects it
+MAX_BACKOFF = 60.0  # seconds; the cap on one computed (not server-hinted) wait
+
+
+class TokenBucket:
+    """`per_minute` units a minute, up to one minute's worth saved. Not locked: RateLimiter is."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        """The level at `now`; below zero while earlier reservations are still being paid for."""
+        return min(self.capacity, self.level + (now - self.updated) * self.rate)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` (at most a full bucket) and return the seconds until it is paid for."""
+        self.level = self.available(now)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def charge(self, amount: float) -> None:
+        """Correct an earlier reservation by `amount`, which may be negative (a refund)."""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """The request and token buckets, and any 429 pause, for one model."""
+
+    def __init__(self, model: str, rpm: float = 0, tpm: float = 0):
+        self.model = model
+        now = time.monotonic()
+        self.requests = TokenBucket(rpm, now) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, now) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float):
+        """(seconds to wait, what they are waiting for) for one request of `tokens`."""
+        with self._lock:
+            now = time.monotonic()
+            waits = [(self._paused_until - now, "429")]
+            if self.requests is not None:
+                waits.append((self.requests.reserve(1, now), "rpm"))
+            if self.tokens is not None:
+                waits.append((self.tokens.reserve(tokens, now), "tpm"))
+        return max(waits)
+
+    def acquire(self, tokens: float) -> float:
+        """Wait until one request of `tokens` may be sent; returns the seconds waited."""
+        wait, cause = self._reserve(tokens)
+        if wait > 0:
+            _report(self.model, wait, cause)
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    async def acquire_async(self, tokens: float) -> float:
+        wait, cause = self._reserve(tokens)
+        if wait > 0:
+            _report(self.model, wait, cause)
+            await asyncio.sleep(wait)
+        return max(wait, 0.0)
+
+    def settle(self, estimated: float, used) -> None:
+        """Charge the token bucket what the call really used, once the response says so."""
+        if self.tokens is not None and used:
+            with self._lock:
+                self.tokens.charge(used - estimated)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request for this model for `seconds` (after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def throttling(self) -> bool:
+        """True while requests for this model are held: a 429 pause, or a bucket overdrawn by
+        the reservations queued on it. A hedge sent now would only queue behind them."""
+        with self._lock:
+            now = time.monotonic()
+            return self._paused_until > now or any(
+                bucket is not None and bucket.available(now) < 0
+                for bucket in (self.requests, self.tokens))
+
+
+def _report(model, waited, cause):
+    emit("throttle", backend="gemini", model=model, waited_s=round(waited, 3), cause=cause)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str, rpm: float = 0, tpm: float = 0) -> RateLimiter:
+    """The process's limiter for `model`, made on first use."""
+    with _limiters_lock:
+        limiter = _limiters.get((model, rpm, tpm))
+        if limiter is None:
+            limiter = _limiters[(model, rpm, tpm)] = RateLimiter(model, rpm, tpm)
+        return limiter
+
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + 1
+
+
+def used_tokens(response):
+    """The total tokens a generate_content response reports, or None."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
+
+def is_rate_limited(error) -> bool:
+    return (getattr(error, "code", None) == 429
+            or getattr(error, "status", None) == "RESOURCE_EXHAUSTED")
+
+
+_DURATION = re.compile(r"\s*(\d+(?:\.\d+)?)s?\s*")
+
+
+def retry_after(error):
+    """The wait, in seconds, a 429 asks for, or None when it names none."""
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in (details.get("error") or {}).get("details") or ():
+            if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("RetryInfo"):
+                match = _DURATION.fullmatch(str(detail.get("retryDelay", "")))
+                if match:
+                    return float(match.group(1))
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        match = _DURATION.fullmatch(str(headers.get("retry-after") or ""))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff(error, attempt: int, retries: int, base: float):
+    """Seconds to wait before retry `attempt` (0-based) of a call that raised `error`; None when
+    the error is not a 429 or the retries are spent."""
+    if attempt >= retries or not is_rate_limited(error):
+        return None
+    hinted = retry_after(error)
+    if hinted is not None:
+        return hinted + random.uniform(0, base)
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+
@@ -1,24 +1,60 @@
+import argparse
 import sys
 import os
-from .parser import process_rdg_file, process_rdg_file_parallel, print_plan
+from .memo import report_memos
+from .parser import async_enabled, process_rdg_file, process_rdg_file_parallel, print_plan
+from .workspace import print_workspace_plan, run_workspace
+
+
+def _limit(text):
+    """argparse type for --limit CLASS=N."""
+    cls, sep, n = text.partition("=")
+    if not sep or not n.strip().isdigit():
+        raise argparse.ArgumentTypeError(f"expected CLASS=N, got {text!r}")
+    return cls.strip(), int(n)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: rdg.py <rdg_file>", file=sys.stderr)
-        sys.exit(1)
+    arg_parser = argparse.ArgumentParser(
+        prog="rdg.py", description="Run the steps of an rdg file.")
+    arg_parser.add_argument("rdg_file", help="Path to the rdg file.")
+    arg_parser.add_argument(
+        "targets", nargs="*",
+        help="Destinations (or glob patterns over destinations) to build. Only those steps and "
+             "the steps they depend on run. Default: every step.")
+    arg_parser.add_argument(
+        "--limit", type=_limit, action="append", default=[], metavar="CLASS=N",
+        help="With RDG_JOBS, run at most N steps of one resource class at once (gemini, "
+             "claude-cli, ollama, local-io, external). Repeatable; overrides RDG_JOBS_<CLASS>.")
+    arg_parser.add_argument(
+        "--workspace", action="store_true",
+        help="Treat every positional argument as a notebook, or a directory to search for *.rdg "
+             "files, and run them all as one plan (see workspace.py). Takes no targets.")
+    args = arg_parser.parse_args()
 
-    rdg_file = sys.argv[1]
+    rdg_file = args.rdg_file
     file_dir = os.path.dirname(os.path.abspath(rdg_file))  # get folder of rdg file
 
     # RDG_JOBS opts into dependency-scheduled execution (see parser.py). Unset or 1, the serial
     # loop runs exactly as it always has. "plan" prints the derived waves and executes nothing.
     jobs_env = os.environ.get("RDG_JOBS", "").strip()
-    if jobs_env == "plan":
-        sys.exit(print_plan(rdg_file, file_dir))
     jobs = int(jobs_env) if jobs_env.isdigit() else 1
-    if jobs > 1:
-        failures = process_rdg_file_parallel(rdg_file, file_dir, jobs)
+    if args.workspace:
+        # One plan over many notebooks; RDG_JOBS is the budget they share.
+        paths = [rdg_file, *args.targets]
+        if jobs_env == "plan":
+            sys.exit(print_workspace_plan(paths))
+        failures = run_workspace(paths, jobs, dict(args.limit), use_async=async_enabled())
+    elif jobs_env == "plan":
+        sys.exit(print_plan(rdg_file, file_dir, args.targets))
+    elif jobs > 1:
+        # RDG_ASYNC=1 drives the same plan on an event loop instead of a thread per step.
+        failures = process_rdg_file_parallel(rdg_file, file_dir, jobs, args.targets,
+                                             dict(args.limit),
+                                             use_async=async_enabled())
     else:
-        failures = process_rdg_file(rdg_file, file_dir)
+        failures = process_rdg_file(rdg_file, file_dir, args.targets)
+    report_memos()
     if failures:
         print(f"Rdg file processed with {failures} failed step(s)", file=sys.stderr)
         sys.exit(1)
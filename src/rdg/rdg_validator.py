@@ -3,6 +3,12 @@
 import re
 import os
 
+from .notebook import load_notebook
+
+# Arguments that name an input file whatever their value looks like.
+INPUT_ARGUMENTS = {"file", "input", "feedback", "story", "directory", "template_file"}
+
+
 def parse_rdg_file(file_path):
     """
     Parses an .rdg file to extract output files and their dependencies.
@@ -10,51 +16,39 @@ def parse_rdg_file(file_path):
     - defined_files (set): A set of all files defined as outputs.
     - used_files (set): A set of all files used as inputs.
     - dependency_graph (dict): A dictionary mapping output files to their input dependencies.
+
+    Lines come from the same lexed Notebook the engine runs (notebook.py), so the validator reads
+    a line exactly as a run does; a line that will not lex is reported with its column.
     """
     defined_files = set()
     used_files = set()
     dependency_graph = {}
 
-    with open(file_path, 'r') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-
-            match = re.match(r'([^=]+)=(.*)', line)
-            if not match:
-                print(f"Warning: Skipping malformed line {line_num}: {line}")
-                continue
-
-            output_file = match.group(1).strip()
-            function_call = match.group(2).strip()
-
-            defined_files.add(output_file)
-            dependency_graph[output_file] = []
-
-            # Regex to find file paths in function arguments
-            # Looks for patterns like file="path/to/file.md", input="path/to/file.md", etc.
-            # It also handles cases where the file path might be the entire argument value
-            # e.g., GEMINIPROMPT(template="...", input="samples/final.md")
-            # or DIRECTORYTOMARKDOWN(directory="samples/workspace")
-            file_path_matches = re.findall(r'(?:file|input|feedback|story|directory|template_file)="([^"]+)"', function_call)
-            
-            # Also check for direct file paths as arguments without a key (less common but possible)
-            # This is a more general regex that might catch non-file strings, so we'll filter later
-            direct_arg_matches = re.findall(r'\b(\w+/\S+\.\w+)\b', function_call) # Basic check for path-like strings
-
-            all_potential_inputs = set(file_path_matches)
-            
-            # Add direct_arg_matches, but filter out common non-file words if necessary
-            for arg in direct_arg_matches:
+    for line in load_notebook(file_path).rules():
+        if line.error is not None:
+            print(f"Warning: Skipping malformed line {line.number}: {line.error}")
+            continue
+
+        output_file = line.syntax.dest
+        defined_files.add(output_file)
+        dependency_graph[output_file] = []
+
+        all_potential_inputs = set()
+        for argument in line.syntax.arguments:
+            # Arguments like file="path/to/file.md" or directory="samples/workspace" name inputs.
+            if argument.name in INPUT_ARGUMENTS and argument.value:
+                all_potential_inputs.add(argument.value)
+            # Any other value may still carry a path-like string (a bare path argument, a path
+            # quoted in a template). This basic check might catch non-file strings, so filter.
+            for arg in re.findall(r'\b(\w+/\S+\.\w+)\b', argument.value):
                 # Simple heuristic: if it looks like a path (contains / or .) and not a common keyword
                 if '/' in arg or '.' in arg and not re.match(r'^(true|false|null|undefined)$', arg, re.IGNORECASE):
                     all_potential_inputs.add(arg)
 
-            for input_file in all_potential_inputs:
-                used_files.add(input_file)
-                dependency_graph[output_file].append(input_file)
-    
+        for input_file in all_potential_inputs:
+            used_files.add(input_file)
+            dependency_graph[output_file].append(input_file)
+
     return defined_files, used_files, dependency_graph
 
 def validate_rdg_file(rdg_file_path):
@@ -0,0 +1,188 @@
+"""A remote tier for the response cache, and the small reference server it talks to.
+
+Every developer and CI runner has its own CACHE_DIR, so the same prompt is paid for once per
+machine. RDG_CACHE_REMOTE names a shared HTTP cache, modelled on Bazel's HTTP remote cache: an
+entry is read with GET and written with PUT at `<url>/<key>`, where the key is the same md5 the
+local cache uses. The body is a JSON cache entry, {"request": ..., "response": ...}. Any server
+that stores PUT bodies and serves them back on GET will do: nginx with WebDAV, a bucket behind a
+signing proxy, or `python -m src.rdg.cache serve`, which runs make_server below.
+
+The local cache stays in front (gemini.load_from_cache). A local miss asks the remote, and a
+remote hit is written to the local cache, so the next run here does not ask again. A miss in both
+goes to the provider, and its answer is saved locally, then PUT (unless RDG_CACHE_REMOTE_UPLOAD=0,
+for read-only clients). Engine-error sentinels are never uploaded, so one machine's outage is not
+everyone's cached answer. With RDG_CACHE_PROMPTS=hash the prompt is not uploaded either.
+
+The remote is only ever an optimisation. A timeout, a refused connection, a 5xx or a garbled
+body logs one warning and turns the remote off for RETRY_AFTER seconds: the step goes on with the
+local cache only, and never fails because the remote did.
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from .claude import ENGINE_ERROR_SENTINEL
+
+RETRY_AFTER = 60.0  # seconds the remote is left alone after a failure
+MAX_ENTRY_BYTES = 256 << 20  # the reference server refuses larger PUTs
+
+_KEY = re.compile(r"[0-9a-f]{32}")
+
+
+class RemoteCache:
+    """Client for one remote cache URL. Thread-safe; every failure is a miss, never a raise."""
+
+    def __init__(self, url: str, timeout: float = 5.0, token=None, upload: bool = True):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+        self.upload = upload
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+
+    def get(self, key: str):
+        """(request, response) stored remotely for `key`, or None."""
+        reply = self._request("GET", key)
+        if reply is None or reply[0] != 200:
+            return None
+        try:
+            entry = json.loads(reply[1])
+            return entry.get("request"), entry["response"]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._failed(f"unreadable entry for {key}: {e}")
+            return None
+
+    def put(self, key: str, request, response: str) -> bool:
+        """Upload one answer; True if the server stored it."""
+        if not self.upload or not response or response.startswith(ENGINE_ERROR_SENTINEL):
+            return False
+        body = json.dumps({"request": request, "response": response}).encode()
+        reply = self._request("PUT", key, body)
+        return reply is not None and 200 <= reply[0] < 300
+
+    def _request(self, method: str, key: str, body=None):
+        """(status, body), (404, b"") for an absent entry, or None when the remote is unusable."""
+        if time.monotonic() < self._down_until:
+            return None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(f"{self.url}/{key}", data=body, method=method,
+                                         headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as reply:
+                return reply.status, reply.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return 404, b""
+            self._failed(f"{method} {key}: HTTP {e.code}")
+        except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+            self._failed(f"{method} {key}: {e}")
+        return None
+
+    def _failed(self, reason: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            first = now >= self._down_until
+            self._down_until = now + RETRY_AFTER
+        if first:
+            logging.warning(f"Remote cache {self.url} failed ({reason}); using the local cache "
+                            f"only for {RETRY_AFTER:.0f}s")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """GET/HEAD/PUT of one entry file per key, under the server's root."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _path(self):
+        key = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if not _KEY.fullmatch(key):
+            self._reply(400, b"not a cache key\n")
+            return None
+        return os.path.join(self.server.root, key[:2], key)
+
+    def _reply(self, status: int, body: bytes = b"", head_only: bool = False) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/json" if status == 200 else "text/plain")
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def do_GET(self, head_only=False):
+        path = self._path()
+        if path is None:
+            return
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._reply(404, b"", head_only)
+            return
+        self._reply(200, body, head_only)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_PUT(self):
+        path = self._path()
+        if path is None:
+            return
+        length = int(self.headers.get("Content-Length") or -1)
+        if not 0 <= length <= MAX_ENTRY_BYTES:
+            self.close_connection = True
+            self._reply(413 if length > MAX_ENTRY_BYTES else 411)
+            return
+        body = self.rfile.read(length)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)  # a concurrent GET sees the old entry or the new one, whole
+        self._reply(201)
+
+    def log_message(self, format, *args):
+        logging.debug(f"remote cache {self.address_string()}: {format % args}")
+
+
+def make_server(root: str, host: str = "127.0.0.1", port: int = 0):
+    """A ThreadingHTTPServer storing entries under `root`; port 0 picks a free one. Call
+    serve_forever() on it (or run it in a thread, as the tests do)."""
+    os.makedirs(root, exist_ok=True)
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    server.root = root
+    return server
+
+
+def add_serve_command(commands) -> None:
+    """`cache serve`: the reference server, for trying a remote tier and for tests."""
+    serve = commands.add_parser(
+        "serve", help="Run a reference remote cache server (GET/PUT <url>/<key>).")
+    serve.add_argument("--root", required=True,
+                       help="Directory the server keeps its entries in.")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="Address to listen on. Default: 127.0.0.1.")
+    serve.add_argument("--port", type=int, default=8090, help="Default: 8090.")
+
+
+def serve(args: argparse.Namespace) -> int:
+    server = make_server(args.root, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving a remote cache from {args.root} at http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -79,6 +79,8 @@ import time
 from dataclasses import dataclass
 from typing import Optional
 
+from . import claude_pool
+
 
 # Config — read env vars directly (instead of `from .config import ...`) so
 # this module does NOT pull `python-dotenv` into the import graph. The switch
@@ -88,6 +90,10 @@ from typing import Optional
 # claude.py uses no third-party imports.
 CLAUDE_CLI_PATH = os.environ.get("CLAUDE_CLI_PATH", "claude")
 CLAUDE_CLI_TIMEOUT_SECONDS = int(os.environ.get("CLAUDE_CLI_TIMEOUT_SECONDS", "600"))
+# Warm workers (claude_pool.py, stdlib only). The switch prompt is short, so the CLI's startup is
+# most of a cold call; with a pool the call is a pipe write to a worker already running.
+CLAUDE_CLI_POOL = int(os.environ.get("RDG_CLAUDE_POOL", "0"))
+CLAUDE_CLI_POOL_RECYCLE = int(os.environ.get("RDG_CLAUDE_POOL_RECYCLE", "1"))
 
 
 # Self-contained CLI resolver. We deliberately do NOT `from . import claude as
@@ -370,14 +376,19 @@ def _invoke_claude_switch(
         # it; raising effort would buy nothing and cost latency on a call whose
         # whole contract is "cheap" (see the timeout message below). Leave it
         # inheriting the CLI default — this omission is a decision, not a gap.
-        result = subprocess.run(
-            [cli, "--print", "--model", model],
-            input=prompt,
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds,
-            check=False,
-        )
+        argv = [cli, "--print", "--model", model]
+        if CLAUDE_CLI_POOL > 0:
+            pool = claude_pool.pool_for(CLAUDE_CLI_POOL, CLAUDE_CLI_POOL_RECYCLE)
+            result = pool.run(argv, prompt, timeout_seconds)
+        else:
+            result = subprocess.run(
+                argv,
+                input=prompt,
+                capture_output=True,
+                text=True,
+                timeout=timeout_seconds,
+                check=False,
+            )
     except subprocess.TimeoutExpired as exc:
         raise SwitchUnavailableError(
             f"Claude CLI timed out after {timeout_seconds}s on switch call. "
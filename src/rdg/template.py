@@ -24,6 +24,37 @@ def render_template(template_str, input_data):
     else:
         return _render_legacy(template_str, input_data)
 
+def template_pieces(template_str, names):
+    """What render_template joins for input_data with the keys `names`, without joining it.
+
+    A list of ("text", literal) and ("input", name) pieces, in order, so a caller can hash the
+    rendering while the inputs are still on disk (functions.PendingPrompt). None when
+    render_template would raise instead — a placeholder with no input, an invalid $ — so the
+    caller renders after all and reports exactly what render_template reports.
+    """
+    pieces, at = [], 0
+    if _MUSTACHE_RE.search(template_str):
+        for match in _MUSTACHE_RE.finditer(template_str):
+            if match.group(1) not in names:
+                return None
+            pieces += [("text", template_str[at:match.start()]), ("input", match.group(1))]
+            at = match.end()
+    else:
+        for match in Template.pattern.finditer(template_str):
+            named = match.group("named") or match.group("braced")
+            if named is not None:
+                if named not in names:
+                    return None
+                piece = ("input", named)
+            elif match.group("escaped") is not None:
+                piece = ("text", Template.delimiter)
+            else:
+                return None
+            pieces += [("text", template_str[at:match.start()]), piece]
+            at = match.end()
+    pieces.append(("text", template_str[at:]))
+    return [piece for piece in pieces if piece != ("text", "")]
+
 def _render_mustache(template_str, input_data):
     """Render using {{variable}} placeholders."""
     def replacer(match):
@@ -0,0 +1,234 @@
+"""RDG_TRACE_READS — learn what a barrier step actually reads, so it can stop being a barrier.
+
+The planner (parser.plan_rdg_file) can only order a step whose reads it can see: KNOWN_SAFE
+formulas name every path they read in their arguments, and the walkers' arguments bound theirs
+(parser.WALKER_READ_SETS). Everything else — above all the RDG_FORMULA_PATH formulas, which are
+often a notebook's slowest steps — runs alone, because its reads are unknowable from the line.
+
+They are knowable from a RUN. With RDG_TRACE_READS=1, each such step executes under an audit hook
+(sys.addaudithook, installed once) that records every file it opens and every directory it lists,
+scoped to the step by a ContextVar the same way the read-fence is. A successful step's trace is
+stored against its FINGERPRINT: the parsed line plus a hash of the source file that defines the
+formula. A later planning pass with RDG_TRACE_READS=1 treats a step with a current trace like a
+walker with a known read set: edges from every earlier step whose destination it read or whose
+destination lies under a directory it listed, and barrier status kept when it touched a LATER
+step's destination or wrote anything in the notebook's tree besides its own destination.
+
+A trace is evidence from one run, not proof for the next: a formula may read a path this time that
+it skipped last time. Two things keep that honest. A changed line or a changed formula module makes
+the trace stale, and a stale or missing trace means barrier, exactly as before. And while a traced
+step runs, the same hook checks every open against the read-fence, so a read the trace did not
+predict fails the step loudly instead of racing its producer.
+
+The hook sees only what the step's own thread does. A step that starts a process, or a thread that
+does not inherit its context, can read files the trace never hears of, so such a step's trace is
+stored as UNTRUSTED and the step stays a barrier. Processes are caught by their audit events
+(UNTRUSTED_EVENTS). Thread starts raise no audit event, so threading.setprofile is installed
+beside the hook: a new thread reports its start once and then uninstalls itself. The thread cannot
+tell which step started it, so a start marks every step traced at that moment. The engine's own
+threads (named "rdg-...") are exempt: they run a step's work under its context, which the hook
+does see, or read nothing but pipes.
+
+One JSON file per notebook under CACHE_DIR/traces, named like the duration history (history.py)
+by the md5 of the notebook's absolute path.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+
+from . import config
+from .functions import _check_read_fence
+
+# Bump when the fingerprint recipe or the file layout changes: every step is then traced afresh.
+TRACE_VERSION = 1
+
+_ACTIVE = contextvars.ContextVar("rdg_read_trace", default=None)
+_hook_lock = threading.Lock()
+_hook_installed = False
+
+# Audit events by which a step escapes the hook: the child process's reads are never seen.
+UNTRUSTED_EVENTS = ("subprocess.Popen", "os.system", "os.exec", "os.posix_spawn", "os.spawn",
+                    "os.fork", "os.forkpty", "os.startfile")
+ENGINE_THREAD_PREFIX = "rdg-"
+
+# Every ReadTrace of a step running now, for the thread-start check (which has no context).
+_running = set()
+_running_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return os.environ.get("RDG_TRACE_READS") == "1"
+
+
+def traces_path(rdg_file: str) -> str:
+    digest = hashlib.md5(os.path.abspath(rdg_file).encode()).hexdigest()
+    return os.path.join(config.CACHE_DIR, "traces", f"{digest}.json")
+
+
+def _code_identity(formula) -> str:
+    """sha256 of the file defining `formula`, else of its bytecode. Editing the module stales
+    every trace taken through it, which is the point: the reads came from that code."""
+    try:
+        path = inspect.getsourcefile(formula)
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (TypeError, OSError):
+        code = getattr(formula, "__code__", None)
+        return hashlib.sha256(code.co_code if code is not None else repr(formula).encode()).hexdigest()
+
+
+def step_fingerprint(dest: str, formula_name: str, formula, kwargs: dict) -> str:
+    """The identity a trace is valid for: the parsed step (standard parameters included) and the
+    code that ran it. The planner and the runners compute it from the same parsed arguments."""
+    line = json.dumps([dest, formula_name, sorted(kwargs.items())], sort_keys=True)
+    return hashlib.sha256(f"{line}\0{_code_identity(formula)}".encode()).hexdigest()
+
+
+class ReadTrace:
+    """What one step touched while its formula ran. Appended to by the audit hook."""
+
+    def __init__(self):
+        self.reads = set()
+        self.listed = set()
+        self.writes = set()
+        self.untrusted = None  # why the trace cannot be relied on, once it cannot
+
+
+def _audit(event, args):
+    trace = _ACTIVE.get()
+    if trace is None:
+        return
+    if event in UNTRUSTED_EVENTS:
+        trace.untrusted = trace.untrusted or f"started a process ({event})"
+    elif event == "open":
+        path, _mode, flags = args
+        if isinstance(path, int):
+            return
+        path = os.path.abspath(os.fsdecode(path))
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            if "__pycache__" not in path:  # an import compiling a module is not the step's output
+                trace.writes.add(path)
+        else:
+            _check_read_fence(path, path)
+            trace.reads.add(path)
+    elif event in ("os.listdir", "os.scandir"):
+        path = args[0] if args and args[0] is not None else "."
+        if isinstance(path, int):
+            return
+        trace.listed.add(os.path.abspath(os.fsdecode(path)))
+
+
+def _thread_started(previous):
+    """The profile function every new thread starts with: on its first event it marks the steps
+    running now untrusted, then hands the thread back to `previous` (any earlier profiler)."""
+    def started(frame, event, arg):
+        sys.setprofile(previous)
+        name = threading.current_thread().name
+        if name.startswith(ENGINE_THREAD_PREFIX):
+            return
+        with _running_lock:
+            for trace in _running:
+                trace.untrusted = trace.untrusted or f"started a thread ({name})"
+    return started
+
+
+def _install_hook():
+    global _hook_installed
+    with _hook_lock:
+        if not _hook_installed:
+            # Audit hooks cannot be removed. Outside a traced step this is one ContextVar lookup,
+            # and the profile function costs each new thread one call.
+            sys.addaudithook(_audit)
+            threading.setprofile(_thread_started(threading.getprofile()))
+            _hook_installed = True
+
+
+@contextlib.contextmanager
+def traced(trace):
+    """Record into `trace` for the duration of the block; a no-op when `trace` is None."""
+    if trace is None:
+        yield
+        return
+    _install_hook()
+    token = _ACTIVE.set(trace)
+    with _running_lock:
+        _running.add(trace)
+    try:
+        yield
+    finally:
+        with _running_lock:
+            _running.discard(trace)
+        _ACTIVE.reset(token)
+
+
+def open_traces(rdg_file: str):
+    """The notebook's TraceStore when RDG_TRACE_READS=1, else None (and nothing is read)."""
+    if not tracing_enabled():
+        return None
+    return TraceStore(rdg_file)
+
+
+class TraceStore:
+    """Recorded reads for one notebook, by destination, each with the fingerprint it is valid for.
+    Thread-safe for record()."""
+
+    def __init__(self, rdg_file: str):
+        self.path = traces_path(rdg_file)
+        self.rdg_file = os.path.abspath(rdg_file)
+        self._lock = threading.Lock()
+        self._steps = {}
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == TRACE_VERSION:
+                self._steps = data.get("steps", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable read traces '{self.path}': {e}")
+
+    def current(self, dest: str, fingerprint: str):
+        """(reads, listed, writes) as sets of absolute paths, or None when no trace matches or the
+        one that does is untrusted."""
+        entry = self._steps.get(dest)
+        if not entry or entry.get("fingerprint") != fingerprint or entry.get("untrusted"):
+            return None
+        return set(entry["reads"]), set(entry["listed"]), set(entry["writes"])
+
+    def record(self, dest: str, fingerprint: str, trace: ReadTrace) -> None:
+        with self._lock:
+            self._steps[dest] = {
+                "fingerprint": fingerprint,
+                "reads": sorted(trace.reads),
+                "listed": sorted(trace.listed),
+                "writes": sorted(trace.writes),
+            }
+            if trace.untrusted:
+                self._steps[dest]["untrusted"] = trace.untrusted
+
+    def forget(self, dest: str) -> None:
+        """Drop a step's trace: it failed, so what it read proves nothing, and the fence may have
+        caught a read the trace missed. Its next planning pass makes it a barrier again."""
+        with self._lock:
+            self._steps.pop(dest, None)
+
+    def save(self) -> None:
+        """Persist atomically. Never raises: a lost trace costs one more barrier run."""
+        with self._lock:
+            payload = {"version": TRACE_VERSION, "rdg_file": self.rdg_file,
+                       "steps": dict(sorted(self._steps.items()))}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save read traces '{self.path}': {e}")
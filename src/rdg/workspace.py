@@ -0,0 +1,171 @@
+"""Workspace runs — many notebooks, one plan, one worker budget, one process.
+
+Running notebooks one `rdg_cli` process at a time pays interpreter and SDK import cost per
+notebook, builds a thread pool per notebook, and throws away the in-memory memo between them. A
+workspace run takes every notebook at once (files, or directories searched for *.rdg) and plans
+them as ONE graph:
+
+  - every notebook is parsed exactly as plan_rdg_file parses it, each resolving its arguments
+    against its own directory;
+  - a notebook that names another notebook's destination depends on it, and the notebooks are
+    ordered producers-first (discovery order breaks ties). That order is what "run them one after
+    another" means here, and the plan is a reordering of it: a step-level edge where one step
+    names another notebook's destination, the walker and barrier rules across the whole
+    workspace, the read-fence over every notebook's destinations;
+  - anything unprovable — a notebook that will not plan on its own, a destination two notebooks
+    both write, notebooks that feed each other in a cycle — runs the notebooks one by one in that
+    order, with the reason on stderr.
+
+Execution is parser._execute_plan on the combined steps, so RDG_JOBS (and per-class --limit, and
+RDG_ASYNC) is one budget shared by every notebook, and identical prompts asked from different
+notebooks share one call (functions._single_flight, gemini.memoized_gemini_call_async).
+Unset or 1, RDG_JOBS runs the notebooks serially in that order.
+"""
+
+import asyncio
+import os
+import sys
+
+from . import config
+from .functions import RdgParserError
+from .parser import (
+    _async_formula_threads,
+    _execute_plan,
+    _execute_plan_async,
+    _link_steps,
+    _parse_steps,
+    _print_waves,
+    _waves,
+    class_limits,
+    process_rdg_file,
+)
+
+
+def discover(paths) -> list:
+    """Absolute paths of the notebooks `paths` name: files as given, directories searched
+    recursively for *.rdg (hidden `.default.rdg` included). Hidden directories and the cache
+    directory are not searched. Sorted per directory, duplicates dropped, order otherwise kept."""
+    found = []
+    cache = os.path.abspath(config.CACHE_DIR)
+    for path in paths:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(path)
+            found.append(path)
+            continue
+        here = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [d for d in dirs
+                       if not d.startswith(".") and os.path.join(root, d) != cache]
+            here.extend(os.path.join(root, n) for n in names if n.endswith(".rdg"))
+        found.extend(sorted(here))
+    return list(dict.fromkeys(found))
+
+
+def _notebook_names(notebooks: list) -> dict:
+    """{notebook: name relative to the notebooks' common directory}, for labels and plans."""
+    if not notebooks:
+        return {}
+    root = os.path.commonpath([os.path.dirname(nb) for nb in notebooks])
+    return {nb: os.path.relpath(nb, root) for nb in notebooks}
+
+
+def plan_workspace(notebooks: list):
+    """(steps, waves, preds, reason, order) for notebooks as discover() returns them.
+
+    `order` is the notebooks producers-first — the serial order, used as-is when `reason` says
+    the combined plan cannot be proven. steps/waves/preds are plan_rdg_file's, indexed across the
+    whole workspace in that order; each step's label names its notebook.
+    """
+    names = _notebook_names(notebooks)
+    parsed = {}
+    for nb in notebooks:
+        steps, reason = _parse_steps(nb, os.path.dirname(nb))
+        if reason is not None:
+            return [], [], [], f"{names[nb]}: {reason}", list(notebooks)
+        parsed[nb] = steps
+
+    # Notebook-level dependencies: the same join the step edges use, across notebooks.
+    writer = {}
+    for nb, steps in parsed.items():
+        for s in steps:
+            writer.setdefault(s.norm, nb)
+    needs = {nb: set() for nb in notebooks}
+    for nb, steps in parsed.items():
+        for s in steps:
+            for value in s.args.values():
+                for piece in str(value).split(","):
+                    piece = piece.strip()
+                    producer = writer.get(os.path.normpath(os.path.join(s.file_dir, piece)))
+                    if piece and producer is not None and producer != nb:
+                        needs[nb].add(producer)
+
+    order = []
+    while len(order) < len(notebooks):
+        ready = [nb for nb in notebooks if nb not in order and needs[nb] <= set(order)]
+        if not ready:
+            cycle = ", ".join(names[nb] for nb in notebooks if nb not in order)
+            return [], [], [], f"notebooks feed each other in a cycle ({cycle})", list(notebooks)
+        order.append(ready[0])
+
+    steps = []
+    for nb in order:
+        for s in parsed[nb]:
+            s.label = f"{names[nb]} {s.label}"
+            s.index = s.written = len(steps)
+            steps.append(s)
+    preds, reason = _link_steps(steps)
+    if reason is not None:
+        return steps, [], [], reason, order
+    return steps, _waves(preds), preds, None, order
+
+
+def print_workspace_plan(paths) -> int:
+    """RDG_JOBS=plan for a workspace. Executes nothing, writes nothing."""
+    try:
+        notebooks = discover(paths)
+        steps, waves, preds, reason, order = plan_workspace(notebooks)
+    except FileNotFoundError as e:
+        print(f"Error: RDF file not found at '{e}'", file=sys.stderr)
+        return 1
+    except RdgParserError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    names = _notebook_names(notebooks)
+    print("notebooks:")
+    for nb in order:
+        print(f"  {names[nb]}")
+    if reason is not None:
+        print(f"serial fallback: {reason}")
+        return 0
+    _print_waves(steps, waves, preds, where=lambda s: f"{names[s.rdg_file]}: ")
+    return 0
+
+
+def run_workspace(paths, jobs: int = 1, limits=None, use_async=False) -> int:
+    """Run every notebook under `paths` as one plan. Returns the number of steps that failed."""
+    try:
+        notebooks = discover(paths)
+        limits = class_limits(limits)
+        threads = _async_formula_threads() if use_async else None
+        steps, _, preds, reason, order = plan_workspace(notebooks)
+    except FileNotFoundError as e:
+        print(f"Error: RDF file not found at '{e}'", file=sys.stderr)
+        return 1
+    except RdgParserError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        return 1
+    if not notebooks:
+        print("Error: no .rdg files found", file=sys.stderr)
+        return 1
+    if reason is not None or jobs <= 1:
+        if reason is not None:
+            print(f"RDG workspace: serial fallback — {reason}", file=sys.stderr)
+        return sum(process_rdg_file(nb, os.path.dirname(nb)) for nb in order)
+    if use_async:
+        return asyncio.run(_execute_plan_async(steps, preds, jobs, threads, None, limits))
+    return _execute_plan(steps, preds, jobs, None, limits)
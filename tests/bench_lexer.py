@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Line-parse benchmark — parse_rdg_line against the regex split it replaced, on long templates.
+
+Not a test: it prints timings. The generated corpus has the shape of our generated notebooks: each
+line a model prompt whose inline template is a few kilobytes of prose (commas, quoted phrases,
+escaped quotes), plus an input path or two. The lexer should cost the same per kilobyte at every
+template size; the old split's per-kilobyte cost grows with the template.
+
+Run:
+  python tests/bench_lexer.py              # templates of 1, 4 and 16 KB, 200 lines each (64 KB takes minutes)
+  python tests/bench_lexer.py 8 32         # chosen template sizes, in KB
+"""
+
+import os
+import re
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINES = 200
+
+_OLD_SPLIT = re.compile(r',\s*(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)')
+
+
+def old_parse(line: str):
+    """The regex parse this benchmark compares against, minus the formula lookup."""
+    match = re.match(r"([^=]+)=([^()]+)\((.*)\)", line.strip())
+    arguments = {}
+    for pair in _OLD_SPLIT.split(match.group(3)):
+        pair = pair.strip()
+        if pair:
+            name, value = re.match(r"([^=]+)=(.*)", pair).groups()
+            value = value.strip()
+            if value[:1] == value[-1:] and value[:1] in "\"'":
+                value = value[1:-1].replace('\\"', '"').replace("\\'", "'")
+            arguments[name.strip()] = value
+    return match.group(1).strip(), match.group(2).strip(), arguments
+
+
+def corpus(kb: int) -> list:
+    sentence = r'Summarize the section, keeping \"quoted terms\" as written, and cite it. '
+    template = sentence * (kb * 1024 // len(sentence) + 1)
+    return [f'out/s/d{n}.md=GEMINIPROMPT(template="{template}{{{{x}}}}", x=out/g/d{n}.md, '
+            f'effort="low")\n' for n in range(LINES)]
+
+
+def main(sizes) -> None:
+    sys.path.insert(0, REPO)
+    from src.rdg import parser
+
+    print(f"{'template':>9} {'lexer s':>9} {'regex s':>9} {'lexer MB/s':>11} {'regex MB/s':>11}")
+    for kb in sizes:
+        lines = corpus(kb)
+        megabytes = sum(len(line) for line in lines) / 1e6
+        started = time.perf_counter()
+        new = [parser.parse_rdg_line(line) for line in lines]
+        lexed = time.perf_counter()
+        old = [old_parse(line) for line in lines]
+        split = time.perf_counter()
+        assert new == old, "the lexer and the regex split disagree on the corpus"
+        print(f"{kb:>7}KB {lexed - started:>9.3f} {split - lexed:>9.3f} "
+              f"{megabytes / (lexed - started):>11.1f} {megabytes / (split - lexed):>11.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1, 4, 16])
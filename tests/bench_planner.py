@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Planner benchmark — plan_rdg_file and ready-queue setup on generated 10k–100k step notebooks.
+
+Not a test: it prints timings. Planning should scale linearly, so the per-step column should stay
+roughly flat as the step count grows.
+
+The generated notebook has the shape of a documentation build driven by a manifest: per document
+a gather and a summary that reads it, a periodic directory walker over the sources, one opaque
+(barrier) step every 1000 documents, and a closing glob over every summary.
+
+Run:
+  python tests/bench_planner.py            # 10k, 25k, 50k, 100k steps
+  python tests/bench_planner.py 20000      # chosen sizes
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate(path: str, steps: int) -> None:
+    lines = []
+    doc = 0
+    while len(lines) < steps - 1:
+        lines.append(f'out/gather/d{doc}.md=FILESTOMARKDOWN(files="docs/d{doc}.md")\n')
+        lines.append(f'out/summary/d{doc}.md=CREATEFILE(content="{{{{x}}}}", x=out/gather/d{doc}.md)\n')
+        if doc % 100 == 99:
+            lines.append(f'out/listing/{doc}.md=LISTPATHS(paths="docs")\n')
+        if doc % 1000 == 999:
+            lines.append(f'out/opaque/{doc}.md=BENCHOPAQUE()\n')
+        doc += 1
+    lines = lines[:steps - 1]
+    lines.append('out/all.md=GLOBTOMARKDOWN(pattern="out/summary/*.md")\n')
+    with open(path, "w") as handle:
+        handle.writelines(lines)
+
+
+def main(sizes) -> None:
+    sys.path.insert(0, REPO)
+    from src.rdg import parser
+    # An external-style formula: not KNOWN_SAFE, not a walker — a barrier.
+    parser.FUNCTION_REGISTRY["BENCHOPAQUE"] = lambda rdg_file, **kwargs: ""
+
+    tmp = tempfile.mkdtemp()
+    print(f"{'steps':>8} {'plan s':>8} {'queue s':>8} {'us/step':>8} {'pred entries':>13}")
+    for n in sizes:
+        rdg = os.path.join(tmp, f"bench_{n}.rdg")
+        generate(rdg, n)
+        started = time.perf_counter()
+        steps, _waves, preds, reason = parser.plan_rdg_file(rdg, tmp)
+        planned = time.perf_counter()
+        assert reason is None, reason
+        parser._ReadyQueue(steps, preds, 8)
+        queued = time.perf_counter()
+        per_step = (queued - started) / n * 1e6
+        print(f"{n:>8} {planned - started:>8.2f} {queued - planned:>8.2f} {per_step:>8.1f} "
+              f"{sum(len(p) for p in preds):>13}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 25_000, 50_000, 100_000])
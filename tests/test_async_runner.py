@@ -0,0 +1,175 @@
+"""RDG_ASYNC=1 — the RDG_JOBS plan driven by one event loop instead of a thread per step.
+
+Contract under test:
+  - artifacts are the serial loop's, byte for byte; a failed step still writes ## ERROR and its
+    dependents still run.
+  - model steps are coroutines: many in flight at once cost no thread each.
+  - formulas with no async twin run on the bounded pool, with the read-fence still armed.
+  - the Claude CLI runs as an asyncio subprocess under the same return contract: stdout on
+    success, the RDG-ENGINE-ERROR sentinel on a non-zero exit or a timeout.
+  - end to end under RDG_PRIMARY=claude, concurrent CLI calls overlap.
+
+Hermetic: fake backends and a fake `claude` script only — no network, no real model call.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _fake_claude(directory, body):
+    stub = os.path.join(directory, "fake_claude.sh")
+    with open(stub, "w") as handle:
+        handle.write("#!/bin/sh\n" + body)
+    os.chmod(stub, 0o755)
+    return stub
+
+
+class AsyncRunner(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini, parser
+        self.parser = parser
+        self.functions = functions
+        cache = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", cache),
+            mock.patch.object(gemini, "CACHE_DIR", cache),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _rdg(self, body):
+        tmp = tempfile.mkdtemp()
+        rdg = os.path.join(tmp, "t.rdg")
+        with open(rdg, "w") as handle:
+            handle.write(body)
+        return rdg, tmp
+
+    def _read(self, tmp, name):
+        with open(os.path.join(tmp, name)) as handle:
+            return handle.read()
+
+    def test_artifacts_match_the_serial_loop(self):
+        body = (
+            'a.md=CREATEFILE(content="hi")\n'
+            'b.md=UPPERCASE(file=a.md)\n'
+            'bad.md=CREATEFILE(content="{{nope}}")\n'
+            'c.md=CREATEFILE(content="{{x}} / {{y}}", x=b.md, y=bad.md)\n'
+        )
+        rdg, serial = self._rdg(body)
+        self.assertEqual(self.parser.process_rdg_file(rdg, serial), 1)
+        rdg, concurrent = self._rdg(body)
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, concurrent, 4, use_async=True), 1)
+        for name in ("a.md", "b.md", "bad.md", "c.md"):
+            self.assertEqual(self._read(serial, name), self._read(concurrent, name), name)
+        self.assertIn("## ERROR", self._read(concurrent, "bad.md"))
+
+    def test_model_steps_are_coroutines_not_threads(self):
+        live = {"now": 0, "peak": 0, "threads": 0}
+
+        async def fake_call(rendered_template, model=None, effort=None):
+            live["now"] += 1
+            live["peak"] = max(live["peak"], live["now"])
+            live["threads"] = max(live["threads"], threading.active_count())
+            await asyncio.sleep(0.3)
+            live["now"] -= 1
+            return rendered_template.upper()
+
+        rdg, tmp = self._rdg(''.join(f'out/{n}.md=GEMINIPROMPT(template="step {n}")\n'
+                                     for n in range(40)))
+        baseline = threading.active_count()
+        started = time.monotonic()
+        with mock.patch.object(self.functions, "memoized_gemini_call_async", fake_call):
+            self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 40, use_async=True), 0)
+        self.assertLess(time.monotonic() - started, 3.0, "40 x 0.3s calls did not overlap")
+        self.assertEqual(live["peak"], 40)
+        self.assertEqual(live["threads"], baseline, "a model step took a thread")
+        self.assertEqual(self._read(tmp, "out/7.md"), "STEP 7")
+
+    def test_sync_formula_runs_on_the_pool_with_the_fence_armed(self):
+        from src.rdg.functions import _READ_FENCE
+
+        def fenced(rdg_file, **kwargs):
+            return f"{_READ_FENCE.get() is not None} {threading.current_thread() is threading.main_thread()}"
+
+        self.parser.FUNCTION_REGISTRY["FENCEPROBE"] = fenced
+        self.parser.KNOWN_SAFE.add("FENCEPROBE")
+        try:
+            rdg, tmp = self._rdg('p.md=FENCEPROBE()\n')
+            self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 2, use_async=True), 0)
+        finally:
+            self.parser.FUNCTION_REGISTRY.pop("FENCEPROBE")
+            self.parser.KNOWN_SAFE.discard("FENCEPROBE")
+        self.assertEqual(self._read(tmp, "p.md"), "True False")
+
+
+class ClaudeCliAsync(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, os.path.join(REPO, "src"))
+        from rdg import claude
+        self.claude = claude
+        self.tmp = tempfile.mkdtemp()
+
+    def _call(self, body, timeout=30):
+        stub = _fake_claude(self.tmp, body)
+        with mock.patch.object(self.claude, "_resolve_cli", return_value=stub), \
+                mock.patch.object(self.claude, "CLAUDE_CLI_TIMEOUT_SECONDS", timeout):
+            return asyncio.run(self.claude.call_claude_async("the prompt"))
+
+    def test_stdout_on_success(self):
+        self.assertEqual(self._call('cat; printf " answered"\n'), "the prompt answered")
+
+    def test_sentinel_on_nonzero_exit(self):
+        result = self._call('cat >/dev/null; echo "context window exceeded" >&2; exit 3\n')
+        self.assertTrue(result.startswith("RDG-ENGINE-ERROR: ClaudeCliNonZeroExit: exit 3"))
+        self.assertIn("context window exceeded", result)
+
+    def test_sentinel_on_timeout(self):
+        started = time.monotonic()
+        result = self._call('exec sleep 5\n', timeout=0.5)
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertTrue(result.startswith("RDG-ENGINE-ERROR: subprocess.TimeoutExpired"))
+
+
+class ClaudePrimaryEndToEnd(unittest.TestCase):
+    def test_cli_calls_overlap(self):
+        tmp = tempfile.mkdtemp()
+        stub = _fake_claude(tmp, 'sleep 0.5; printf "answer: "; cat\n')
+        with open(os.path.join(tmp, "t.rdg"), "w") as handle:
+            handle.write(''.join(f'out/{n}.md=GEMINIPROMPT(template="q{n}")\n' for n in range(12)))
+        env = {
+            "PATH": "/usr/bin:/bin",
+            "HOME": tmp,
+            "PYTHONPATH": REPO,
+            "RDG_PRIMARY": "claude",
+            "CLAUDE_CLI_PATH": stub,
+            "RDG_CACHE_DIR": os.path.join(tmp, "cache"),
+            "RDG_ASYNC": "1",
+            "RDG_JOBS": "12",
+        }
+        os.makedirs(env["RDG_CACHE_DIR"])
+        started = time.monotonic()
+        proc = subprocess.run([sys.executable, "-m", "src.rdg.rdg_cli", os.path.join(tmp, "t.rdg")],
+                              cwd=tmp, env=env, capture_output=True, text=True, timeout=120)
+        elapsed = time.monotonic() - started
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        with open(os.path.join(tmp, "out", "5.md")) as handle:
+            self.assertEqual(handle.read(), "answer: q5")
+        self.assertLess(elapsed, 12 * 0.5, "the CLI calls ran one after another")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Response cache backends — the JSON directory (default) and the SQLite store.
+
+Contract under test:
+  - with RDG_CACHE_BACKEND=sqlite, gemini's load/save go to CACHE_DIR/cache.sqlite3 and no entry
+    file is written; size, creation time and last hit are answered from the database.
+  - load_many asks for a whole set of keys in one query; loads arriving together from many
+    threads are grouped into a query or two.
+  - a reader holding a transaction open does not block a writer (WAL).
+  - `cache migrate --to sqlite` copies a JSON cache, so switching backends costs no misses.
+  - an unknown RDG_CACHE_BACKEND is refused when config loads.
+
+Hermetic: the cache helpers only, no model call.
+"""
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEYS = [f"{n:032x}" for n in range(1, 9)]
+
+
+class SqliteBackend(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache, config, gemini
+        self.cache = cache
+        self.gemini = gemini
+        self.dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", self.dir),
+            mock.patch.object(gemini, "CACHE_DIR", self.dir),
+            mock.patch.object(gemini, "CACHE_BACKEND", "sqlite"),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def test_gemini_reads_and_writes_the_database(self):
+        with mock.patch("time.time", return_value=1000):
+            self.gemini.save_to_cache(KEYS[0], "question", "answer")
+        with mock.patch("time.time", return_value=2000):
+            self.assertEqual(self.gemini.load_from_cache(KEYS[0]), "answer")
+        self.assertIsNone(self.gemini.load_from_cache(KEYS[1]))
+        files = [name for name in os.listdir(self.dir) if not name.endswith(("-wal", "-shm"))]
+        self.assertEqual(files, ["cache.sqlite3"])
+        self.assertEqual(self.gemini.cache_backend().entries(),
+                         {KEYS[0]: self.cache.IndexEntry(len("questionanswer"), 1000, 2000)})
+
+    def test_load_many_is_one_query(self):
+        backend = self.cache.SqliteCache(self.dir)
+        for key in KEYS[:3]:
+            backend.save(key, "q", key)
+        statements = []
+        backend._db().set_trace_callback(statements.append)
+        found = backend.load_many(KEYS[:4])
+        self.assertEqual(sorted(found), KEYS[:3])
+        self.assertEqual(len([s for s in statements if s.startswith("SELECT")]), 1)
+
+    def test_concurrent_loads_are_grouped(self):
+        backend = self.cache.SqliteCache(self.dir)
+        for key in KEYS:
+            backend.save(key, "q", key)
+        batches = []
+        real = backend.load_many
+
+        def slow(keys):
+            batches.append(list(keys))
+            time.sleep(0.2)
+            return real(keys)
+
+        answers = {}
+        with mock.patch.object(backend, "load_many", slow):
+            threads = [threading.Thread(target=lambda key=key: answers.update(
+                {key: backend.load(key)})) for key in KEYS]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(answers, {key: key for key in KEYS})
+        self.assertLessEqual(len(batches), 2, batches)
+
+    def test_a_reader_does_not_block_a_writer(self):
+        reader, writer = self.cache.SqliteCache(self.dir), self.cache.SqliteCache(self.dir)
+        writer.save(KEYS[0], "q", "first")
+        db = reader._db()
+        db.execute("BEGIN")
+        self.assertEqual(db.execute("SELECT response FROM entries").fetchall(), [("first",)])
+        started = time.monotonic()
+        writer.save(KEYS[1], "q", "second")
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM entries").fetchone(), (1,),
+                         "the open read sees its snapshot")
+        db.execute("COMMIT")
+        self.assertEqual(sorted(reader.load_many(KEYS[:2])), KEYS[:2])
+
+    def test_migrate_copies_a_json_cache(self):
+        json_cache = self.cache.JsonDirCache(self.dir)
+        json_cache.save(KEYS[0], "q", "sharded")
+        with open(self.cache.legacy_path(self.dir, KEYS[1]), "w") as handle:
+            handle.write('{"request": "q", "response": "flat"}')
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            self.assertEqual(
+                self.cache.main(["--cache-dir", self.dir, "migrate", "--to", "sqlite"]), 0)
+        self.assertIn("Copied 2 entries", stdout.getvalue())
+        self.assertEqual(self.gemini.cache_backend().load_many(KEYS[:3]),
+                         {KEYS[0]: "sharded", KEYS[1]: "flat"})
+
+
+class BackendChoice(unittest.TestCase):
+    def test_an_unknown_backend_is_refused(self):
+        env = dict(os.environ)
+        env["RDG_CACHE_BACKEND"] = "redis"
+        env["RDG_CACHE_DIR"] = tempfile.mkdtemp()
+        proc = subprocess.run([sys.executable, "-c", "import src.rdg.config"], cwd=REPO, env=env,
+                              capture_output=True, text=True)
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("RDG_CACHE_BACKEND='redis' is not a cache backend; expected one of: "
+                      "json, sqlite", proc.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
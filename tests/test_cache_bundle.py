@@ -0,0 +1,142 @@
+"""Cache bundles — `cache export` / `cache import` for CI warm starts.
+
+Contract under test:
+  - a run records the cache keys its model calls used; export writes exactly those entries.
+  - a targeted run adds to that record; only a full run replaces it.
+  - the same entries give byte-identical bundles; prompts are left out unless asked for.
+  - a fresh cache that imports the bundle answers the notebook's run without a model call.
+  - import never replaces an entry already present, even one the index does not know of, on
+    either backend, and refuses a file that is not a bundle.
+
+Hermetic: the notebook runs against a fake model call.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOTEBOOK = ('out/a.md=GEMINIPROMPT(template="Summarise {{x}}", x=in.md)\n'
+            'out/b.md=GEMINIPROMPT(template="Critique {{x}}", x=out/a.md)\n'
+            'out/c.md=UPPERCASE(file=in.md)\n')
+
+
+class Bundles(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import bundle, cache, config, functions, gemini, parser
+        self.bundle = bundle
+        self.cache = cache
+        self.parser = parser
+        self.modules = (config, gemini)
+        self.functions = functions
+        self.tmp = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp, "in.md"), "w") as handle:
+            handle.write("hello")
+        self.notebook = os.path.join(self.tmp, "book.rdg")
+        with open(self.notebook, "w") as handle:
+            handle.write(NOTEBOOK)
+        self.calls = []
+        self.patches = []
+        self.cache_dir = self._machine()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _machine(self):
+        cache_dir = tempfile.mkdtemp()
+        for module in self.modules:
+            patch = mock.patch.object(module, "CACHE_DIR", cache_dir)
+            patch.start()
+            self.patches.append(patch)
+        return cache_dir
+
+    def _fake(self, prompt, model=None, effort=None):
+        self.calls.append(prompt)
+        return f"answer {len(self.calls)}"
+
+    def _run(self, targets=None):
+        with mock.patch.object(self.functions, "memoized_gemini_call", self._fake):
+            self.assertEqual(self.parser.process_rdg_file(self.notebook, self.tmp, targets), 0)
+
+    def _main(self, *argv):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("sys.stderr", io.StringIO()):
+            code = self.cache.main(["--cache-dir", self.cache_dir, "--backend", "json", *argv])
+        return code, stdout.getvalue()
+
+    def test_export_then_import_warms_a_fresh_cache(self):
+        self._run()
+        self.assertEqual(len(self.calls), 2)
+        self.cache.JsonDirCache(self.cache_dir).save("f" * 32, "unrelated", "not exported")
+        bundle = os.path.join(self.tmp, "warm.bundle.gz")
+        code, out = self._main("export", self.tmp, "-o", bundle)
+        self.assertEqual(code, 0)
+        self.assertIn("Exported 2 entries for 1 notebook(s)", out)
+        with gzip.open(bundle, "rt") as handle:
+            lines = [json.loads(line) for line in handle]
+        self.assertEqual(lines[0]["entries"], 2)
+        self.assertEqual([entry["request"] for entry in lines[1:]], [None, None])
+
+        self.cache_dir = self._machine()
+        code, out = self._main("import", bundle)
+        self.assertIn("Imported 2 entries", out)
+        self._run()
+        self.assertEqual(len(self.calls), 2, "the imported cache answered every model step")
+
+    def test_bundles_are_deterministic(self):
+        self._run()
+        first, second = (os.path.join(self.tmp, name) for name in ("1.gz", "2.gz"))
+        self._main("export", self.notebook, "-o", first, "--with-prompts")
+        self._main("export", self.notebook, "-o", second, "--with-prompts")
+        with open(first, "rb") as one, open(second, "rb") as two:
+            self.assertEqual(one.read(), two.read())
+        with gzip.open(first, "rt") as handle:
+            self.assertIn("Summarise hello", handle.read())
+
+    def test_a_targeted_run_keeps_the_record_of_the_steps_it_skipped(self):
+        self._run()
+        bundle = os.path.join(self.tmp, "warm.bundle.gz")
+        self._run(targets=["out/c.md"])
+        self.assertIn("Exported 2 entries", self._main("export", self.notebook, "-o", bundle)[1])
+        self._run(targets=["out/a.md"])
+        self.assertIn("Exported 2 entries", self._main("export", self.notebook, "-o", bundle)[1])
+        record = self.bundle.run_keys_path(self.cache_dir, self.notebook)
+        with open(self.notebook, "w") as handle:
+            handle.write('out/c.md=UPPERCASE(file=in.md)\nout/d.md=UPPERCASE(file=out/c.md)\n')
+        self._run(targets=["out/c.md"])
+        self.assertTrue(os.path.exists(record), "a targeted run never drops the record")
+        self._run()
+        self.assertFalse(os.path.exists(record), "a full run without model calls does")
+
+    def test_import_keeps_present_entries_and_refuses_non_bundles(self):
+        self._run()
+        bundle = os.path.join(self.tmp, "warm.bundle.gz")
+        self._main("export", self.notebook, "-o", bundle)
+        with gzip.open(bundle, "rt") as handle:
+            key = [json.loads(line) for line in handle][1]["key"]
+        self.cache_dir = self._machine()
+        self.cache.JsonDirCache(self.cache_dir).save(key, "q", "local answer")
+        os.remove(os.path.join(self.cache_dir, self.cache.INDEX_NAME))
+        code, out = self._main("import", bundle)
+        self.assertEqual(code, 0)
+        self.assertIn("Imported 1 entries", out)
+        self.assertIn("(1 already present)", out)
+        self.assertEqual(self.cache.JsonDirCache(self.cache_dir).load(key), "local answer")
+
+        sqlite = self.cache.SqliteCache(self._machine())
+        sqlite.save(key, "q", "local answer")
+        self.assertEqual(self.bundle.import_bundle(sqlite, bundle), (1, 1))
+        self.assertEqual(sqlite.load(key), "local answer")
+        self.assertEqual(self._main("import", os.path.join(self.tmp, "in.md"))[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
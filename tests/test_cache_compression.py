@@ -0,0 +1,130 @@
+"""Compressed cache entries, and prompts kept inline, as one shared blob, or as a hash alone.
+
+Contract under test:
+  - RDG_CACHE_COMPRESS packs an entry as <key>.rdgc; a dump-sized prompt shrinks many times over.
+  - a hit reads the response and nothing else: a damaged prompt does not cost the hit.
+  - "blob" stores a prompt shared by several entries once; "hash" keeps only its sha256.
+  - entries are read however they were written, and rewriting a key leaves one copy.
+  - the SQLite store does the same in its rows, and a database from before codecs still opens.
+
+Hermetic: the cache helpers only, no model call.
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY = "0123456789abcdef0123456789abcdef"
+OTHER = "fedcba9876543210fedcba9876543210"
+
+# What a GLOBTOMARKDOWN prompt looks like: many similar files, fenced.
+PROMPT = "Summarise these files.\n" + "".join(
+    f"## src/module_{n}.py\n```python\ndef handler_{n}(event):\n    return process(event, {n})\n```\n"
+    for n in range(400))
+
+
+class JsonDirCompression(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache
+        self.cache = cache
+        self.dir = tempfile.mkdtemp()
+
+    def _open(self, codec="zlib", prompts="inline"):
+        return self.cache.JsonDirCache(self.dir, codec, prompts)
+
+    def test_packed_entries_are_small_and_round_trip(self):
+        self._open("none").save(OTHER, PROMPT, "the answer")
+        self._open("zlib").save(KEY, PROMPT, "the answer")
+        packed = self.cache.entry_path(self.dir, KEY, ".rdgc")
+        plain = os.path.getsize(self.cache.entry_path(self.dir, OTHER))
+        self.assertLess(os.path.getsize(packed) * 10, plain)
+        backend = self._open("none")
+        self.assertEqual(backend.load(KEY), "the answer")
+        self.assertEqual(backend.load_prompt(KEY), PROMPT)
+
+    def test_a_hit_reads_only_the_response(self):
+        self._open("lzma").save(KEY, PROMPT, "the answer")
+        path = self.cache.entry_path(self.dir, KEY, ".rdgc")
+        with open(path, "r+b") as handle:
+            handle.seek(-8, os.SEEK_END)
+            handle.write(b"\0" * 8)  # damage the prompt, which follows the response
+        backend = self._open()
+        self.assertEqual(backend.load(KEY), "the answer")
+        self.assertIsNone(backend.load_prompt(KEY))
+
+    def test_blob_prompts_are_stored_once(self):
+        backend = self._open("zlib", "blob")
+        backend.save(KEY, PROMPT, "answer from one model")
+        backend.save(OTHER, PROMPT, "answer from another")
+        sha = hashlib.sha256(PROMPT.encode()).hexdigest()
+        self.assertEqual(os.listdir(os.path.join(self.dir, "prompts", sha[:2])), [sha])
+        self.assertEqual(backend.load_prompt(OTHER), PROMPT)
+        self.assertEqual(backend.load(OTHER), "answer from another")
+        entries = backend.entries()
+        self.assertEqual({entry.prompt for entry in entries.values()}, {sha})
+        rebuilt = self.cache.rebuild_index(self.dir)  # creation times come from mtimes here
+        self.assertEqual({key: (entry.size, entry.prompt) for key, entry in rebuilt.items()},
+                         {key: (entry.size, entry.prompt) for key, entry in entries.items()})
+
+    def test_hash_mode_keeps_only_the_digest(self):
+        backend = self._open("none", "hash")
+        backend.save(KEY, PROMPT, "the answer")
+        with open(self.cache.entry_path(self.dir, KEY, ".rdgc"), "rb") as handle:
+            header = handle.readline().decode().split()
+        self.assertEqual(header[:4], ["RDGC1", "none", "hash",
+                                      hashlib.sha256(PROMPT.encode()).hexdigest()])
+        self.assertEqual(backend.load(KEY), "the answer")
+        self.assertIsNone(backend.load_prompt(KEY))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "prompts")))
+
+    def test_rewriting_a_key_under_other_settings_leaves_one_copy(self):
+        self._open("zlib").save(KEY, PROMPT, "old")
+        self._open("none").save(KEY, PROMPT, "new")
+        self.assertFalse(os.path.exists(self.cache.entry_path(self.dir, KEY, ".rdgc")))
+        self.assertEqual(self._open().load(KEY), "new")
+
+
+class SqliteCompression(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache
+        self.cache = cache
+        self.dir = tempfile.mkdtemp()
+
+    def test_rows_are_compressed_and_prompts_shared(self):
+        backend = self.cache.SqliteCache(self.dir, "zlib", "blob")
+        backend.save(KEY, PROMPT, "answer one")
+        backend.save(OTHER, PROMPT, "answer two")
+        db = backend._db()
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM prompts").fetchone(), (1,))
+        self.assertIsInstance(db.execute("SELECT response FROM entries").fetchone()[0], bytes)
+        statements = []
+        db.set_trace_callback(statements.append)
+        self.assertEqual(backend.load_many([KEY, OTHER]), {KEY: "answer one", OTHER: "answer two"})
+        self.assertFalse([s for s in statements if "request" in s])
+        self.assertEqual(backend.load_prompt(KEY), PROMPT)
+        self.assertLess(sum(entry.size for entry in backend.entries().values()), 100)
+
+    def test_a_database_from_before_codecs_still_opens(self):
+        db = sqlite3.connect(os.path.join(self.dir, "cache.sqlite3"))
+        db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, request TEXT, "
+                   "response TEXT NOT NULL, size INTEGER NOT NULL, created INTEGER NOT NULL, "
+                   "last_hit INTEGER)")
+        db.execute("INSERT INTO entries VALUES (?, 'q', 'old answer', 11, 1000, NULL)", (KEY,))
+        db.commit()
+        db.close()
+        backend = self.cache.SqliteCache(self.dir, "lzma", "inline")
+        self.assertEqual(backend.load(KEY), "old answer")
+        self.assertEqual(backend.load_prompt(KEY), "q")
+        backend.save(OTHER, PROMPT, "new answer")
+        self.assertEqual(backend.load_many([KEY, OTHER]), {KEY: "old answer", OTHER: "new answer"})
+
+
+if __name__ == "__main__":
+    unittest.main()
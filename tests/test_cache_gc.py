@@ -0,0 +1,205 @@
+"""Cache maintenance — `cache stats`, `cache gc` and `cache verify`.
+
+Contract under test:
+  - gc evicts entries unused for longer than --max-age, then least recently used ones until the
+    rest fit in --max-size; a hit counts as a use; --dry-run changes nothing.
+  - an entry named by a build manifest (RDG_INCREMENTAL) is never evicted, and a real incremental
+    run records the keys of its model calls there.
+  - gc drops prompt blobs no entry uses and lock files no process holds, on both backends.
+  - verify reads every entry back and exits 1 on a corrupt one; --repair removes it.
+
+Hermetic: the cache helpers, plus one notebook run against a fake model call.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEYS = [f"{n:032x}" for n in range(1, 7)]
+DAY = 86400
+NOW = 100 * DAY
+
+
+class CacheGc(unittest.TestCase):
+    backend_name = "json"
+
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache, config, gemini
+        self.cache = cache
+        self.gemini = gemini
+        self.dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", self.dir),
+            mock.patch.object(gemini, "CACHE_DIR", self.dir),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.backend = cache.open_cache(self.backend_name, self.dir, "none", "inline")
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _save(self, key, day, prompt="q", response="x" * 100):
+        with mock.patch("time.time", return_value=day * DAY):
+            self.backend.save(key, prompt, response)
+
+    def _main(self, *argv):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("time.time", return_value=NOW):
+            code = self.cache.main(["--cache-dir", self.dir, "--backend", self.backend_name,
+                                    *argv])
+        return code, stdout.getvalue()
+
+    def _pin(self, keys):
+        notebook = os.path.join(self.dir, "pinned.rdg")
+        open(notebook, "w").close()
+        os.makedirs(os.path.join(self.dir, "manifests"))
+        with open(os.path.join(self.dir, "manifests", "pinned.json"), "w") as handle:
+            json.dump({"version": 1, "rdg_file": notebook,
+                       "steps": {"out.md": {"cache_keys": keys}}}, handle)
+
+    def test_gc_evicts_by_age_then_least_recently_used(self):
+        for day, key in enumerate(KEYS, start=90):
+            self._save(key, day)
+        with mock.patch("time.time", return_value=99 * DAY):
+            self.assertEqual(self.backend.load(KEYS[0]), "x" * 100)  # oldest, but just used
+        size = self.backend.entries()[KEYS[1]].size
+
+        code, out = self._main("gc", "--max-age", "9d", "--max-size", str(3 * size), "--dry-run")
+        self.assertEqual(code, 0)
+        self.assertIn("Would evict 3 entries", out)
+        self.assertEqual(len(self.backend.entries()), len(KEYS))
+
+        self._main("gc", "--max-age", "9d", "--max-size", str(3 * size))
+        self.assertEqual(sorted(self.backend.entries()), [KEYS[0], KEYS[4], KEYS[5]])
+        self.assertIsNone(self.backend.load(KEYS[1]))
+        self.assertEqual(self.backend.load(KEYS[0]), "x" * 100)
+
+    def test_pinned_entries_are_never_evicted(self):
+        for day, key in enumerate(KEYS[:3], start=1):
+            self._save(key, day)
+        self._pin([KEYS[0]])
+        code, out = self._main("gc", "--max-size", "0")
+        self.assertEqual(code, 0)
+        self.assertIn("1 pinned by build manifests", out)
+        self.assertEqual(list(self.backend.entries()), [KEYS[0]])
+        os.remove(os.path.join(self.dir, "pinned.rdg"))  # the notebook is gone: so is the pin
+        self._main("gc", "--max-size", "0")
+        self.assertEqual(self.backend.entries(), {})
+
+    def test_gc_drops_unused_prompt_blobs(self):
+        blobs = self.cache.open_cache(self.backend_name, self.dir, "zlib", "blob")
+        with mock.patch("time.time", return_value=DAY):
+            blobs.save(KEYS[0], "kept prompt", "a")
+            blobs.save(KEYS[1], "dropped prompt", "b")
+        for root, _, names in os.walk(os.path.join(self.dir, "prompts")):
+            for name in names:
+                os.utime(os.path.join(root, name), (DAY, DAY))
+        self.backend.remove([KEYS[1]])
+        self.assertEqual(self.backend.prune_prompts(), 1)
+        self.assertEqual(blobs.load_prompt(KEYS[0]), "kept prompt")
+
+    @unittest.skipIf(sys.platform == "win32", "advisory locks need fcntl")
+    def test_gc_removes_only_idle_lock_files(self):
+        held = self.gemini._acquire_cache_lock(KEYS[0])
+        self.gemini._release_cache_lock(self.gemini._acquire_cache_lock(KEYS[1]))
+        try:
+            self._main("gc")
+            self.assertEqual(os.listdir(os.path.join(self.dir, "locks")), [f"{KEYS[0]}.lock"])
+        finally:
+            self.gemini._release_cache_lock(held)
+
+    def test_stats(self):
+        self._save(KEYS[0], 90)
+        self._save(KEYS[1], 98)
+        self._pin([KEYS[1]])
+        code, out = self._main("stats")
+        self.assertEqual(code, 0)
+        self.assertRegex(out, r"entries\s+2 ")
+        self.assertRegex(out, r"pinned\s+1 ")
+        self.assertIn("oldest 10d ago, newest 2d ago", out)
+
+
+class SqliteCacheGc(CacheGc):
+    backend_name = "sqlite"
+
+    def test_gc_drops_unused_prompt_blobs(self):
+        blobs = self.cache.SqliteCache(self.dir, "zlib", "blob")
+        blobs.save(KEYS[0], "kept prompt", "a")
+        blobs.save(KEYS[1], "dropped prompt", "b")
+        self.assertEqual(blobs.prune_prompts(), 0)
+        self.backend.remove([KEYS[1]])
+        self.assertEqual(self.backend.prune_prompts(), 1)
+        self.assertEqual(blobs.load_prompt(KEYS[0]), "kept prompt")
+
+
+class Verify(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache
+        self.cache = cache
+        self.dir = tempfile.mkdtemp()
+
+    def _verify(self, *argv):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("sys.stderr", io.StringIO()):
+            code = self.cache.main(["--cache-dir", self.dir, "--backend", "json", "verify",
+                                    *argv])
+        return code, stdout.getvalue()
+
+    def test_verify_finds_and_repairs_a_corrupt_entry(self):
+        backend = self.cache.JsonDirCache(self.dir, "zlib", "blob")
+        backend.save(KEYS[0], "q", "fine")
+        backend.save(KEYS[1], "q", "damaged")
+        with open(self.cache.entry_path(self.dir, KEYS[1], ".rdgc"), "r+b") as handle:
+            handle.seek(-4, os.SEEK_END)
+            handle.write(b"\0" * 4)
+        code, out = self._verify()
+        self.assertEqual(code, 1)
+        self.assertIn(f"{KEYS[1]}: unreadable", out)
+        self.assertNotIn(KEYS[0], out)
+        self.assertEqual(self._verify("--repair")[0], 0)
+        self.assertEqual(self._verify()[0], 0)
+        self.assertEqual(list(backend.entries()), [KEYS[0]])
+
+    def test_verify_finds_a_missing_prompt_blob(self):
+        backend = self.cache.SqliteCache(self.dir, "none", "blob")
+        backend.save(KEYS[0], "q", "answer")
+        backend._db().execute("DELETE FROM prompts")
+        self.assertEqual(backend.verify(), [(KEYS[0], "prompt", "stored prompt is missing")])
+
+
+class ManifestPins(unittest.TestCase):
+    def test_an_incremental_run_records_its_cache_keys(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini, parser
+        from src.rdg.cache import open_cache
+        from src.rdg.manifest import manifest_cache_keys
+        tmp = tempfile.mkdtemp()
+        cache_dir = os.path.join(tmp, "cache")
+        with open(os.path.join(tmp, "in.md"), "w") as handle:
+            handle.write("hello")
+        notebook = os.path.join(tmp, "book.rdg")
+        with open(notebook, "w") as handle:
+            handle.write('out.md=GEMINIPROMPT(template="Summarise {{x}}", x=in.md)\n')
+        with mock.patch.object(config, "CACHE_DIR", cache_dir), \
+                mock.patch.object(gemini, "CACHE_DIR", cache_dir), \
+                mock.patch.dict(os.environ, {"RDG_INCREMENTAL": "1"}), \
+                mock.patch.object(functions, "memoized_gemini_call",
+                                  lambda prompt, model=None, effort=None: "summary"):
+            self.assertEqual(parser.process_rdg_file(notebook, tmp), 0)
+            pinned = manifest_cache_keys(cache_dir)
+            self.assertEqual(len(pinned), 1)
+            self.assertEqual(set(open_cache("json", cache_dir).entries()), pinned)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""The response cache's sharded layout, its legacy read-through, its migration and its index.
+
+Contract under test:
+  - a new entry lands at ab/cd/<key>.json, never in the top of CACHE_DIR.
+  - an entry in the old flat layout is still a hit, until `migrate` moves it into its shard.
+  - migrate moves only flat entry files, keeps the sharded copy when both exist, and is idempotent.
+  - the index knows every entry's size, creation time and last hit without a stat; a torn line is
+    skipped; `index` rebuilds it from disk, keeping the hits it knew.
+  - a process records a key's hit once per HIT_INTERVAL, and a long index compacts itself.
+
+Hermetic: the cache helpers only, no model call.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY = "0123456789abcdef0123456789abcdef"
+OTHER = "fedcba9876543210fedcba9876543210"
+
+
+class CacheLayout(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import cache, config, gemini
+        self.cache = cache
+        self.gemini = gemini
+        self.dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", self.dir),
+            mock.patch.object(gemini, "CACHE_DIR", self.dir),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _flat(self, key, response):
+        with open(os.path.join(self.dir, f"{key}.json"), "w") as handle:
+            json.dump({"request": "q", "response": response}, handle)
+
+    def test_new_entries_are_sharded(self):
+        self.gemini.save_to_cache(KEY, "question", "answer")
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, "01", "23", f"{KEY}.json")))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, f"{KEY}.json")))
+        self.assertEqual(self.gemini.load_from_cache(KEY), "answer")
+        self.assertIsNone(self.gemini.load_from_cache(OTHER))
+
+    def test_flat_entries_are_read_through_then_migrated(self):
+        self._flat(KEY, "old answer")
+        self._flat(OTHER, "stale flat copy")
+        self.gemini.save_to_cache(OTHER, "question", "sharded answer")
+        with open(os.path.join(self.dir, "notes.json"), "w") as handle:
+            handle.write("not an entry")
+        self.assertEqual(self.gemini.load_from_cache(KEY), "old answer")
+
+        self.assertEqual(self.cache.migrate(self.dir), 1)
+        self.assertEqual(sorted(os.listdir(self.dir)), ["01", "fe", "index.log", "notes.json"])
+        self.assertEqual(self.gemini.load_from_cache(KEY), "old answer")
+        self.assertEqual(self.gemini.load_from_cache(OTHER), "sharded answer")
+        self.assertEqual(self.cache.migrate(self.dir), 0)
+
+    def test_the_index_tracks_size_creation_and_hits(self):
+        with mock.patch("time.time", return_value=1000):
+            self.gemini.save_to_cache(KEY, "question", "answer")
+            self.gemini.save_to_cache(OTHER, "question", "answer")
+        with mock.patch("time.time", return_value=2000):
+            self.gemini.load_from_cache(KEY)
+        with open(os.path.join(self.dir, "index.log"), "a") as handle:
+            handle.write("h 0123")  # a writer that died mid-line
+        size = os.path.getsize(self.cache.entry_path(self.dir, KEY))
+        with mock.patch("os.stat", side_effect=AssertionError("the index must not stat entries")):
+            index = self.cache.read_index(self.dir)
+        self.assertEqual(index, {KEY: self.cache.IndexEntry(size, 1000, 2000),
+                                 OTHER: self.cache.IndexEntry(size, 1000, None)})
+
+    def test_index_command_rebuilds_from_disk(self):
+        self._flat(OTHER, "flat")
+        with mock.patch("time.time", return_value=2000):
+            self.gemini.save_to_cache(KEY, "question", "answer")
+            self.gemini.load_from_cache(KEY)
+        os.remove(os.path.join(self.dir, "index.log"))
+        later = 2000 + self.cache.HIT_INTERVAL
+        with mock.patch("time.time", return_value=later):
+            self.gemini.load_from_cache(KEY)
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            self.assertEqual(self.cache.main(["--cache-dir", self.dir, "index"]), 0)
+        self.assertIn("Indexed 2 entries", stdout.getvalue())
+        index = self.cache.read_index(self.dir)
+        self.assertEqual(set(index), {KEY, OTHER})
+        self.assertEqual(index[KEY].last_hit, later)
+        self.assertIsNone(index[OTHER].last_hit)
+
+    def _index_lines(self):
+        with open(os.path.join(self.dir, "index.log")) as handle:
+            return handle.read().splitlines()
+
+    def test_hits_are_recorded_once_per_interval_and_the_index_compacts(self):
+        with mock.patch("time.time", return_value=1000):
+            self.gemini.save_to_cache(KEY, "question", "answer")
+            for _ in range(5):
+                self.gemini.load_from_cache(KEY)
+        self.assertEqual(len(self._index_lines()), 2, "one + line and one h line")
+        with mock.patch("time.time", return_value=1000 + self.cache.HIT_INTERVAL):
+            self.gemini.load_from_cache(KEY)
+        self.assertEqual(self._index_lines()[-1], f"h {KEY} {1000 + self.cache.HIT_INTERVAL}")
+
+        with mock.patch.object(self.cache, "COMPACT_MIN_LINES", 0):
+            self.assertEqual(self.cache.read_index(self.dir)[KEY].last_hit,
+                             1000 + self.cache.HIT_INTERVAL)
+            self.assertEqual(len(self._index_lines()), 3, "not yet past COMPACT_FACTOR per entry")
+            for n in range(2, 6):
+                with mock.patch("time.time", return_value=1000 + n * self.cache.HIT_INTERVAL):
+                    self.gemini.load_from_cache(KEY)
+            index = self.cache.read_index(self.dir)
+        self.assertEqual(self._index_lines(),
+                         [f"+ {KEY} {index[KEY].size} 1000 {1000 + 5 * self.cache.HIT_INTERVAL}"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""Warm Claude CLI workers (RDG_CLAUDE_POOL, claude_pool.py).
+
+Contract under test:
+  - a pooled call answers through a worker in streaming JSON mode that was started before the
+    call; by default each worker answers one prompt, RDG_CLAUDE_POOL_RECYCLE=K lets it answer K.
+  - a pooled answer is byte-identical to the one-shot `--print` answer to the same prompt.
+  - the RDG-ENGINE-ERROR contract holds: a worker that crashes mid-call, answers an error result
+    or outlives the timeout yields the same sentinels as a one-shot CLI, and is replaced.
+  - the switch's calls go through the same pool.
+
+Hermetic: the CLI is a fake Python script speaking the stream-json protocol; no real `claude`.
+"""
+
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_CLI = """#!{python}
+import json, os, sys, time
+if sys.argv[-5:] != ["--input-format", "stream-json", "--output-format", "stream-json",
+                     "--verbose"]:
+    # One-shot --print: the prompt on stdin, the result and a newline on stdout.
+    text = sys.stdin.read()
+    sys.stdout.write((text[len("plain:"):] if text.startswith("plain:") else text) + "\\n")
+    sys.exit(0)
+with open(os.environ["FAKE_CLAUDE_LOG"], "a") as log:
+    log.write("%d\\n" % os.getpid())
+print(json.dumps({{"type": "system", "subtype": "init"}}), flush=True)
+for line in sys.stdin:
+    text = json.loads(line)["message"]["content"][0]["text"]
+    if text.startswith("plain:"):
+        result = {{"type": "result", "subtype": "success", "is_error": False,
+                  "result": text[len("plain:"):]}}
+        print(json.dumps(result), flush=True)
+        continue
+    if text == "crash":
+        sys.stderr.write("boom\\n")
+        sys.exit(3)
+    if text == "hang":
+        time.sleep(60)
+    answer = "%d:%s" % (os.getpid(), text)
+    if text == "refuse":
+        answer = "Prompt is too long"
+    elif "DECISION" in text:
+        answer = "DECISION: 1\\nRATIONALE: pooled"
+    result = {{"type": "result", "subtype": "success", "is_error": text == "refuse",
+              "result": answer}}
+    print(json.dumps(result), flush=True)
+"""
+
+
+class Pool(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import claude, claude_pool, switch
+        self.claude = claude
+        self.claude_pool = claude_pool
+        self.switch = switch
+        tmp = tempfile.mkdtemp()
+        self.cli = os.path.join(tmp, "claude")
+        with open(self.cli, "w") as handle:
+            handle.write(FAKE_CLI.format(python=sys.executable))
+        os.chmod(self.cli, os.stat(self.cli).st_mode | stat.S_IEXEC)
+        self.log = os.path.join(tmp, "spawned")
+        patches = [
+            mock.patch.dict(os.environ, {"FAKE_CLAUDE_LOG": self.log}),
+            mock.patch.object(claude, "_resolve_cli", return_value=self.cli),
+            mock.patch.object(claude, "CLAUDE_CLI_POOL", 1),
+            mock.patch.object(claude, "CLAUDE_CLI_TIMEOUT_SECONDS", 5),
+            mock.patch.object(claude_pool, "_pools", {}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(claude_pool.close_pools)
+
+    def _spawned(self, at_least):
+        """Pids of the fake CLIs started so far, in order; waits for `at_least` of them."""
+        deadline = time.monotonic() + 10
+        while True:
+            pids = []
+            if os.path.exists(self.log):
+                with open(self.log) as handle:
+                    pids = handle.read().split()
+            if len(pids) >= at_least or time.monotonic() > deadline:
+                return pids
+            time.sleep(0.01)
+
+    def test_calls_are_answered_by_workers_started_before_them(self):
+        pid, answer = self.claude.call_claude("first").split(":", 1)
+        self.assertEqual(answer, "first\n")
+        # Each fake logs its pid when it starts running, which need not be the order it was spawned.
+        warm = next(p for p in self._spawned(at_least=2) if p != pid)
+        pid2, _ = self.claude.call_claude("second").split(":", 1)
+        self.assertEqual(pid2, warm, "the second call took the worker the first one warmed")
+        self.assertNotEqual(pid, pid2, "a worker answers one prompt by default")
+        self.assertTrue(asyncio.run(self.claude.call_claude_async("third")).endswith(":third\n"))
+
+    def test_recycle_lets_a_worker_answer_several_prompts(self):
+        with mock.patch.object(self.claude, "CLAUDE_CLI_POOL_RECYCLE", 2):
+            pids = [self.claude.call_claude(p).split(":")[0] for p in ("a", "b", "c")]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test_a_pooled_answer_is_the_print_answer(self):
+        for prompt in ("plain:one line", "plain:two\nlines\n", "plain:"):
+            with self.subTest(prompt=prompt):
+                pooled = self.claude.call_claude(prompt)
+                with mock.patch.object(self.claude, "CLAUDE_CLI_POOL", 0):
+                    self.assertEqual(pooled, self.claude.call_claude(prompt))
+
+    def test_failures_keep_the_sentinel_contract(self):
+        crashed = self.claude.call_claude("crash")
+        self.assertTrue(crashed.startswith("RDG-ENGINE-ERROR: ClaudeCliNonZeroExit: exit 3"))
+        self.assertIn("boom", crashed)
+        refused = self.claude.call_claude("refuse")
+        self.assertTrue(refused.startswith("RDG-ENGINE-ERROR: ClaudeCliNonZeroExit: exit 1"))
+        self.assertIn("Prompt is too long", refused)
+        with mock.patch.object(self.claude, "CLAUDE_CLI_TIMEOUT_SECONDS", 1):
+            self.assertEqual(self.claude.call_claude("hang"),
+                             "RDG-ENGINE-ERROR: subprocess.TimeoutExpired: "
+                             "Claude CLI timed out after 1s")
+        self.assertTrue(self.claude.call_claude("still here").endswith(":still here\n"))
+
+    def test_the_switch_uses_the_pool(self):
+        with mock.patch.object(self.switch, "_resolve_cli", return_value=self.cli), \
+                mock.patch.object(self.switch, "CLAUDE_CLI_POOL", 1), \
+                mock.patch.object(self.switch.subprocess, "run",
+                                  side_effect=AssertionError("started a one-shot CLI")):
+            decision, rationale, _, _ = self.switch._invoke_claude_switch(
+                "abc", "PASS", "new text", "sonnet", 5)
+        self.assertEqual((decision, rationale), (1, "pooled"))
+
+
+if __name__ == "__main__":
+    unittest.main()
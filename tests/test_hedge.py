@@ -0,0 +1,169 @@
+"""Hedged model calls (hedge.py, RDG_HEDGE_PERCENTILE / _TO / _BUDGET).
+
+Contract under test:
+  - a model has no threshold until MIN_SAMPLES calls have finished; then a call running past
+    the chosen percentile of recent latencies gets a hedge, within the budget.
+  - the first good answer wins; a failed answer never wins, and when both fail the primary's
+    failure is raised. On the event loop the loser is cancelled.
+  - no hedge is sent while `held()` says the model is throttled, before the call or once it is late.
+  - through GEMINIPROMPT's call path, a hedge to Claude that answers first is the answer that is
+    cached, and the slow Gemini answer finishing later never replaces it.
+  - a call slowed by the rate limiter is not hedged, and its wait is not counted as latency: only
+    the provider request is timed.
+
+Hermetic: the providers are fakes gated on events; no request is sent.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Race(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import hedge
+        self.hedge = hedge
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _hedger(self, budget=1.0):
+        hedger = self.hedge.Hedger(95, budget)
+        for _ in range(self.hedge.MIN_SAMPLES):
+            hedger.record("m", 0.01)
+        return hedger
+
+    def _slow(self, answer="slow answer"):
+        self.release.wait(10)
+        return answer
+
+    def test_no_threshold_until_enough_calls_have_finished(self):
+        hedger = self.hedge.Hedger(95, 1.0)
+        for seconds in range(1, self.hedge.MIN_SAMPLES):
+            hedger.record("m", float(seconds))
+        self.assertIsNone(hedger.threshold("m"))
+        hedger.record("m", 100.0)
+        self.assertEqual(hedger.threshold("m"), 100.0)
+        self.assertIsNone(hedger.threshold("other model"))
+
+    def test_a_late_call_is_won_by_its_hedge(self):
+        answer = self.hedge.hedged(self._hedger(), "m", self._slow, lambda: "hedge answer", bool)
+        self.assertEqual(answer, "hedge answer")
+
+    def test_failures_never_win(self):
+        def broken():
+            raise RuntimeError("hedge failed")
+
+        def primary_fails():
+            self.release.wait(10)
+            raise ValueError("primary failed")
+
+        for hedge in (broken, lambda: ""):
+            self.release.clear()
+            threading.Timer(0.2, self.release.set).start()
+            self.assertEqual(self.hedge.hedged(self._hedger(), "m", self._slow, hedge, bool),
+                             "slow answer")
+        self.release.clear()
+        threading.Timer(0.2, self.release.set).start()
+        with self.assertRaisesRegex(ValueError, "primary failed"):
+            self.hedge.hedged(self._hedger(), "m", primary_fails, broken, bool)
+
+    def test_the_budget_caps_hedges(self):
+        hedger = self._hedger(budget=0.0)
+        threading.Timer(0.2, self.release.set).start()
+        answer = self.hedge.hedged(hedger, "m", self._slow,
+                                   mock.Mock(side_effect=AssertionError("hedged")), bool)
+        self.assertEqual((answer, hedger.hedges), ("slow answer", 0))
+
+    def test_no_hedge_while_held(self):
+        never = mock.Mock(side_effect=AssertionError("hedged"))
+        self.assertEqual(self.hedge.hedged(self._hedger(), "m", lambda: "answer", never, bool,
+                                           held=lambda: True), "answer")
+        held = iter([False, True])
+        threading.Timer(0.2, self.release.set).start()
+        self.assertEqual(self.hedge.hedged(self._hedger(), "m", self._slow, never, bool,
+                                           held=lambda: next(held)), "slow answer")
+        never.assert_not_called()
+
+    def test_the_awaited_loser_is_cancelled(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fast():
+            return "hedge answer"
+
+        answer = asyncio.run(self.hedge.hedged_async(self._hedger(), "m", slow, fast, bool))
+        self.assertEqual((answer, cancelled), ("hedge answer", [True]))
+
+
+class HedgeToClaude(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini, hedge, ratelimit
+        self.functions = functions
+        self.gemini = gemini
+        self.ratelimit = ratelimit
+        cache_dir = tempfile.mkdtemp()
+        self.hedger = hedger = hedge.Hedger(95, 1.0)
+        for _ in range(hedge.MIN_SAMPLES):
+            hedger.record("gemini-x", 0.01)
+        patches = [mock.patch.object(ratelimit, "_limiters", {}),mock.patch.object(config, "CACHE_DIR", cache_dir),
+                   mock.patch.object(gemini, "CACHE_DIR", cache_dir),
+                   mock.patch.object(gemini, "HEDGE_PERCENTILE", 95.0),
+                   mock.patch.object(gemini, "HEDGE_TO", "claude"),
+                   mock.patch.object(hedge, "_hedgers", {(95.0, 0.05): hedger})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        gemini.memoized_gemini_call.cache_clear()
+        self.addCleanup(gemini.memoized_gemini_call.cache_clear)
+
+    def test_only_the_winner_is_cached(self):
+        release, finished = threading.Event(), threading.Event()
+
+        def slow_gemini(**kwargs):
+            release.wait(10)
+            finished.set()
+            return mock.Mock(text="gemini answer", usage_metadata=None)
+
+        with mock.patch.object(self.gemini.client.models, "generate_content", slow_gemini), \
+                mock.patch.object(self.gemini.claude_fallback, "is_available", return_value=True), \
+                mock.patch.object(self.gemini.claude_fallback, "call_claude",
+                                  return_value="claude answer"), self.assertLogs(level="WARNING"):
+            answer = self.functions._model_call("GEMINIPROMPT", "a slow question", "gemini-x")
+            release.set()
+            self.assertTrue(finished.wait(10))
+        self.assertEqual(answer, "claude answer")
+        key = self.gemini.get_cache_key("a slow question", "gemini-x")
+        self.assertEqual(self.gemini.load_from_cache(key), "claude answer")
+
+    def test_a_throttled_call_is_not_hedged_and_its_wait_is_not_latency(self):
+        real_sleep = time.sleep
+        self.ratelimit.limiter_for("gemini-x", self.gemini.GEMINI_RPM,
+                                   self.gemini.GEMINI_TPM).pause(30)
+        with mock.patch.object(self.ratelimit.time, "sleep", lambda seconds: real_sleep(0.3)), \
+                mock.patch.object(self.gemini.client.models, "generate_content",
+                                  return_value=mock.Mock(text="gemini answer",
+                                                         usage_metadata=None)), \
+                mock.patch.object(self.gemini.claude_fallback, "call_claude",
+                                  side_effect=AssertionError("hedged while throttled")):
+            answer = self.functions._model_call("GEMINIPROMPT", "a paced question", "gemini-x")
+        self.assertEqual((answer, self.hedger.hedges), ("gemini answer", 0))
+        self.assertLess(self.hedger._latencies["gemini-x"][-1], 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
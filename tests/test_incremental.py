@@ -0,0 +1,119 @@
+"""RDG_INCREMENTAL=1 — a step whose inputs are unchanged is skipped and its destination left alone.
+
+Contract under test:
+  - unset: every run rewrites every destination, exactly as before.
+  - a second run with nothing changed skips every fingerprintable step; files and mtimes untouched.
+  - a changed input re-runs its consumer.
+  - early cutoff: a step that re-runs but writes byte-identical output does not re-run its
+    dependents.
+  - an edited destination is not trusted: the step re-runs and restores it.
+  - the RDG_JOBS runner honours the same manifest.
+
+Hermetic: deterministic formulas only, no network, no model call.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BODY = (
+    'out/up.md=UPPERCASE(file=src.md)\n'
+    'out/use.md=CREATEFILE(content="used:{{x}}", x=out/up.md)\n'
+    'out/other.md=FILESTOMARKDOWN(files="other.md")\n'
+)
+
+
+class Notebook:
+    def __init__(self):
+        self.dir = tempfile.mkdtemp()
+        self.write("src.md", "alpha")
+        self.write("other.md", "other")
+        self.write("t.rdg", BODY)
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), "w") as handle:
+            handle.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name)) as handle:
+            return handle.read()
+
+    def mtime(self, name):
+        return os.stat(os.path.join(self.dir, name)).st_mtime_ns
+
+    def run(self, incremental=True, jobs=None):
+        env = dict(os.environ)
+        inherited = env.get("PYTHONPATH", "")
+        env["PYTHONPATH"] = REPO + (os.pathsep + inherited if inherited else "")
+        env["RDG_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        env["RDG_EVENTS"] = "jsonl"
+        env.pop("RDG_JOBS", None)
+        env.pop("RDG_INCREMENTAL", None)
+        if incremental:
+            env["RDG_INCREMENTAL"] = "1"
+        if jobs is not None:
+            env["RDG_JOBS"] = str(jobs)
+        proc = subprocess.run(
+            [sys.executable, "-m", "src.rdg.rdg_cli", os.path.join(self.dir, "t.rdg")],
+            cwd=REPO, env=env, capture_output=True, text=True,
+        )
+        assert proc.returncode == 0, proc.stderr
+        ends = {}
+        for line in proc.stderr.splitlines():
+            if line.startswith('{"ev":"step_end"'):
+                event = json.loads(line)
+                ends[event["dest"]] = event
+        return {dest for dest, event in ends.items() if event.get("skipped")}
+
+
+class Incremental(unittest.TestCase):
+    def test_noop_run_skips_everything_and_keeps_mtimes(self):
+        nb = Notebook()
+        self.assertEqual(nb.run(), set())
+        before = {n: nb.mtime(n) for n in ("out/up.md", "out/use.md", "out/other.md")}
+        self.assertEqual(nb.run(), {"out/up.md", "out/use.md", "out/other.md"})
+        self.assertEqual(before, {n: nb.mtime(n) for n in before})
+        self.assertEqual(nb.read("out/use.md"), "used:ALPHA")
+
+    def test_unset_rewrites_as_before(self):
+        nb = Notebook()
+        nb.run(incremental=False)
+        self.assertEqual(nb.run(incremental=False), set())
+
+    def test_changed_input_reruns_its_consumers(self):
+        nb = Notebook()
+        nb.run()
+        nb.write("src.md", "beta")
+        self.assertEqual(nb.run(), {"out/other.md"})
+        self.assertEqual(nb.read("out/use.md"), "used:BETA")
+
+    def test_identical_output_cuts_off_dependents(self):
+        nb = Notebook()
+        nb.run()
+        nb.write("src.md", "ALPHA")  # a different input that uppercases to the same bytes
+        self.assertEqual(nb.run(), {"out/use.md", "out/other.md"})
+
+    def test_edited_destination_is_restored(self):
+        nb = Notebook()
+        nb.run()
+        nb.write("out/other.md", "hand edit")
+        self.assertEqual(nb.run(), {"out/up.md", "out/use.md"})
+        self.assertIn("other", nb.read("out/other.md"))
+        self.assertNotIn("hand edit", nb.read("out/other.md"))
+
+    def test_parallel_runner_shares_the_manifest(self):
+        nb = Notebook()
+        nb.run(jobs=4)
+        self.assertEqual(nb.run(jobs=4), {"out/up.md", "out/use.md", "out/other.md"})
+        nb.write("src.md", "gamma")
+        self.assertEqual(nb.run(jobs=4), {"out/other.md"})
+        self.assertEqual(nb.read("out/use.md"), "used:GAMMA")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""The byte-budgeted in-process memo in front of the model backends (memo.py).
+
+Contract under test:
+  - answers are kept until their total size passes the budget, then least recently used go first;
+    an answer larger than the whole budget is not kept; hits, misses and evictions are counted.
+  - the key is a digest of the arguments: the prompt string is not retained, and a keyword call
+    hits what a positional call stored.
+  - memoized_gemini_call keeps lru_cache's cache_clear/cache_info, and its awaited twin shares
+    its memo.
+  - report_memos emits one "memo" event per memo that was asked anything.
+
+Hermetic: the backends are replaced by counting fakes; no network, no model call.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ByteBudget(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import memo
+        self.memo = memo
+        self.calls = []
+
+    def _fake(self, budget):
+        @self.memo.memoized("test", max_bytes=budget)
+        def answer(prompt, model=None):
+            self.calls.append(prompt)
+            return prompt.upper() * 100
+        return answer
+
+    def test_least_recently_used_answers_go_first(self):
+        answer = self._fake(3 * (sys.getsizeof("A" * 100) + 32))
+        for prompt in ("a", "b", "c", "a", "d"):
+            answer(prompt)
+        self.assertEqual(self.calls, ["a", "b", "c", "d"])
+        answer("a")
+        answer("b")
+        self.assertEqual(self.calls, ["a", "b", "c", "d", "b"])
+        info = answer.cache_info()
+        self.assertEqual((info.hits, info.misses, info.evictions, info.entries), (2, 5, 2, 3))
+        self.assertLessEqual(info.currbytes, info.maxbytes)
+
+    def test_an_answer_over_the_budget_is_not_kept(self):
+        answer = self._fake(64)
+        answer("a")
+        answer("a")
+        self.assertEqual(self.calls, ["a", "a"])
+        self.assertEqual(answer.cache_info().entries, 0)
+
+    def test_keys_are_digests_and_ignore_call_style(self):
+        answer = self._fake(1 << 24)
+        prompt = "".join(["a big prompt"] * 1000)
+        answer(prompt, None)
+        self.assertEqual([len(key) for key in answer.memo._entries], [32])
+        self.calls.clear()
+        answer(prompt, model=None)
+        answer(prompt=prompt)
+        self.assertEqual(self.calls, [])
+        answer(prompt, "other-model")
+        self.assertEqual(len(self.calls), 1)
+        answer.cache_clear()
+        self.assertEqual(answer.cache_info()[:4], (0, 0, 0, 0))
+
+    def test_report_emits_one_event_per_asked_memo(self):
+        answer = self._fake(1 << 20)
+        self._fake(1 << 20)  # never asked: no event
+        answer("a")
+        answer("a")
+        with mock.patch.object(self.memo, "_memos", [answer.memo, self._fake(10).memo]), \
+                mock.patch.object(self.memo, "emit") as emit:
+            self.memo.report_memos()
+        emit.assert_called_once_with("memo", name="test", hits=1, misses=1, evictions=0,
+                                     entries=1, currbytes=answer.cache_info().currbytes,
+                                     maxbytes=1 << 20)
+
+
+class GeminiMemo(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import gemini
+        self.gemini = gemini
+        gemini.memoized_gemini_call.cache_clear()
+        self.addCleanup(gemini.memoized_gemini_call.cache_clear)
+
+    def test_the_awaited_path_shares_the_memo(self):
+        calls = []
+
+        async def fake(rendered_template, model=None, effort=None):
+            calls.append(rendered_template)
+            return "answer"
+
+        with mock.patch.object(self.gemini, "_gemini_call_async", fake):
+            self.assertEqual(asyncio.run(
+                self.gemini.memoized_gemini_call_async("question", None, "high")), "answer")
+            self.assertEqual(asyncio.run(
+                self.gemini.memoized_gemini_call_async("question", None, "high")), "answer")
+        self.assertEqual(calls, ["question"])
+        # The synchronous entrypoint answers from what the awaited one stored.
+        with mock.patch.object(self.gemini.client.models, "generate_content",
+                               side_effect=AssertionError("memo miss")):
+            self.assertEqual(self.gemini.memoized_gemini_call("question", effort="high"),
+                             "answer")
+        self.assertEqual(self.gemini.memoized_gemini_call.cache_info().hits, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
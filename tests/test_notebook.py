@@ -0,0 +1,147 @@
+"""Parse once — one lexed Notebook shared by the planner, the runners, file_ops and the validator.
+
+Contract under test:
+  - an RDG_JOBS run lexes each line once: the runner uses the planner's lexed lines.
+  - with RDG_PARSE_CACHE=1, a second process (simulated by clearing the in-process memo) loads the
+    lexed notebook from the cache instead of lexing; changing the file's bytes lexes it again; a
+    corrupt cache is a miss. Without it, nothing is written under CACHE_DIR.
+  - the cache holds syntax only: a formula that has left the registry is still refused.
+  - file_ops and the validator read the same Notebook, malformed lines reported with their column.
+
+Hermetic: deterministic formulas only, no network, no model call.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BODY = (
+    '# a comment\n'
+    'out/a.md=CREATEFILE(content="alpha")\n'
+    '\n'
+    'out/b.md=CREATEFILE(content="{{x}} beta", x=out/a.md)\n'
+    'out/c.md=UPPERCASE(file=out/b.md)\n'
+)
+
+
+class Notebooks(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, gemini, notebook, parser
+        self.notebook = notebook
+        self.parser = parser
+        self.tmp = tempfile.mkdtemp()
+        cache = os.path.join(self.tmp, "cache")
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", cache),
+            mock.patch.object(gemini, "CACHE_DIR", cache),
+            mock.patch.dict(notebook._memo, clear=True),
+            mock.patch.dict(os.environ, {"RDG_PARSE_CACHE": "1"}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.rdg = os.path.join(self.tmp, "t.rdg")
+        self._write(BODY)
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _write(self, body):
+        with open(self.rdg, "w") as handle:
+            handle.write(body)
+
+    def _counting(self, module):
+        real = module.lex_rdg_line
+        calls = []
+
+        def counted(line):
+            calls.append(line)
+            return real(line)
+        return mock.patch.object(module, "lex_rdg_line", counted), calls
+
+    def test_a_parallel_run_lexes_each_line_once(self):
+        at_load, loaded = self._counting(self.notebook)
+        at_run, rerun = self._counting(self.parser)
+        with at_load, at_run:
+            self.assertEqual(self.parser.process_rdg_file_parallel(self.rdg, self.tmp, 4), 0)
+        self.assertEqual(len(loaded), 5, "every physical line, once")
+        self.assertEqual(rerun, [], "the runner re-lexed a line the planner had lexed")
+        with open(os.path.join(self.tmp, "out", "c.md")) as handle:
+            self.assertEqual(handle.read(), "ALPHA BETA")
+
+    def test_a_fresh_process_reads_the_cache_until_the_file_changes(self):
+        first = self.notebook.load_notebook(self.rdg)
+        self.assertIs(self.notebook.load_notebook(self.rdg), first, "memoized in-process")
+        self.assertTrue(os.path.exists(self.notebook.notebook_cache_path(self.rdg)))
+
+        self.notebook._memo.clear()
+        at_load, loaded = self._counting(self.notebook)
+        with at_load:
+            cached = self.notebook.load_notebook(self.rdg)
+        self.assertEqual(loaded, [])
+        self.assertEqual(cached.lines, first.lines)
+
+        self._write(BODY + 'out/d.md=CREATEFILE(content="delta")\n')
+        with at_load:
+            changed = self.notebook.load_notebook(self.rdg)
+        self.assertEqual(len(loaded), 6)
+        self.assertEqual(changed.rules()[-1].syntax.dest, "out/d.md")
+
+    def test_the_disk_cache_is_opt_in(self):
+        with mock.patch.dict(os.environ, {"RDG_PARSE_CACHE": ""}):
+            self.notebook.load_notebook(self.rdg)
+        self.assertFalse(os.path.exists(self.notebook.notebook_cache_path(self.rdg)))
+
+    def test_a_corrupt_cache_is_a_miss(self):
+        self.notebook.load_notebook(self.rdg)
+        self.notebook._memo.clear()
+        with open(self.notebook.notebook_cache_path(self.rdg), "w") as handle:
+            handle.write('{"version": 1, "digest": ')
+        with mock.patch("logging.warning") as warning:
+            notebook = self.notebook.load_notebook(self.rdg)
+        self.assertEqual(len(notebook.rules()), 3)
+        self.assertIn("Ignoring unreadable notebook cache", warning.call_args.args[0])
+
+    def test_syntax_errors_survive_the_cache(self):
+        self._write('out/a.md=CREATEFILE(content="alpha"\n')
+        self.notebook.load_notebook(self.rdg)
+        self.notebook._memo.clear()
+        line = self.notebook.load_notebook(self.rdg).rules()[0]
+        self.assertEqual(line.error.column, 36)
+        self.assertEqual(str(line.error),
+                         "Invalid line format at column 36: missing ')' to close the arguments")
+
+    def test_a_formula_gone_from_the_registry_is_still_refused(self):
+        self._write('out/a.md=SOONGONE(x="1")\n')
+        with mock.patch.dict(self.parser.FUNCTION_REGISTRY, {"SOONGONE": lambda rdg_file, **k: ""}):
+            self.assertIsNone(self.parser.plan_rdg_file(self.rdg, self.tmp)[3])
+        self.notebook._memo.clear()
+        reason = self.parser.plan_rdg_file(self.rdg, self.tmp)[3]
+        self.assertEqual(reason, "line 1 will not parse (Unknown formula: SOONGONE)")
+
+    def test_file_ops_and_the_validator_read_the_same_notebook(self):
+        from src.rdg import file_ops, rdg_validator
+        self._write(BODY + 'out/bad.md=CREATEFILE(content="x") extra\n')
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            defined, used, graph = rdg_validator.parse_rdg_file(self.rdg)
+        self.assertEqual(defined, {"out/a.md", "out/b.md", "out/c.md"})
+        self.assertEqual(graph["out/c.md"], ["out/b.md"])
+        self.assertIn("Skipping malformed line 6: Invalid line format at column 36: "
+                      "unexpected text after ')'", stdout.getvalue())
+
+        self._write(BODY)
+        commands = file_ops.extract_output_files_and_commands(self.rdg, self.tmp)
+        self.assertEqual(list(commands), ["out/a.md", "out/b.md", "out/c.md"])
+        self.assertEqual(commands["out/b.md"],
+                         {"formula": "CREATEFILE",
+                          "arguments": {"content": "{{x}} beta", "x": "out/a.md"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,12 +2,18 @@
 
 Contract under test:
   - RDG_JOBS unset: byte-identical serial behavior (the loop object code is untouched).
-  - RDG_JOBS=N: steps run in dependency waves; artifacts are byte-identical to a serial run.
+  - RDG_JOBS=N: steps run as soon as their own predecessors finish; artifacts are byte-identical
+    to a serial run.
   - RDG_JOBS=plan: prints the waves, executes nothing, writes nothing.
   - Anything unprovable — duplicate destination, forward reference, unparseable line — falls back
     to the serial loop, loudly, with the reason on stderr.
   - A failed step's dependents still run and read its ## ERROR bytes (parity with the serial loop).
   - The read-fence raises the moment a step reads another step's destination without an edge.
+  - No wave barrier: a step whose predecessor finished does not wait for an unrelated slow step.
+  - With more ready steps than workers, the longest remaining chain (costed by durations recorded
+    on earlier runs) starts first; line order breaks ties.
+  - Per-class limits (--limit CLASS=N / RDG_JOBS_<CLASS>) cap one resource class without holding
+    back ready steps of another.
 
 Hermetic: deterministic formulas only, no network, no model call.
 """
@@ -16,7 +22,9 @@ import os
 import subprocess
 import sys
 import tempfile
+import time
 import unittest
+from unittest import mock
 
 REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -33,6 +41,8 @@ def _run(tmp, rdg_body, files, jobs=None):
     env = dict(os.environ)
     inherited = env.get("PYTHONPATH", "")
     env["PYTHONPATH"] = REPO + (os.pathsep + inherited if inherited else "")
+    # The run's history (and any other cache file) goes beside the notebook, not into the repo.
+    env["RDG_CACHE_DIR"] = os.path.join(tmp, ".cache")
     if jobs is None:
         env.pop("RDG_JOBS", None)
     else:
@@ -110,10 +120,12 @@ class RefuseToSerial(unittest.TestCase):
 
 
 class Barriers(unittest.TestCase):
+    # A walker stays a barrier when its read set covers a LATER step's destination: serially it
+    # reads that step's previous-run bytes, and only running it alone preserves that.
     def test_walker_is_a_barrier_in_the_plan(self):
         body = (
             'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
-            'out/g.md=GLOBTOMARKDOWN(pattern="src_*.md")\n'
+            'out/g.md=GLOBTOMARKDOWN(pattern="out/*.md")\n'
             'out/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
         )
         t = tempfile.mkdtemp()
@@ -126,11 +138,11 @@ class Barriers(unittest.TestCase):
         self.assertFalse(os.path.exists(os.path.join(t, "out")), "plan mode must not write")
 
     def test_barrier_execution_is_ordered_around(self):
-        # The glob step must see BOTH earlier destinations if they matched its pattern — here it
-        # globs the sources, so the assertion is simply byte-parity with serial.
+        # The glob step must see the earlier destination and not the later one, exactly as the
+        # serial loop does, so the assertion is byte-parity with serial.
         body = (
             'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
-            'out/g.md=GLOBTOMARKDOWN(pattern="src_*.md")\n'
+            'out/g.md=GLOBTOMARKDOWN(pattern="out/*.md")\n'
             'out/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
         )
         t1, t2 = tempfile.mkdtemp(), tempfile.mkdtemp()
@@ -141,6 +153,69 @@ class Barriers(unittest.TestCase):
         self.assertEqual(_artifacts(t1), _artifacts(t2))
 
 
+class WalkerReadSets(unittest.TestCase):
+    def test_walker_outside_every_destination_runs_concurrently(self):
+        body = (
+            'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
+            'out/g.md=GLOBTOMARKDOWN(pattern="src_*.md")\n'
+            'out/d.md=DIRECTORYTOMARKDOWN(directory="docs")\n'
+            'out/l.md=LISTPATHS(paths="docs, src_a.md")\n'
+            'out/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
+        )
+        files = dict(CHAIN_FILES, **{"docs/readme.md": "docs\n"})
+        plan = _run(tempfile.mkdtemp(), body, files, jobs="plan")
+        self.assertEqual(plan.returncode, 0, plan.stderr)
+        self.assertNotIn("[barrier]", plan.stdout)
+        self.assertIn("[walker]", plan.stdout)
+        self.assertNotIn("wave 1:", plan.stdout, "independent gathers belong in one wave")
+
+    def test_walker_waits_for_producers_inside_its_read_set(self):
+        body = (
+            'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
+            'out/sub/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
+            'out/g.md=GLOBTOMARKDOWN(pattern="out/**/[ab].md")\n'
+            'out/d.md=DIRECTORYTOMARKDOWN(directory="out/sub")\n'
+            'out/f.md=FILESORDIRECTORIESTOMARKDOWN(paths="out/sub, src_a.md")\n'
+        )
+        t = tempfile.mkdtemp()
+        plan = _run(t, body, CHAIN_FILES, jobs="plan")
+        self.assertIn("GLOBTOMARKDOWN   -> out/g.md  [walker]  after [1, 2]", plan.stdout)
+        self.assertIn("DIRECTORYTOMARKDOWN -> out/d.md  [walker]  after [2]", plan.stdout)
+        t1, t2 = tempfile.mkdtemp(), tempfile.mkdtemp()
+        serial = _run(t1, body, CHAIN_FILES)
+        parallel = _run(t2, body, CHAIN_FILES, jobs=4)
+        self.assertEqual(parallel.returncode, 0, parallel.stderr)
+        self.assertEqual(_artifacts(t1), _artifacts(t2))
+        self.assertIn("alpha-marker", _artifacts(t2)["out/g.md"])
+        self.assertIn("beta-marker", _artifacts(t2)["out/g.md"])
+        self.assertIn("beta-marker", _artifacts(t2)["out/d.md"])
+
+    def test_fence_covers_walker_reads(self):
+        sys.path.insert(0, REPO)
+        from src.rdg.functions import (FUNCTION_REGISTRY, ReadFenceError, _READ_FENCE)
+        tmp = tempfile.mkdtemp()
+        dest = os.path.join(tmp, "out", "a.md")
+        os.makedirs(os.path.dirname(dest))
+        with open(dest, "w") as handle:
+            handle.write("bytes")
+        rdg = os.path.join(tmp, "t.rdg")
+        calls = [
+            ("GLOBTOMARKDOWN", {"pattern": "out/*.md"}),
+            ("DIRECTORYTOMARKDOWN", {"directory": "out"}),
+            ("FILESORDIRECTORIESTOMARKDOWN", {"paths": "out"}),
+            ("LISTPATHS", {"paths": "out"}),
+        ]
+        token = _READ_FENCE.set(({dest: "step 1 (out/a.md)"}, set(), "step 2 (out/g.md)"))
+        try:
+            for name, kwargs in calls:
+                with self.subTest(name):
+                    with self.assertRaises(ReadFenceError) as ctx:
+                        FUNCTION_REGISTRY[name](rdg, **kwargs)
+                    self.assertIn("step 1", str(ctx.exception))
+        finally:
+            _READ_FENCE.reset(token)
+
+
 class FailureParity(unittest.TestCase):
     def test_failed_steps_dependents_still_run(self):
         # Step 1 fails at RUN time (unmatched template placeholder — the parse is fine, so the
@@ -209,5 +284,247 @@ class ReadFence(unittest.TestCase):
             _READ_FENCE.reset(token)
 
 
+class ReadyQueue(unittest.TestCase):
+    """In-process: a slow formula registered as KNOWN_SAFE, so timing is under the test's control."""
+
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import parser
+        self.parser = parser
+        self.order = []
+
+        def slow(rdg_file, **kwargs):
+            time.sleep(0.6)
+            self.order.append("slow")
+            return "slow"
+
+        def tag(rdg_file, **kwargs):
+            self.order.append(kwargs["name"])
+            return kwargs["name"]
+
+        def held(rdg_file, **kwargs):
+            # Records its START, then holds its worker, so with two workers the first two entries
+            # of self.order are exactly the two steps the scheduler chose to start first (in
+            # either order: both are submitted before either worker reaches this line).
+            self.order.append(kwargs["name"])
+            time.sleep(0.2)
+            return kwargs["name"]
+
+        self.registry = {"SLOWSTEP": slow, "TAGSTEP": tag, "HELDSTEP": held}
+        parser.FUNCTION_REGISTRY.update(self.registry)
+        parser.KNOWN_SAFE.update(self.registry)
+        from src.rdg import config
+        self.cache_patch = mock.patch.object(config, "CACHE_DIR", tempfile.mkdtemp())
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        for name in self.registry:
+            self.parser.FUNCTION_REGISTRY.pop(name, None)
+            self.parser.KNOWN_SAFE.discard(name)
+
+    def _rdg(self, body):
+        tmp = tempfile.mkdtemp()
+        rdg = os.path.join(tmp, "t.rdg")
+        with open(rdg, "w") as handle:
+            handle.write(body)
+        return rdg, tmp
+
+    def test_successor_starts_without_waiting_for_the_wave(self):
+        # Wave 0 = {slow, fast}; wave 1 = {after_slow, after_fast}. A wave executor cannot start
+        # after_fast until slow has finished; the ready queue starts it the moment fast is done.
+        body = (
+            'out/slow.md=SLOWSTEP()\n'
+            'out/fast.md=TAGSTEP(name="fast")\n'
+            'out/after_slow.md=TAGSTEP(name="after_slow", x=out/slow.md)\n'
+            'out/after_fast.md=TAGSTEP(name="after_fast", x=out/fast.md)\n'
+        )
+        rdg, tmp = self._rdg(body)
+        failures = self.parser.process_rdg_file_parallel(rdg, tmp, 4)
+        self.assertEqual(failures, 0)
+        self.assertLess(self.order.index("after_fast"), self.order.index("slow"),
+                        "after_fast waited on an unrelated step: that is a wave barrier")
+        self.assertLess(self.order.index("slow"), self.order.index("after_slow"))
+        with open(os.path.join(tmp, "out", "after_slow.md")) as handle:
+            self.assertEqual(handle.read(), "after_slow")
+
+    def test_longest_chain_starts_first(self):
+        # Three ready steps, two workers. Line order would start a and b; c heads a three-step
+        # chain, so it is the critical path and must take one of the two first slots.
+        rdg, tmp = self._rdg(
+            'out/a.md=HELDSTEP(name="a")\n'
+            'out/b.md=HELDSTEP(name="b")\n'
+            'out/c.md=HELDSTEP(name="c")\n'
+            'out/d.md=HELDSTEP(name="d", x=out/c.md)\n'
+            'out/e.md=HELDSTEP(name="e", x=out/d.md)\n'
+        )
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 2), 0)
+        self.assertEqual(set(self.order[:2]), {"c", "a"}, "ties fall back to line order")
+
+    def test_measured_duration_outranks_line_order(self):
+        from src.rdg import history
+        rdg, tmp = self._rdg(
+            'out/x.md=HELDSTEP(name="x")\n'
+            'out/y.md=HELDSTEP(name="y")\n'
+            'out/z.md=HELDSTEP(name="z")\n'
+        )
+        history.record_durations(rdg, {("out/z.md", "HELDSTEP"): 5.0,
+                                       ("out/x.md", "HELDSTEP"): 0.1,
+                                       ("out/y.md", "HELDSTEP"): 0.1})
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 2), 0)
+        self.assertEqual(set(self.order[:2]), {"z", "x"})
+
+    def test_run_records_durations_for_the_next_run(self):
+        from src.rdg import history
+        rdg, tmp = self._rdg('out/x.md=HELDSTEP(name="x")\nout/bad.md=CREATEFILE(content="{{nope}}")\n')
+        self.parser.process_rdg_file_parallel(rdg, tmp, 2)
+        durations = history.load_durations(rdg)
+        self.assertGreaterEqual(durations[("out/x.md", "HELDSTEP")], 0.2)
+        self.assertNotIn(("out/bad.md", "CREATEFILE"), durations, "a failed step is no measurement")
+
+
+class ResourceClasses(unittest.TestCase):
+    """In-process: HELDSTEP is an unclassified external formula; TAGSTEP is placed in local-io."""
+
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, parser
+        self.parser = parser
+        self.order = []
+        self.live = 0
+        self.peak = 0
+
+        def held(rdg_file, **kwargs):
+            self.order.append(kwargs["name"])
+            self.live += 1
+            self.peak = max(self.peak, self.live)
+            time.sleep(0.2)
+            self.live -= 1
+            return kwargs["name"]
+
+        def tag(rdg_file, **kwargs):
+            self.order.append(kwargs["name"])
+            return kwargs["name"]
+
+        self.registry = {"HELDSTEP": held, "TAGSTEP": tag}
+        parser.FUNCTION_REGISTRY.update(self.registry)
+        parser.KNOWN_SAFE.update(self.registry)
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", tempfile.mkdtemp()),
+            mock.patch.dict(functions.FORMULA_RESOURCE_CLASS, {"TAGSTEP": "local-io"}),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        for name in self.registry:
+            self.parser.FUNCTION_REGISTRY.pop(name, None)
+            self.parser.KNOWN_SAFE.discard(name)
+
+    def _rdg(self, body):
+        tmp = tempfile.mkdtemp()
+        rdg = os.path.join(tmp, "t.rdg")
+        with open(rdg, "w") as handle:
+            handle.write(body)
+        return rdg, tmp
+
+    def test_classification(self):
+        from src.rdg import config, functions
+        self.assertEqual(functions.resource_class("CREATEFILE"), "local-io")
+        self.assertEqual(functions.resource_class("HELDSTEP"), "external")
+        with mock.patch.object(config, "RDG_PRIMARY", "gemini"):
+            self.assertEqual(functions.resource_class("GEMINIPROMPT"), "gemini")
+        with mock.patch.object(config, "RDG_PRIMARY", "claude"):
+            self.assertEqual(functions.resource_class("GEMINIPROMPT"), "claude-cli")
+        with mock.patch.dict(functions.FUNCTION_REGISTRY, {"LOCALMODEL": functions.ollama_prompt}):
+            self.assertEqual(functions.resource_class("LOCALMODEL"), "ollama")
+
+    def test_limit_caps_its_class(self):
+        rdg, tmp = self._rdg(''.join(f'out/{n}.md=HELDSTEP(name="{n}")\n' for n in "abc"))
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 4, limits={"external": 1}), 0)
+        self.assertEqual(self.peak, 1)
+        self.assertEqual(self.order, ["a", "b", "c"])
+
+    def test_full_class_does_not_block_another(self):
+        # b outranks t in line order, but its class is full: t starts in the free worker instead.
+        rdg, tmp = self._rdg(
+            'out/a.md=HELDSTEP(name="a")\n'
+            'out/b.md=HELDSTEP(name="b")\n'
+            'out/t.md=TAGSTEP(name="t")\n'
+        )
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 4, limits={"external": 1}), 0)
+        self.assertEqual(set(self.order[:2]), {"a", "t"})
+        self.assertEqual(self.order[2], "b")
+
+    def test_environment_limit_and_bad_values(self):
+        rdg, tmp = self._rdg(''.join(f'out/{n}.md=HELDSTEP(name="{n}")\n' for n in "ab"))
+        with mock.patch.dict(os.environ, {"RDG_JOBS_EXTERNAL": "1"}):
+            self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 4), 0)
+        self.assertEqual(self.peak, 1)
+        with mock.patch.dict(os.environ, {"RDG_JOBS_EXTERNAL": "0"}):
+            self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 4), 1)
+        self.assertEqual(self.parser.process_rdg_file_parallel(rdg, tmp, 4, limits={"gpu": 1}), 1)
+
+
+class PlannerScale(unittest.TestCase):
+    """In-process: OPAQUE is neither KNOWN_SAFE nor a walker, so every use of it is a barrier."""
+
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import parser
+        self.parser = parser
+        self.registry = mock.patch.dict(parser.FUNCTION_REGISTRY,
+                                        {"OPAQUE": lambda rdg_file, **kwargs: ""})
+        self.registry.start()
+
+    def tearDown(self):
+        self.registry.stop()
+
+    def _plan(self, body):
+        tmp = tempfile.mkdtemp()
+        rdg = os.path.join(tmp, "t.rdg")
+        with open(rdg, "w") as handle:
+            handle.write(body)
+        steps, waves, preds, reason = self.parser.plan_rdg_file(rdg, tmp)
+        self.assertIsNone(reason)
+        return steps, waves, preds, tmp
+
+    def test_barriers_stay_implicit(self):
+        # 300 barriers among 3000 steps: explicit barrier edges would be ~900k pairs.
+        body = "".join(
+            f'out/o{n}.md=OPAQUE()\n' if n % 10 == 9
+            else f'out/c{n}.md=CREATEFILE(content="{{{{x}}}}", x=out/c{n - 1}.md)\n' if n % 10
+            else f'out/c{n}.md=CREATEFILE(content="c")\n'
+            for n in range(3000))
+        steps, waves, preds, _tmp = self._plan(body)
+        self.assertLess(sum(len(p) for p in preds), 3 * len(steps))
+        self.assertEqual(preds[9], list(range(9)), "a barrier waits for everything since the last")
+        self.assertEqual(preds[10], [9], "a step waits for the nearest barrier above it")
+        self.assertEqual(preds[19], list(range(9, 19)))
+        self.assertEqual(len(waves), 300 * 10)
+
+    def test_fence_orders_through_barriers_and_chains_only(self):
+        steps, _waves, preds, tmp = self._plan(
+            'out/a.md=CREATEFILE(content="a")\n'
+            'out/b.md=CREATEFILE(content="{{x}}", x=out/a.md)\n'
+            'out/o.md=OPAQUE()\n'
+            'out/c.md=CREATEFILE(content="c")\n'
+            'out/d.md=CREATEFILE(content="{{x}}", x=out/c.md)\n'
+            'out/e.md=CREATEFILE(content="e")\n'
+        )
+        queue = self.parser._ReadyQueue(steps, preds, 2)
+        self.assertTrue(queue.ordered(0, 1))
+        self.assertTrue(queue.ordered(0, 4), "across a barrier")
+        self.assertTrue(queue.ordered(4, 3))
+        self.assertFalse(queue.ordered(3, 5))
+        self.assertFalse(queue.ordered(4, 5))
+        _dests, allowed, reader = queue.fence(4)
+        self.assertEqual(reader, "step 5 (out/d.md)")
+        self.assertIn(os.path.join(tmp, "out", "c.md"), allowed)
+        self.assertNotIn(os.path.join(tmp, "out", "e.md"), allowed)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -30,7 +30,8 @@ class LineErrorIsolation(unittest.TestCase):
             handle.write(rdg_body)
         # Prepend rather than replace: an inherited PYTHONPATH may carry the venv's own entries.
         inherited = os.environ.get("PYTHONPATH", "")
-        env = dict(os.environ, PYTHONPATH=REPO + (os.pathsep + inherited if inherited else ""))
+        env = dict(os.environ, PYTHONPATH=REPO + (os.pathsep + inherited if inherited else ""),
+                   RDG_CACHE_DIR=os.path.join(tmp, ".cache"))
         proc = subprocess.run(
             [sys.executable, "-m", "src.rdg.rdg_cli", rdg],
             cwd=REPO, env=env, capture_output=True, text=True,
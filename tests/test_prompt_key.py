@@ -0,0 +1,111 @@
+"""Hash before render — GEMINIPROMPT cache hits are found without building the prompt.
+
+Contract under test:
+  - the key streamed from the template and its input files is get_cache_key of the rendered
+    prompt, for {{name}} and $name templates, padded and CRLF inputs, and across read chunks.
+  - a hit returns the cached answer without calling render_template; a miss renders once and
+    files the answer under the same key, asking the remote cache tier once, not twice.
+  - a template render_template refuses still fails with render_template's message.
+
+Hermetic: the model call is a fake; the cache is a temporary directory.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PromptKey(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini
+        self.functions = functions
+        self.gemini = gemini
+        cache_dir = tempfile.mkdtemp()
+        for module in (config, gemini):
+            patch = mock.patch.object(module, "CACHE_DIR", cache_dir)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.tmp = tempfile.mkdtemp()
+        self.rdg_file = os.path.join(self.tmp, "book.rdg")
+        self.calls = []
+
+    def _write(self, name, text, newline=None):
+        with open(os.path.join(self.tmp, name), "w", newline=newline) as handle:
+            handle.write(text)
+        return name
+
+    def _assert_same_key(self, template, model=None, effort=None, **inputs):
+        prompt = self.functions._template_prompt(self.rdg_file, dict(inputs, template=template))
+        self.assertEqual(prompt.cache_key(model, effort),
+                         self.gemini.get_cache_key(prompt.render(), model, effort))
+
+    def _fake(self, prompt, model=None, effort=None):
+        self.calls.append(prompt)
+        return "answer"
+
+    def test_streamed_key_matches_the_rendered_prompt(self):
+        padded = self._write("padded.md", "\n\n  body with  inner   space \n\t\n")
+        crlf = self._write("crlf.md", "line one\r\nline two\r\n\r\n", newline="")
+        self._assert_same_key("Summarise {{a}} and {{ b }} then {{a}}", a=padded, b=crlf)
+        self._assert_same_key("Legacy $a, ${b}, $$5 and a literal", a=padded, b=crlf)
+        self._assert_same_key("{{a}} with literal text", model="gemini-x", effort="low",
+                              a="not a file")
+        with mock.patch.object(self.functions, "_HASH_CHUNK", 3):
+            self._assert_same_key("<{{a}}|{{b}}>", a=padded, b=crlf)
+            self._assert_same_key("<{{a}}>", a=self._write("ws.md", "  x    y  \n   \n"))
+
+    def test_unkeyable_prompts_fall_back_to_rendering(self):
+        blank = self._write("blank.md", " \n\t\n")
+        for template, inputs in (("{{a}}", {"a": blank}), ("$a and $", {"a": "x"}),
+                                 ("{{missing}}", {"a": "x"})):
+            prompt = self.functions._template_prompt(self.rdg_file, dict(inputs,
+                                                                         template=template))
+            self.assertIsNone(prompt.cache_key())
+
+    def test_a_hit_never_renders(self):
+        name = self._write("in.md", "a large input\n")
+        args = dict(template="Summarise {{x}}", x=name)
+        with mock.patch.object(self.functions, "memoized_gemini_call", self._fake):
+            self.assertEqual(self.functions.gemini_prompt(self.rdg_file, **args), "answer")
+            self.assertEqual(self.calls, ["Summarise a large input"])
+            with mock.patch.object(self.functions, "render_template",
+                                   side_effect=AssertionError("rendered on a hit")):
+                self.assertEqual(self.functions.gemini_prompt(self.rdg_file, **args), "answer")
+                self.assertEqual(asyncio.run(
+                    self.functions.gemini_prompt_async(self.rdg_file, **args)), "answer")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_a_miss_asks_the_remote_once(self):
+        remote = mock.Mock()
+        remote.get.return_value = None
+        args = dict(template="Summarise {{x}}", x=self._write("in.md", "text\n"))
+        with mock.patch.object(self.gemini, "remote_cache", return_value=remote), \
+                mock.patch.object(self.functions, "memoized_gemini_call", self._fake):
+            self.assertEqual(self.functions.gemini_prompt(self.rdg_file, **args), "answer")
+        remote.get.assert_called_once()
+        remote.get.reset_mock()
+
+        async def fake(prompt, model=None, effort=None):
+            return self._fake(prompt)
+
+        args["x"] = self._write("other.md", "other\n")
+        with mock.patch.object(self.gemini, "remote_cache", return_value=remote), \
+                mock.patch.object(self.functions, "memoized_gemini_call_async", fake):
+            self.assertEqual(asyncio.run(self.functions.gemini_prompt_async(self.rdg_file,
+                                                                            **args)), "answer")
+        remote.get.assert_called_once()
+
+    def test_refused_templates_keep_their_errors(self):
+        with self.assertRaisesRegex(self.functions.RdgParserError,
+                                    "Template placeholder not found: 'missing'"):
+            self.functions.gemini_prompt(self.rdg_file, template="{{missing}}", x="y")
+
+
+if __name__ == "__main__":
+    unittest.main()
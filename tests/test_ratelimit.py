@@ -0,0 +1,114 @@
+"""Gemini rate limits and 429 backoff (ratelimit.py, RDG_GEMINI_RPM / _TPM / _RETRIES).
+
+Contract under test:
+  - a bucket lets one minute's allowance through at once, then paces callers in the order they
+    asked; a token reservation is corrected by the usage the response reports.
+  - a 429 is retried after the server's RetryInfo delay when it names one, otherwise after a
+    jittered exponential backoff; other errors and spent retries are not retried.
+  - memoized_gemini_call answers after a 429 without reaching the Claude fallback, the pause
+    holds the model's other callers, and every wait is published as a "throttle" event.
+
+Hermetic: the SDK call and time.sleep are replaced; nothing waits and nothing is sent.
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def quota_error(delay=None):
+    from google.genai import errors
+    details = []
+    if delay:
+        details.append({"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": delay})
+    return errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                              "message": "Quota exceeded", "details": details}})
+
+
+class Buckets(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import ratelimit
+        self.ratelimit = ratelimit
+
+    def test_a_minutes_allowance_then_pacing_in_order(self):
+        bucket = self.ratelimit.TokenBucket(60, now=0.0)
+        self.assertEqual([bucket.reserve(1, 0.0) for _ in range(60)], [0.0] * 60)
+        self.assertEqual([bucket.reserve(1, 0.0) for _ in range(3)], [1.0, 2.0, 3.0])
+        self.assertEqual(bucket.reserve(1, 10.0), 0.0, "ten seconds refilled ten requests")
+
+    def test_usage_corrects_the_estimate(self):
+        limiter = self.ratelimit.RateLimiter("m", tpm=600)
+        with mock.patch.object(self.ratelimit.time, "sleep") as sleep:
+            limiter.acquire(100)
+            limiter.settle(100, 600)  # the answer was long: the next call waits for it
+            self.assertGreater(limiter.acquire(100), 9.0)
+        sleep.assert_called_once()
+
+    def test_backoff_prefers_the_servers_hint(self):
+        backoff = self.ratelimit.backoff
+        self.assertGreaterEqual(backoff(quota_error("7s"), 0, 4, 1.0), 7.0)
+        self.assertLessEqual(backoff(quota_error("7s"), 0, 4, 1.0), 8.0)
+        for attempt in range(4):
+            self.assertLessEqual(backoff(quota_error(), attempt, 4, 1.0), 2 ** attempt)
+        self.assertIsNone(backoff(quota_error(), 4, 4, 1.0))
+        self.assertIsNone(backoff(ValueError("bad request"), 0, 4, 1.0))
+
+
+class GeminiRetries(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import gemini, ratelimit
+        self.gemini = gemini
+        self.ratelimit = ratelimit
+        gemini.memoized_gemini_call.cache_clear()
+        self.addCleanup(gemini.memoized_gemini_call.cache_clear)
+        patches = [mock.patch.object(ratelimit, "_limiters", {}),
+                   mock.patch.object(ratelimit.time, "sleep")]
+        self.sleep = patches[1].start()
+        patches[0].start()
+        self.addCleanup(lambda: [patch.stop() for patch in patches])
+
+    def test_a_429_is_retried_not_sent_to_the_fallback(self):
+        answer = mock.Mock(text="answer", usage_metadata=None)
+        stderr = io.StringIO()
+        with mock.patch.object(self.gemini.client.models, "generate_content",
+                               side_effect=[quota_error("7s"), answer]) as generate, \
+                mock.patch.object(self.gemini.claude_fallback, "call_claude",
+                                  side_effect=AssertionError("fell back on a 429")), \
+                mock.patch.dict(os.environ, {"RDG_EVENTS": "jsonl"}), \
+                mock.patch("sys.stderr", stderr), self.assertLogs(level="WARNING"):
+            self.assertEqual(self.gemini.memoized_gemini_call("a rate-limited question"),
+                             "answer")
+        self.assertEqual(generate.call_count, 2)
+        waited = self.sleep.call_args.args[0]
+        self.assertGreaterEqual(waited, 6.9)
+        events = [json.loads(line) for line in stderr.getvalue().splitlines()]
+        throttle = [event for event in events if event["ev"] == "throttle"]
+        self.assertEqual(len(throttle), 1)
+        self.assertEqual(throttle[0]["cause"], "429")
+        self.assertEqual(throttle[0]["waited_s"], round(waited, 3))
+
+    def test_the_pause_holds_other_callers(self):
+        limiter = self.ratelimit.limiter_for("gemini-x")
+        limiter.pause(30)
+        self.assertGreater(limiter.acquire(1), 29.0)
+
+    def test_spent_retries_reach_the_fallback(self):
+        with mock.patch.object(self.gemini, "GEMINI_RETRIES", 1), \
+                mock.patch.object(self.gemini.client.models, "generate_content",
+                                  side_effect=quota_error()) as generate, \
+                mock.patch.object(self.gemini.claude_fallback, "is_available", return_value=True), \
+                mock.patch.object(self.gemini.claude_fallback, "call_claude",
+                                  return_value="claude answer"), self.assertLogs(level="WARNING"):
+            self.assertEqual(self.gemini.memoized_gemini_call("spent retries"), "claude answer")
+        self.assertEqual(generate.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
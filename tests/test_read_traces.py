@@ -0,0 +1,183 @@
+"""RDG_TRACE_READS — external formulas stop being barriers once a run has shown what they read.
+
+Contract under test:
+  - a step the planner cannot see into runs as a barrier until a successful traced run records
+    what it opened; the next plan orders it after exactly the producers it read.
+  - a trace is valid for one line and one version of the formula's code: change either and the
+    step is a barrier again.
+  - a trace that touched a LATER destination, or wrote elsewhere in the notebook's tree, keeps the
+    step a barrier.
+  - a step that started a process or a thread, whose reads the hook cannot see, stays a barrier.
+  - a traced step that reads a destination its trace did not predict fails on the read-fence, and
+    its trace is dropped.
+  - without RDG_TRACE_READS=1, recorded traces are ignored.
+
+Hermetic: a formula module written into a temp directory, no network, no model call.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PEEK_MODULE = '''
+import os
+import subprocess
+import sys
+import threading
+
+def peek(rdg_file, **kwargs):
+    """Reads a destination the line never names: `stem` is not a path."""
+    here = os.path.dirname(os.path.abspath(rdg_file))
+    stem = kwargs.get("stem")
+    if stem is None:
+        with open(os.path.join(here, "which.txt")) as f:
+            stem = f.read().strip()
+    if kwargs.get("scratch"):
+        with open(os.path.join(here, "scratch.txt"), "w") as f:
+            f.write("side effect")
+    if kwargs.get("spawn"):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    if kwargs.get("thread"):
+        helper = threading.Thread(target=lambda: None)
+        helper.start()
+        helper.join()
+    with open(os.path.join(here, "out", stem + ".md")) as f:
+        return "peeked: " + f.read()
+
+FORMULAS = {"PEEK": peek}
+'''
+
+BODY = (
+    'out/a.md=CREATEFILE(content="alpha")\n'
+    'out/b.md=CREATEFILE(content="beta")\n'
+    'out/p.md=PEEK({args})\n'
+    'out/c.md=CREATEFILE(content="gamma")\n'
+)
+
+
+class ReadTraces(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, gemini, parser
+        self.parser = parser
+        self.tmp = tempfile.mkdtemp()
+        self.module_path = os.path.join(self.tmp, "peek_formulas.py")
+        self._write_module(PEEK_MODULE)
+        spec = importlib.util.spec_from_file_location("peek_formulas", self.module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        cache = os.path.join(self.tmp, "cache")
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", cache),
+            mock.patch.object(gemini, "CACHE_DIR", cache),
+            mock.patch.dict(os.environ, {"RDG_TRACE_READS": "1"}),
+            mock.patch.dict(parser.FUNCTION_REGISTRY, module.FORMULAS),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.rdg = os.path.join(self.tmp, "t.rdg")
+        self._write_rdg('stem="a"')
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _write_module(self, source):
+        with open(self.module_path, "w") as handle:
+            handle.write(source)
+
+    def _write_rdg(self, args):
+        with open(self.rdg, "w") as handle:
+            handle.write(BODY.format(args=args))
+
+    def _run(self):
+        return self.parser.process_rdg_file_parallel(self.rdg, self.tmp, 4)
+
+    def _peek_step(self):
+        steps, _waves, preds, reason = self.parser.plan_rdg_file(self.rdg, self.tmp)
+        self.assertIsNone(reason)
+        return steps[2], preds
+
+    def _read(self, name):
+        with open(os.path.join(self.tmp, name)) as handle:
+            return handle.read()
+
+    def test_first_run_is_a_barrier_and_the_next_plan_uses_the_trace(self):
+        step, preds = self._peek_step()
+        self.assertTrue(step.barrier)
+        self.assertEqual(self._run(), 0)
+        self.assertEqual(self._read("out/p.md"), "peeked: alpha")
+
+        step, preds = self._peek_step()
+        self.assertFalse(step.barrier)
+        self.assertTrue(step.traced)
+        self.assertEqual(step.reads, {0})
+        self.assertEqual(preds[2], [0])
+        self.assertEqual(preds[3], [])
+        self.assertEqual(self._run(), 0)
+        self.assertEqual(self._read("out/p.md"), "peeked: alpha")
+
+    def test_plan_output_names_traced_steps(self):
+        self.assertEqual(self._run(), 0)
+        with mock.patch("sys.stdout") as stdout:
+            self.assertEqual(self.parser.print_plan(self.rdg, self.tmp), 0)
+        printed = "".join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertIn("-> out/p.md  [traced]  after [1]", printed)
+
+    def test_changed_line_or_code_makes_the_trace_stale(self):
+        self.assertEqual(self._run(), 0)
+        self._write_rdg('stem="b"')
+        self.assertTrue(self._peek_step()[0].barrier)
+
+        self._write_rdg('stem="a"')
+        self.assertFalse(self._peek_step()[0].barrier)
+        self._write_module(PEEK_MODULE + "\n# edited\n")
+        self.assertTrue(self._peek_step()[0].barrier)
+
+    def test_reading_a_later_destination_or_writing_the_tree_stays_a_barrier(self):
+        # out/c.md as a previous run left it: serially, p reads those bytes before c rewrites them.
+        os.makedirs(os.path.join(self.tmp, "out"))
+        with open(os.path.join(self.tmp, "out", "c.md"), "w") as handle:
+            handle.write("gamma")
+        for args in ('stem="c"', 'stem="a", scratch="1"'):
+            with self.subTest(args=args):
+                self._write_rdg(args)
+                self.assertEqual(self._run(), 0)
+                self.assertTrue(self._peek_step()[0].barrier)
+
+    def test_a_step_that_starts_a_process_or_a_thread_stays_a_barrier(self):
+        for args in ('stem="a", spawn="1"', 'stem="a", thread="1"'):
+            with self.subTest(args=args):
+                self._write_rdg(args)
+                self.assertEqual(self._run(), 0)
+                self.assertEqual(self._read("out/p.md"), "peeked: alpha")
+                self.assertTrue(self._peek_step()[0].barrier)
+
+    def test_unpredicted_read_fails_on_the_fence_and_drops_the_trace(self):
+        self._write_rdg("")
+        with open(os.path.join(self.tmp, "which.txt"), "w") as handle:
+            handle.write("a")
+        self.assertEqual(self._run(), 0)
+        self.assertTrue(self._peek_step()[0].traced)
+
+        # Same line, same code — but this run reads b, which the trace gave no edge to.
+        with open(os.path.join(self.tmp, "which.txt"), "w") as handle:
+            handle.write("b")
+        with mock.patch("sys.stderr"):
+            self.assertEqual(self._run(), 1)
+        self.assertIn("read fence", self._read("out/p.md"))
+        self.assertTrue(self._peek_step()[0].barrier)
+
+    def test_traces_are_ignored_when_tracing_is_off(self):
+        self.assertEqual(self._run(), 0)
+        with mock.patch.dict(os.environ, {"RDG_TRACE_READS": ""}):
+            self.assertTrue(self._peek_step()[0].barrier)
+
+
+if __name__ == "__main__":
+    unittest.main()
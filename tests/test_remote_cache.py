@@ -0,0 +1,109 @@
+"""The remote cache tier (RDG_CACHE_REMOTE) and its reference server.
+
+Contract under test:
+  - an answer saved on one machine is a hit on another sharing the remote, and is kept locally
+    so the remote is asked once.
+  - a miss in both tiers still reaches the provider, whose answer is uploaded.
+  - a dead remote is a miss: the step goes on with the local cache, and after one failure the
+    remote is left alone rather than timing out on every call.
+  - RDG_CACHE_REMOTE_UPLOAD=0 reads without writing; engine-error sentinels are never uploaded.
+  - the server refuses what is not a cache key.
+
+Hermetic: the reference server runs on a loopback port in a thread; the provider is a fake.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+class RemoteTier(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini, remote_cache
+        self.functions = functions
+        self.gemini = gemini
+        self.remote_cache = remote_cache
+        self.server = remote_cache.make_server(tempfile.mkdtemp())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.patches = [
+            mock.patch.object(gemini, "CACHE_REMOTE", self.url),
+            mock.patch.object(gemini, "_remotes", {}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.addCleanup(lambda: [patch.stop() for patch in self.patches])
+        self.config = config
+        self._machine()
+
+    def _machine(self):
+        """Point the local cache at a fresh CACHE_DIR: another developer, another CI runner."""
+        cache_dir = tempfile.mkdtemp()
+        for module in (self.config, self.gemini):
+            patch = mock.patch.object(module, "CACHE_DIR", cache_dir)
+            patch.start()
+            self.patches.append(patch)
+        return cache_dir
+
+    def test_one_machines_answer_is_anothers_hit(self):
+        self.gemini.save_to_cache(KEY, "question", "answer")
+        self._machine()
+        self.assertEqual(self.gemini.load_from_cache(KEY), "answer")
+        self.server.shutdown()  # from now on, only the local copy can answer
+        self.assertEqual(self.gemini.cache_backend().load(KEY), "answer")
+
+    def test_a_miss_everywhere_reaches_the_provider_and_is_uploaded(self):
+        calls = []
+
+        def fake(rendered_template, model=None, effort=None):
+            calls.append(rendered_template)
+            return "fresh answer"
+
+        with mock.patch.object(self.functions, "memoized_gemini_call", fake):
+            self.assertEqual(self.functions._model_call("GEMINIPROMPT", "q"), "fresh answer")
+            self._machine()
+            self.assertEqual(self.functions._model_call("GEMINIPROMPT", "q"), "fresh answer")
+        self.assertEqual(calls, ["q"])
+
+    def test_a_dead_remote_degrades_to_local_only(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            dead = "http://127.0.0.1:%d" % probe.getsockname()[1]
+        with mock.patch.object(self.gemini, "CACHE_REMOTE", dead), \
+                self.assertLogs(level="WARNING") as logs:
+            self.assertIsNone(self.gemini.load_from_cache(KEY))
+            self.gemini.save_to_cache(KEY, "question", "answer")
+            with mock.patch("urllib.request.urlopen",
+                            side_effect=AssertionError("asked a remote that just failed")):
+                self.assertIsNone(self.gemini.load_from_cache("f" * 32))
+            self.assertEqual(self.gemini.load_from_cache(KEY), "answer")
+        self.assertEqual(len([line for line in logs.output if "Remote cache" in line]), 1)
+
+    def test_read_only_clients_and_error_sentinels_upload_nothing(self):
+        with mock.patch.object(self.gemini, "CACHE_REMOTE_UPLOAD", False):
+            self.gemini.save_to_cache(KEY, "question", "answer")
+        self.gemini.save_to_cache("f" * 32, "q", "RDG-ENGINE-ERROR: TimeoutError: slow")
+        self.assertEqual(os.listdir(self.server.root), [])
+
+    def test_the_server_refuses_what_is_not_a_key(self):
+        request = urllib.request.Request(f"{self.url}/../etc/passwd", data=b"{}", method="PUT")
+        with self.assertRaises(urllib.error.HTTPError) as refused:
+            urllib.request.urlopen(request, timeout=5)
+        self.assertEqual(refused.exception.code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
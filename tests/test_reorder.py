@@ -0,0 +1,126 @@
+"""RDG_REORDER — steps in topological order instead of a serial fallback on the first forward read.
+
+Contract under test:
+  - without RDG_REORDER=1 a forward reference still makes the file run serially, as before.
+  - with it, a forward reference is an edge: the consumer moves after its producers, everything
+    else keeps line order, and the serial loop and RDG_JOBS both run that order, byte for byte.
+  - a walker whose pattern covers a later destination waits for it instead of being a barrier.
+  - a cycle of reads, or a read that would have to cross a barrier, is refused with its path.
+
+Hermetic: deterministic formulas only, no network, no model call.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPENDED = (
+    'out/sum.md=CREATEFILE(content="{{a}} + {{b}}", a=out/a.md, b=out/b.md)\n'
+    'out/a.md=CREATEFILE(content="alpha")\n'
+    'out/b.md=UPPERCASE(file=out/a.md)\n'
+    'out/c.md=CREATEFILE(content="gamma")\n'
+)
+
+
+class Reorder(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, gemini, parser
+        self.parser = parser
+        self.tmp = tempfile.mkdtemp()
+        cache = os.path.join(self.tmp, "cache")
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", cache),
+            mock.patch.object(gemini, "CACHE_DIR", cache),
+            mock.patch.dict(os.environ, {"RDG_REORDER": "1"}),
+            mock.patch.dict(parser.FUNCTION_REGISTRY, {"OPAQUE": lambda rdg_file, **kwargs: "o"}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.rdg = os.path.join(self.tmp, "t.rdg")
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _plan(self, body):
+        with open(self.rdg, "w") as handle:
+            handle.write(body)
+        return self.parser.plan_rdg_file(self.rdg, self.tmp)
+
+    def _read(self, name):
+        with open(os.path.join(self.tmp, name)) as handle:
+            return handle.read()
+
+    def test_without_the_switch_a_forward_reference_still_falls_back(self):
+        with mock.patch.dict(os.environ, {"RDG_REORDER": ""}):
+            reason = self._plan(APPENDED)[3]
+        self.assertEqual(reason, "forward reference: step 1 reads 'out/a.md', written by later step 2")
+
+    def test_forward_reads_move_only_the_consumer(self):
+        steps, waves, preds, reason = self._plan(APPENDED)
+        self.assertIsNone(reason)
+        self.assertEqual([s.dest for s in steps], ["out/a.md", "out/b.md", "out/sum.md", "out/c.md"])
+        self.assertEqual([s.written for s in steps], [1, 2, 0, 3])
+        self.assertEqual(preds, [[], [0], [0, 1], []])
+        self.assertEqual(waves, [[0, 3], [1], [2]])
+
+    def test_serial_and_parallel_runs_agree(self):
+        self._plan(APPENDED)
+        self.assertEqual(self.parser.process_rdg_file(self.rdg, self.tmp), 0)
+        serial = self._read("out/sum.md")
+        self.assertEqual(serial, "alpha + ALPHA")
+        os.remove(os.path.join(self.tmp, "out", "sum.md"))
+        self.assertEqual(self.parser.process_rdg_file_parallel(self.rdg, self.tmp, 4), 0)
+        self.assertEqual(self._read("out/sum.md"), serial)
+
+    def test_a_walker_waits_for_later_destinations_instead_of_being_a_barrier(self):
+        steps, _waves, preds, reason = self._plan(
+            'out/all.md=GLOBTOMARKDOWN(pattern="out/parts/*.md")\n'
+            'out/parts/one.md=CREATEFILE(content="one")\n'
+            'out/parts/two.md=CREATEFILE(content="two")\n'
+        )
+        self.assertIsNone(reason)
+        self.assertEqual(steps[2].dest, "out/all.md")
+        self.assertFalse(steps[2].barrier)
+        self.assertEqual(preds[2], [0, 1])
+
+    def test_cycles_are_refused_with_their_path(self):
+        reason = self._plan(
+            'out/x.md=CREATEFILE(content="x")\n'
+            'out/a.md=CREATEFILE(content="{{b}}", b=out/b.md)\n'
+            'out/b.md=CREATEFILE(content="{{c}}", c=out/c.md)\n'
+            'out/c.md=CREATEFILE(content="{{a}}", a=out/a.md)\n'
+        )[3]
+        self.assertEqual(reason, "dependency cycle: step 2 (out/a.md) needs step 3 (out/b.md) "
+                                 "needs step 4 (out/c.md) needs step 2 (out/a.md)")
+        with mock.patch("sys.stderr") as stderr:
+            self.assertEqual(self.parser.process_rdg_file(self.rdg, self.tmp), 0)
+        printed = "".join(call.args[0] for call in stderr.write.call_args_list)
+        self.assertIn("RDG_REORDER: running in line order — dependency cycle", printed)
+
+    def test_a_read_across_a_barrier_is_a_cycle_through_it(self):
+        reason = self._plan(
+            'out/a.md=CREATEFILE(content="{{c}}", c=out/c.md)\n'
+            'out/o.md=OPAQUE()\n'
+            'out/c.md=CREATEFILE(content="c")\n'
+        )[3]
+        self.assertEqual(reason, "dependency cycle: step 1 (out/a.md) needs step 3 (out/c.md), "
+                                 "which runs after barrier step 2 (out/o.md), which runs after "
+                                 "step 1 (out/a.md)")
+
+    def test_print_plan_shows_where_a_step_was_written(self):
+        with open(self.rdg, "w") as handle:
+            handle.write(APPENDED)
+        with mock.patch("sys.stdout") as stdout:
+            self.assertEqual(self.parser.print_plan(self.rdg, self.tmp), 0)
+        printed = "".join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertIn("-> out/sum.md  [safe]  after [1, 2]  (written as step 1)", printed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+"""Single-flight model calls — one request per prompt, however many callers ask at once.
+
+Contract under test:
+  - threads asking _model_call for the same prompt make one backend call; the rest read its answer.
+  - so do coroutines on the asyncio path (_model_call_async).
+  - two PROCESSES sharing RDG_CACHE_DIR make one call: the second waits on the lock under
+    CACHE_DIR/locks and answers from the cache the first fills.
+  - the asyncio path waits for a lock held elsewhere by polling, not on a thread.
+  - the asyncio path asks and writes the remote cache tier off the event loop, so a slow remote
+    does not stall the other coroutines.
+  - without fcntl the call still goes ahead, unlocked.
+  - a cache hit takes no lock, on either path: only a miss creates a lock file.
+
+Hermetic: the backend is replaced by a counting fake; no network, no model call.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One shard: says it is ready, then asks _model_call a question whose backend records that it ran.
+SHARD = """
+import sys, time
+from unittest import mock
+from src.rdg import functions
+
+def slow(rendered_template, model=None, effort=None):
+    with open(sys.argv[1], "a") as handle:
+        handle.write("call\\n")
+    time.sleep(0.5)
+    return "answer"
+
+print("ready", flush=True)
+with mock.patch.object(functions, "memoized_gemini_call", slow):
+    print(functions._model_call("GEMINIPROMPT", "shared question"))
+"""
+
+
+class SingleFlight(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, functions, gemini
+        self.functions = functions
+        self.gemini = gemini
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, "cache")
+        os.makedirs(self.cache)
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", self.cache),
+            mock.patch.object(gemini, "CACHE_DIR", self.cache),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.calls = []
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _slow(self, rendered_template, model=None, effort=None):
+        self.calls.append(rendered_template)
+        time.sleep(0.3)
+        return "answer"
+
+    def test_concurrent_threads_make_one_call(self):
+        answers = []
+        with mock.patch.object(self.functions, "memoized_gemini_call", self._slow):
+            threads = [threading.Thread(target=lambda: answers.append(
+                self.functions._model_call("GEMINIPROMPT", "shared question"))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.calls, ["shared question"])
+        self.assertEqual(answers, ["answer"] * 4)
+
+    def test_concurrent_coroutines_make_one_call(self):
+        async def slow(rendered_template, model=None, effort=None):
+            self.calls.append(rendered_template)
+            await asyncio.sleep(0.3)
+            return "answer"
+
+        async def ask_three():
+            return await asyncio.gather(*(
+                self.functions._model_call_async("GEMINIPROMPT", "shared question")
+                for _ in range(3)))
+
+        with mock.patch.object(self.functions, "memoized_gemini_call_async", slow):
+            answers = asyncio.run(ask_three())
+        self.assertEqual(self.calls, ["shared question"])
+        self.assertEqual(answers, ["answer"] * 3)
+        self.assertEqual(self.functions._async_flights, {})
+
+    @unittest.skipIf(sys.platform == "win32", "advisory locks need fcntl")
+    def test_processes_sharing_the_cache_make_one_call(self):
+        ledger = os.path.join(self.tmp, "calls.txt")
+        env = dict(os.environ)
+        inherited = env.get("PYTHONPATH", "")
+        env["PYTHONPATH"] = REPO + (os.pathsep + inherited if inherited else "")
+        env["RDG_CACHE_DIR"] = self.cache
+        shards = [subprocess.Popen([sys.executable, "-c", SHARD, ledger], cwd=REPO, env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                  for _ in range(2)]
+        # Hold the entry's lock until both shards are up and asking, so they really race for it.
+        fd = self.gemini._acquire_cache_lock(self.gemini.get_cache_key("shared question"))
+        try:
+            for shard in shards:
+                self.assertEqual(shard.stdout.readline(), "ready\n")
+            time.sleep(0.3)
+        finally:
+            self.gemini._release_cache_lock(fd)
+        for shard in shards:
+            stdout, stderr = shard.communicate(timeout=60)
+            self.assertEqual(shard.returncode, 0, stderr)
+            self.assertEqual(stdout, "answer\n")
+        with open(ledger) as handle:
+            self.assertEqual(handle.read(), "call\n")
+        key = self.gemini.get_cache_key("shared question")
+        self.assertTrue(os.path.exists(os.path.join(self.cache, "locks", f"{key}.lock")))
+
+    @unittest.skipIf(sys.platform == "win32", "advisory locks need fcntl")
+    def test_the_async_path_waits_for_a_holder_without_a_thread(self):
+        key = self.gemini.get_cache_key("shared question")
+        fd = self.gemini._acquire_cache_lock(key)
+
+        def finish_elsewhere():
+            self.gemini.save_to_cache(key, "shared question", "their answer")
+            self.gemini._release_cache_lock(fd)
+        threading.Timer(0.3, finish_elsewhere).start()
+
+        async def never(rendered_template, model=None, effort=None):
+            self.calls.append(rendered_template)
+            return "our answer"
+
+        with mock.patch.object(self.functions, "memoized_gemini_call_async", never):
+            answer = asyncio.run(
+                self.functions._model_call_async("GEMINIPROMPT", "shared question"))
+        self.assertEqual(answer, "their answer")
+        self.assertEqual(self.calls, [])
+
+    def test_the_async_path_keeps_the_loop_running_through_a_slow_remote(self):
+        class SlowRemote:
+            def __init__(self):
+                self.puts = []
+
+            def get(self, cache_key):
+                time.sleep(0.3)
+                return None
+
+            def put(self, cache_key, request, response):
+                time.sleep(0.3)
+                self.puts.append(response)
+
+        async def answer(rendered_template, model=None, effort=None):
+            return "answer"
+
+        async def ask_and_tick():
+            ticks = 0
+            call = asyncio.ensure_future(
+                self.functions._model_call_async("GEMINIPROMPT", "slow remote"))
+            while not call.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+            return await call, ticks
+
+        remote = SlowRemote()
+        with mock.patch.object(self.gemini, "remote_cache", return_value=remote), \
+                mock.patch.object(self.functions, "memoized_gemini_call_async", answer):
+            result, ticks = asyncio.run(ask_and_tick())
+        self.assertEqual(result, "answer")
+        self.assertEqual(remote.puts, ["answer"])
+        self.assertGreater(ticks, 20, "the loop ran while the remote was asked and written")
+
+    def test_a_hit_is_served_without_taking_a_lock(self):
+        for question in ("sync question", "async question"):
+            self.gemini.save_to_cache(self.gemini.get_cache_key(question), question, "cached")
+        self.assertEqual(self.functions._model_call("GEMINIPROMPT", "sync question"), "cached")
+        self.assertEqual(asyncio.run(
+            self.functions._model_call_async("GEMINIPROMPT", "async question")), "cached")
+        self.assertFalse(os.path.exists(os.path.join(self.cache, "locks")))
+
+    def test_without_fcntl_the_call_goes_ahead(self):
+        with mock.patch.object(self.gemini, "fcntl", None), \
+                mock.patch.object(self.functions, "memoized_gemini_call", self._slow):
+            self.assertEqual(self.functions._model_call("GEMINIPROMPT", "lone question"), "answer")
+        self.assertEqual(self.calls, ["lone question"])
+        self.assertFalse(os.path.exists(os.path.join(self.cache, "locks")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Target selection — `rdg_cli <file> <dest-or-glob>...` builds only what those destinations need.
+
+Contract under test:
+  - naming a destination runs it and its transitive predecessors, and nothing else — on the serial
+    loop and the RDG_JOBS runner alike.
+  - glob patterns select over destinations.
+  - a barrier runs only when a selected step really reads its destination; once it runs, every
+    step above it runs too.
+  - a step that reads a producer above a barrier the selection leaves out still waits for it.
+  - a target no step writes is an error, never a silent no-op.
+  - RDG_JOBS=plan with targets prints only the selected steps.
+
+Hermetic: deterministic formulas only, no network, no model call.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAIN = (
+    'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
+    'out/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
+    'out/ca.md=CREATEFILE(content="consumed:{{x}}", x=out/a.md)\n'
+    'out/cb.md=CREATEFILE(content="consumed:{{x}}", x=out/b.md)\n'
+)
+BARRIER = (
+    'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
+    'out/g.md=GLOBTOMARKDOWN(pattern="out/*.md")\n'
+    'out/b.md=FILESTOMARKDOWN(files="src_b.md")\n'
+    'out/cb.md=CREATEFILE(content="{{x}}", x=out/b.md)\n'
+    'out/cg.md=CREATEFILE(content="{{x}}", x=out/g.md)\n'
+)
+ACROSS = (
+    'out/a.md=FILESTOMARKDOWN(files="src_a.md")\n'
+    'out/g.md=GLOBTOMARKDOWN(pattern="out/*.md")\n'
+    'out/c.md=CREATEFILE(content="consumed:{{x}}", x=out/a.md)\n'
+)
+
+
+def _write(body):
+    tmp = tempfile.mkdtemp()
+    for name, content in {"src_a.md": "alpha\n", "src_b.md": "beta\n", "t.rdg": body}.items():
+        with open(os.path.join(tmp, name), "w") as handle:
+            handle.write(content)
+    return tmp
+
+
+def _run(body, targets, jobs=None):
+    tmp = _write(body)
+    env = dict(os.environ)
+    inherited = env.get("PYTHONPATH", "")
+    env["PYTHONPATH"] = REPO + (os.pathsep + inherited if inherited else "")
+    env["RDG_CACHE_DIR"] = os.path.join(tmp, "cache")
+    env.pop("RDG_JOBS", None)
+    if jobs is not None:
+        env["RDG_JOBS"] = str(jobs)
+    proc = subprocess.run(
+        [sys.executable, "-m", "src.rdg.rdg_cli", os.path.join(tmp, "t.rdg"), *targets],
+        cwd=REPO, env=env, capture_output=True, text=True,
+    )
+    out = os.path.join(tmp, "out")
+    written = sorted(os.listdir(out)) if os.path.isdir(out) else []
+    return proc, written
+
+
+class Targets(unittest.TestCase):
+    def test_destination_builds_only_its_ancestors(self):
+        for jobs in (None, 4):
+            with self.subTest(jobs=jobs):
+                proc, written = _run(CHAIN, ["out/ca.md"], jobs)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(written, ["a.md", "ca.md"])
+
+    def test_glob_selects_over_destinations(self):
+        proc, written = _run(CHAIN, ["out/c*.md"], 4)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(written, ["a.md", "b.md", "ca.md", "cb.md"])
+
+    def test_barrier_runs_only_when_it_is_an_ancestor(self):
+        for jobs in (None, 4):
+            with self.subTest(jobs=jobs):
+                proc, written = _run(BARRIER, ["out/cb.md"], jobs)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(written, ["b.md", "cb.md"])
+                # cg reads the barrier's destination: the barrier runs, and so does all above it.
+                proc, written = _run(BARRIER, ["out/cg.md"], jobs)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(written, ["a.md", "cg.md", "g.md"])
+
+    def test_a_read_across_an_unselected_barrier_waits_for_its_producer(self):
+        for jobs in (None, 4):
+            with self.subTest(jobs=jobs):
+                proc, written = _run(ACROSS, ["out/c.md"], jobs)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(written, ["a.md", "c.md"])
+
+        sys.path.insert(0, REPO)
+        from src.rdg import config, parser
+        tmp = _write(ACROSS)
+        with mock.patch.object(config, "CACHE_DIR", os.path.join(tmp, "cache")):
+            steps, _, preds, reason, selected = parser._plan_selection(
+                os.path.join(tmp, "t.rdg"), tmp, ["out/c.md"])
+            self.assertIsNone(reason)
+            self.assertEqual(selected, {0, 2})
+            queue = parser._ReadyQueue(steps, preds, 4, selected)
+        self.assertEqual(queue.preds[2], [0], "c waits for a, not for the barrier that is not run")
+        self.assertEqual([i for _, i in queue.ready], [0])
+        self.assertEqual(queue.barriers, [])
+
+    def test_unknown_target_fails_loudly(self):
+        for jobs in (None, 4):
+            with self.subTest(jobs=jobs):
+                proc, written = _run(CHAIN, ["out/nope.md"], jobs)
+                self.assertEqual(proc.returncode, 1)
+                self.assertIn("no step writes 'out/nope.md'", proc.stderr)
+                self.assertEqual(written, [])
+
+    def test_plan_shows_only_the_selection(self):
+        proc, written = _run(CHAIN, ["out/cb.md"], "plan")
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn("out/cb.md", proc.stdout)
+        self.assertNotIn("out/ca.md", proc.stdout)
+        self.assertEqual(written, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Workspace runs — many notebooks planned and run as one graph in one process.
+
+Contract under test:
+  - directories are searched for *.rdg (hidden .default.rdg included, hidden directories not).
+  - a notebook naming another notebook's destination runs after it, whatever the discovery order,
+    through a step-level edge; unrelated notebooks share the worker budget concurrently.
+  - notebooks feeding each other in a cycle fall back to running one by one, loudly.
+  - identical prompts from different notebooks make one model call.
+  - `rdg_cli --workspace` with RDG_JOBS=plan prints the combined plan and executes nothing.
+
+Hermetic: deterministic formulas and a fake model call only, no network.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _tree(files):
+    root = tempfile.mkdtemp()
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as handle:
+            handle.write(content)
+    return root
+
+
+# `a_report` sorts before `b_source`, but reads what b_source writes.
+FEEDING = {
+    "a_report/t.rdg": 'out/r.md=CREATEFILE(content="report of {{x}}", x=../b_source/out/s.md)\n',
+    "b_source/t.rdg": 'out/s.md=CREATEFILE(content="source")\n',
+}
+
+
+class Workspace(unittest.TestCase):
+    def setUp(self):
+        sys.path.insert(0, REPO)
+        from src.rdg import config, gemini, functions, workspace
+        self.workspace = workspace
+        self.functions = functions
+        cache = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(config, "CACHE_DIR", cache),
+            mock.patch.object(gemini, "CACHE_DIR", cache),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def test_discovery(self):
+        root = _tree({"one/.default.rdg": "", "two/deep/x.rdg": "", "two/notes.md": "",
+                      ".hidden/y.rdg": ""})
+        found = self.workspace.discover([root])
+        self.assertEqual([os.path.relpath(p, root) for p in found],
+                         ["one/.default.rdg", "two/deep/x.rdg"])
+        with self.assertRaises(FileNotFoundError):
+            self.workspace.discover([os.path.join(root, "missing.rdg")])
+
+    def test_cross_notebook_edge_orders_producers_first(self):
+        root = _tree(FEEDING)
+        steps, _waves, preds, reason, order = self.workspace.plan_workspace(
+            self.workspace.discover([root]))
+        self.assertIsNone(reason)
+        self.assertEqual([os.path.relpath(nb, root) for nb in order],
+                         ["b_source/t.rdg", "a_report/t.rdg"])
+        self.assertEqual(preds, [[], [0]])
+        self.assertEqual(steps[1].label, "a_report/t.rdg step 1")
+
+        self.assertEqual(self.workspace.run_workspace([root], jobs=4), 0)
+        with open(os.path.join(root, "a_report", "out", "r.md")) as handle:
+            self.assertEqual(handle.read(), "report of source")
+
+    def test_unrelated_notebooks_share_the_budget(self):
+        live = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def slow(rdg_file, **kwargs):
+            with lock:
+                live["now"] += 1
+                live["peak"] = max(live["peak"], live["now"])
+            time.sleep(0.3)
+            with lock:
+                live["now"] -= 1
+            return "done"
+
+        root = _tree({f"nb{n}/t.rdg": "out/a.md=SLOWSTEP()\nout/b.md=SLOWSTEP()\n"
+                      for n in range(3)})
+        from src.rdg import parser
+        with mock.patch.dict(parser.FUNCTION_REGISTRY, {"SLOWSTEP": slow}), \
+                mock.patch.object(parser, "KNOWN_SAFE", parser.KNOWN_SAFE | {"SLOWSTEP"}):
+            self.assertEqual(self.workspace.run_workspace([root], jobs=4), 0)
+        self.assertEqual(live["peak"], 4)
+
+    def test_cycle_falls_back_to_one_notebook_at_a_time(self):
+        root = _tree({
+            "a/t.rdg": 'out/a.md=CREATEFILE(content="a")\n'
+                       'out/a2.md=CREATEFILE(content="{{x}}", x=../b/out/b.md)\n',
+            "b/t.rdg": 'out/b.md=CREATEFILE(content="{{x}}", x=../a/out/a.md)\n',
+        })
+        with mock.patch("sys.stderr") as stderr:
+            self.assertEqual(self.workspace.run_workspace([root], jobs=4), 0)
+        printed = "".join(call.args[0] for call in stderr.write.call_args_list)
+        self.assertIn("notebooks feed each other in a cycle (a/t.rdg, b/t.rdg)", printed)
+        with open(os.path.join(root, "b", "out", "b.md")) as handle:
+            self.assertEqual(handle.read(), "a")
+
+    def test_identical_prompts_across_notebooks_make_one_call(self):
+        calls = []
+
+        def fake_call(rendered_template, model=None, effort=None):
+            calls.append(rendered_template)
+            time.sleep(0.3)
+            return "answer"
+
+        root = _tree({f"nb{n}/t.rdg": 'out/p.md=GEMINIPROMPT(template="shared question")\n'
+                      for n in range(4)})
+        with mock.patch.object(self.functions, "memoized_gemini_call", fake_call):
+            self.assertEqual(self.workspace.run_workspace([root], jobs=4), 0)
+        self.assertEqual(calls, ["shared question"])
+        for n in range(4):
+            with open(os.path.join(root, f"nb{n}", "out", "p.md")) as handle:
+                self.assertEqual(handle.read(), "answer")
+
+
+class WorkspaceCli(unittest.TestCase):
+    def test_plan_names_notebooks_and_executes_nothing(self):
+        root = _tree(FEEDING)
+        env = dict(os.environ)
+        inherited = env.get("PYTHONPATH", "")
+        env["PYTHONPATH"] = REPO + (os.pathsep + inherited if inherited else "")
+        env["RDG_CACHE_DIR"] = os.path.join(root, ".cache")
+        env["RDG_JOBS"] = "plan"
+        proc = subprocess.run([sys.executable, "-m", "src.rdg.rdg_cli", "--workspace", root],
+                              cwd=REPO, env=env, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn("notebooks:\n  b_source/t.rdg\n  a_report/t.rdg\n", proc.stdout)
+        self.assertIn("-> a_report/t.rdg: out/r.md  [safe]  after [1]", proc.stdout)
+        self.assertFalse(os.path.exists(os.path.join(root, "b_source", "out")))
+
+
+if __name__ == "__main__":
+    unittest.main()